@@ -8,6 +8,7 @@
 #   3. How to save user to database
 # =============================================================================
 
+import logging
 from flask import Flask, render_template, request, jsonify
 from models import db, User, init_db
 
@@ -18,6 +19,9 @@ app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
 init_db(app)
 
+# logger.debug() only prints when you turn debug logging on, unlike print()
+logger = logging.getLogger(__name__)
+
 
 # =============================================================================
 # PAGE ROUTES
@@ -54,27 +58,23 @@ def api_register():
     Receives JSON: { "username": "...", "email": "...", "password": "..." }
     """
     data = request.get_json()
-    print(data)
 
     # Validate input
     if not data:
         return jsonify({'error': 'No data provided'}), 400
 
     username = data.get('username',None)
-    print(username)
     email = data.get('email', None)
-    print(email)
-    password = data.get('password', None)
-    print(password)
+    password = data.get('password', None)  # NEVER print or log a password!
 
     if not username:
-        print('username is missing')
+        logger.debug('Registration rejected: username is missing')
         return jsonify({'error': 'Username is required'}), 400
     if not email:
-        print('email is missing')
+        logger.debug('Registration rejected: email is missing')
         return jsonify({'error': 'Email is required'}), 400
     if not password:
-        print('password is missing')
+        logger.debug('Registration rejected: password is missing')
         return jsonify({'error': 'Password is required'}), 400
 
     # Check if user already exists
@@ -95,8 +95,7 @@ def api_login():
     if not user or not verify_password(user.password_hash, password):  # Check password
         return jsonify({'error': 'Invalid email or password'}), 401  # 401 = Unauthorized
 
-    token = create_token(user.id, user.is_admin)  # Create JWT token
-    print(token)
+    token = create_token(user.id, user.is_admin)  # Create JWT token (never print it!)
     return jsonify({
         'message': 'Login successful!',
         'token': token,  # Frontend stores this in localStorage
@@ -2,6 +2,7 @@
 # Part 5: Todo CRUD (Create, Read, Update, Delete)
 # =============================================================================
 
+import logging
 from flask import Flask, render_template, request, jsonify
 from models import db, User, Todo, init_db
 from auth import hash_password, verify_password, create_token
@@ -11,6 +12,9 @@ app = Flask(__name__)
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///todo.db'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+# logger.debug() only prints when you turn debug logging on, unlike print()
+logger = logging.getLogger(__name__)
+
 init_db(app)
 
 
@@ -102,7 +106,7 @@ def api_login():
 @app.route('/api/todos', methods=['GET'])  # READ operation
 def get_todos():
     user_id = request.args.get('user_id')  # Get from URL: ?user_id=1 (NOT SECURE!)
-    print('user_id:', user_id)
+    logger.debug('Loading todos for user_id=%s', user_id)
     if not user_id:
         return jsonify({'error': 'user_id required'}), 400
 
@@ -150,13 +154,11 @@ def create_todo():
 @app.route('/api/todos/<int:todo_id>', methods=['PUT'])  # UPDATE operation
 def update_todo(todo_id):  # todo_id comes from URL: /api/todos/5
     todo = Todo.query.get(todo_id)  # Find by ID
-    print('modifying this todo:', todo)
+    logger.debug('Updating todo %s', todo_id)
     if not todo:
         return jsonify({'error': 'Todo not found'}), 404  # 404 = Not Found
 
     data = request.get_json()
-    print()
-    print(data)
     if 'task_content' in data:  # Only update if field is sent
         todo.task_content = data['task_content']
     if 'is_completed' in data:
@@ -3,12 +3,16 @@
 # =============================================================================
 
 import jwt
+import logging
 from datetime import datetime, timedelta
 # Note: We don't need 'wraps' anymore since we're not using decorators
 from flask import request, jsonify
 from werkzeug.security import generate_password_hash, check_password_hash
 
 SECRET_KEY = "your-secret-key-change-in-production"
+
+# Debug logging only. Never log headers or tokens: they ARE the credentials.
+logger = logging.getLogger(__name__)
 TOKEN_EXPIRATION_HOURS = 24
 
 
@@ -69,27 +73,18 @@ def get_current_user():
     # Step 1: Check if Authorization header exists
     if 'Authorization' not in request.headers:
         return None, (jsonify({'error': 'Token is missing'}), 401)
-    print("========================================")
-    print("Authorization header found.")
-    print(request.headers)
-    print(request.headers['Authorization'])
-    print("\n\n")
+
     # Step 2: Extract token from "Bearer <token>"
- 
     auth_header = request.headers['Authorization']
     if not auth_header.startswith('Bearer '):
         return None, (jsonify({'error': 'Invalid token format'}), 401)
 
-    print("Split with (' ')")
-    print(auth_header.split(' '))
-    print("\n\n")
     token = auth_header.split(' ')[1]
 
     # Step 3: Decode and validate token
     data = decode_token(token)
-    print("Decoded token data:")
-    print(data)
     if not data:
+        logger.debug('Rejected invalid or expired token')
         return None, (jsonify({'error': 'Token is invalid or expired'}), 401)
 
     # Step 4: Get user from database
@@ -2,18 +2,49 @@
 # Part 7: Admin Panel
 # =============================================================================
 
-from flask import Flask, request, jsonify, render_template
-from models import db, User, Todo
-from auth import hash_password, verify_password, create_token, get_current_user, get_admin_user
+import os
+from sqlalchemy.exc import IntegrityError
+from flask import Flask, request, jsonify, render_template, g, stream_with_context
+from models import (db, User, Todo, ArchivedTodo, Tag, normalize_email, find_user_by_email, parse_due_at,
+                    parse_tags, parse_task_content, is_todo_id, TodoRepository,
+                    all_todo_rows_with_owner, todo_stats, todo_counts_by_user, MAX_TODO_DEPTH,
+                    TodoList, ListMember, ListRepository, PERMISSIONS, PERMISSION_NAMES, VIEW,
+                    EDIT, OWNER)
+from auth import (hash_password, verify_password, require_user, require_admin, get_list_access,
+                  create_token_pair, use_refresh_token, revoke_refresh_token,
+                  revoke_access_token, revoke_user_tokens)
+from cache import todo_cache
+from shards import shards
+from positions import rebalancer, MAX_KEY_LENGTH
+from serializers import (fragments, encode_todo_list, encode_todo_list_with_owner,
+                         encode_lists, export_chunks, EXPORT_FORMATS)
+from logs import setup_logging, get_logger
+from bulk_import import import_users_from_request, import_todos_from_request
+import migrate
 
 app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///todo_part7.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config.from_object('config')
+
+setup_logging(app)
+logger = get_logger(__name__)
 
 db.init_app(app)
+shards.init_app(app, db)
+todo_cache.init_app(app)
+rebalancer.init_app(app)
 
 with app.app_context():
-    db.create_all()
+    # Schema is managed by migrations/ (see migrate.py), not db.create_all().
+    # A new database is created automatically; an existing one that is
+    # behind the code stops the app until you run: python migrate.py
+    # With shards, every file on its own engine: db.engine ATTACHes them all.
+    os.makedirs(app.config['INSTANCE_DIR'], exist_ok=True)
+    for _, engine in shards.file_engines(**app.config['SQLALCHEMY_ENGINE_OPTIONS']):
+        migrate.bootstrap(engine, log=logger.info)
+        migrate.check_schema(engine)
+        if engine is not db.engine:
+            engine.dispose()
+    shards.check_layout()
 
     admin = User.query.filter_by(email='admin@example.com').first()
     if not admin:
@@ -25,17 +56,9 @@ with app.app_context():
         )
         db.session.add(admin)
         db.session.commit()
-        print('\n' + '='*50)
-        print('DEFAULT ADMIN USER CREATED:')
-        print('Email:    admin@example.com')
-        print('Password: admin123')
-        print('='*50 + '\n')
+        logger.info('Default admin user created: admin@example.com / admin123')
     else:
-        print('\n' + '='*50)
-        print('ADMIN LOGIN:')
-        print('Email:    admin@example.com')
-        print('Password: admin123')
-        print('='*50 + '\n')
+        logger.info('Admin login: admin@example.com / admin123')
 
 
 # ============================================
@@ -71,20 +94,22 @@ def admin_page():
 def register():
     data = request.get_json()
 
-    if User.query.filter_by(email=data['email']).first():
-        return jsonify({'error': 'Email already registered'}), 400
-
-    if User.query.filter_by(username=data['username']).first():
-        return jsonify({'error': 'Username already taken'}), 400
-
     user = User(
         username=data['username'],
-        email=data['email'],
+        email=normalize_email(data['email']),
         password_hash=hash_password(data['password'])  # is_admin defaults to False
     )
 
+    # Just INSERT - the unique indexes reject duplicates. Checking first with
+    # SELECTs costs extra queries and two sign-ups at once could both pass.
     db.session.add(user)
-    db.session.commit()
+    try:
+        db.session.commit()
+    except IntegrityError as e:
+        db.session.rollback()
+        if 'username' in str(e.orig):
+            return jsonify({'error': 'Username already taken'}), 400
+        return jsonify({'error': 'Email already registered'}), 400
 
     return jsonify({'message': 'Registration successful'}), 201
 
@@ -93,16 +118,19 @@ def register():
 def login():
     data = request.get_json()
 
-    user = User.query.filter_by(email=data['email']).first()
+    user = find_user_by_email(data['email'])
 
     if not user or not verify_password(data['password'], user.password_hash):
         return jsonify({'error': 'Invalid email or password'}), 401
 
-    token = create_token(user.id)
+    # Short-lived access token + one-time refresh token
+    token, refresh_token = create_token_pair(user)
+    db.session.commit()
 
     return jsonify({
         'message': 'Login successful',
         'token': token,
+        'refresh_token': refresh_token,
         'user': {
             'id': user.id,
             'username': user.username,
@@ -112,162 +140,578 @@ def login():
     })
 
 
+@app.route('/api/token/refresh', methods=['POST'])
+def refresh_token():
+    data = request.get_json(silent=True)
+    raw_token = data.get('refresh_token') if isinstance(data, dict) else None
+    if not isinstance(raw_token, str) or not raw_token:
+        return jsonify({'error': 'refresh_token is required'}), 400
+
+    # Step 1: Exchange the refresh token (works once) for its user
+    user = use_refresh_token(raw_token)
+    if not user:
+        db.session.rollback()
+        return jsonify({'error': 'Refresh token is invalid or expired'}), 401
+
+    # Step 2: Issue a new pair with the user's CURRENT role
+    token, new_refresh_token = create_token_pair(user)
+    db.session.commit()
+
+    return jsonify({'token': token, 'refresh_token': new_refresh_token})
+
+
+@app.route('/api/logout', methods=['POST'])
+@require_user
+def logout(current_user):
+    # Revoke this access token and (if sent) the refresh token
+    data = request.get_json(silent=True)
+    raw_token = data.get('refresh_token') if isinstance(data, dict) else None
+    if raw_token is not None and not isinstance(raw_token, str):
+        return jsonify({'error': 'refresh_token must be a string'}), 400
+    revoke_access_token(g.token_claims)
+    if raw_token:
+        revoke_refresh_token(raw_token)
+    db.session.commit()
+
+    return jsonify({'message': 'Logged out'})
+
+
 # ============================================
 # TODO API (Protected - any logged in user)
 # ============================================
-# NOTE: In real projects, this repeated check would use a @decorator.
-# We write it explicitly here for learning purposes.
+# @require_user checks the token and passes the logged-in user in as the
+# first argument (see auth.py). It returns 401 before the route runs if not.
+#
+# Every todo route also works on a shared list: /api/lists/<list_id>/todos...
+# passes list_id, and TodoRepository checks the user's permission in SQL.
 
 @app.route('/api/todos', methods=['GET'])
-def get_todos():
-    # Step 1: Check if user is logged in
-    current_user, error = get_current_user()
-    if error:
-        return error
+@app.route('/api/lists/<int:list_id>/todos', methods=['GET'])
+@require_user
+def get_todos(current_user, list_id=None):
+    if list_id is not None:
+        return _get_list_todos(current_user, list_id)
+
+    # Filtered by tag? ?tag=work&tag=urgent (all of them) or &match=any
+    if 'tag' in request.args:
+        return _get_todos_by_tag(current_user)
+
+    # Archived todos too? ?include_archived=1 (not cached: rarely asked for)
+    if _include_archived():
+        todos = TodoRepository(current_user.id).list(include_archived=True)
+        return app.response_class(encode_todo_list(todos), mimetype='application/json')
+
+    # Step 1: Return the cached list if it hasn't changed since last time
+    # (the user's todo_list_version: nor in another process, e.g. archive.py)
+    version = todo_cache.version(current_user)
+    body = todo_cache.get(current_user.id, version)
+    if body is not None:
+        return app.response_class(body, mimetype='application/json')
+
+    # Step 2: Get user's todos and remember the response for next time
+    generation = todo_cache.generation(current_user.id)
+    todos = TodoRepository(current_user.id).list()  # Plain rows, not ORM objects
+    body = encode_todo_list(todos)  # Reuses each unchanged todo's cached JSON
+    todo_cache.set(current_user.id, body, generation, version)
+    return app.response_class(body, mimetype='application/json')
+
+
+def _include_archived():
+    return request.args.get('include_archived', '0').lower() in ('1', 'true')
+
+
+def _get_todos_by_tag(current_user):
+    # Step 1: Check the tags and how to combine them
+    if _include_archived():
+        return jsonify({'error': 'Archived todos cannot be filtered by tag'}), 400
+    try:
+        tags = parse_tags(request.args.getlist('tag'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    match = request.args.get('match', 'all')
+    if match not in ('all', 'any'):
+        return jsonify({'error': 'match must be all or any'}), 400
+
+    # Step 2: One query - the tag filter runs in SQLite (not cached: too many combinations)
+    todos = TodoRepository(current_user.id).list(tags, match_all=(match == 'all'))
+    return app.response_class(encode_todo_list(todos), mimetype='application/json')
+
+
+def _get_list_todos(current_user, list_id):
+    # Step 1: Is it one of the user's lists? (not cached: other members change it)
+    if list_id not in get_list_access(current_user.id):
+        return _list_not_found()
+    if 'tag' in request.args:
+        return _tags_are_personal()
+
+    # Step 2: One query (two with ?include_archived=1), which checks the permission again itself
+    todos = TodoRepository(current_user.id, list_id).list(include_archived=_include_archived())
+    return app.response_class(encode_todo_list(todos), mimetype='application/json')
+
+
+@app.route('/api/tags', methods=['GET'])
+@require_user
+def get_tags(current_user):
+    # Counts are kept up to date on every change - nothing is counted here
+    counts = TodoRepository(current_user.id).tag_counts()
+    return jsonify({'tags': [{'name': name, 'count': count} for name, count in counts]})
+
+
+@app.route('/api/todos/export', methods=['GET'])
+@require_user
+def export_todos(current_user):
+    # Step 1: Check the format (?format=csv or ?format=ndjson)
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': 'format must be csv or ndjson'}), 400
+
+    # Step 2: Stream rows from the database straight into the response
+    rows = TodoRepository(current_user.id).iter()
+    return app.response_class(
+        stream_with_context(export_chunks(rows, fmt)),
+        mimetype=EXPORT_FORMATS[fmt],
+        headers={'Content-Disposition': f'attachment; filename=todos.{fmt}'}
+    )
 
-    # Step 2: Get user's todos
-    todos = Todo.query.filter_by(user_id=current_user.id).all()
-    return jsonify({'todos': [todo.to_dict() for todo in todos]})
 
+@app.route('/api/todos/import', methods=['POST'])
+@require_user
+def import_todos(current_user):
+    # Step 1: Check the format (?format=ndjson or ?format=csv)
+    if request.args.get('format', 'ndjson') not in EXPORT_FORMATS:
+        return jsonify({'error': 'format must be csv or ndjson'}), 400
 
-@app.route('/api/todos', methods=['POST'])
-def create_todo():
-    # Step 1: Check if user is logged in
-    current_user, error = get_current_user()
-    if error:
-        return error
+    # Step 2: Parse the body as it streams in and insert in batches
+    report = import_todos_from_request(request, current_user.id,
+                                       app.config['TODO_IMPORT_BATCH_SIZE'])
+    todo_cache.invalidate(current_user.id)
+    return jsonify(report), 200 if report['imported'] or not report['failed'] else 400
 
-    # Step 2: Create todo
-    data = request.get_json()
-    todo = Todo(
-        task_content=data['task_content'],
-        user_id=current_user.id
-    )
 
-    db.session.add(todo)
+@app.route('/api/todos', methods=['POST'])
+@app.route('/api/lists/<int:list_id>/todos', methods=['POST'])
+@require_user
+def create_todo(current_user, list_id=None):
+    # Create todo (INSERT ... RETURNING: one statement)
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return _json_object_required()
+    try:
+        task_content = parse_task_content(data.get('task_content'))
+        due_at = parse_due_at(data.get('due_at'))
+        tags = parse_tags(data.get('tags', []))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if tags and list_id is not None:
+        return _tags_are_personal()
+    parent_id = data.get('parent_id')  # Set: a subtask of that todo
+    if parent_id is not None and not is_todo_id(parent_id):
+        return jsonify({'error': 'parent_id must be a todo id or null'}), 400
+    todos = TodoRepository(current_user.id, list_id)
+    todo = todos.create(task_content, due_at, parent_id)
+    if todo is None:
+        if list_id is not None and _list_permission(current_user, list_id) not in (EDIT, OWNER):
+            return _todo_not_found(current_user, list_id)
+        return jsonify({'error': f'parent_id must be one of your todos, at most '
+                                 f'{MAX_TODO_DEPTH} levels deep'}), 400
+    if tags:
+        todos.set_tags(todo.id, tags)
+        todo.tag_names = tags
+
     db.session.commit()
+    _todos_changed(current_user, list_id)  # Cached list is now out of date
 
     return jsonify(todo.to_dict()), 201
 
 
-@app.route('/api/todos/<int:todo_id>', methods=['PUT'])
-def update_todo(todo_id):
-    # Step 1: Check if user is logged in
-    current_user, error = get_current_user()
-    if error:
-        return error
+def _todo_not_found(current_user=None, list_id=None):
+    # Also the answer for someone else's todo: nobody learns which ids exist.
+    # Only members of a shared list learn that it is read-only for them.
+    if list_id is not None:
+        permission = _list_permission(current_user, list_id)
+        if permission == VIEW:
+            return jsonify({'error': 'You can only view this list'}), 403
+        if permission is None:
+            return _list_not_found()
+    return jsonify({'error': 'Todo not found'}), 404
 
-    # Step 2: Find todo
-    todo = Todo.query.get_or_404(todo_id)
 
-    # Step 3: Check ownership
-    if todo.user_id != current_user.id:
-        return jsonify({'error': 'Not authorized'}), 403
+def _list_not_found():
+    # Also the answer for a list the user isn't a member of
+    return jsonify({'error': 'List not found'}), 404
 
-    # Step 4: Update todo
-    data = request.get_json()
-    if 'task_content' in data:
-        todo.task_content = data['task_content']
+
+def _list_permission(current_user, list_id):
+    # VIEW / EDIT / OWNER, or None - from the per-request cache (auth.py)
+    access = get_list_access(current_user.id).get(list_id)
+    return access[2] if access else None
+
+
+def _json_object_required():
+    # The body was a list, a string or a number ({"...": ...} expected)
+    return jsonify({'error': 'Request body must be a JSON object'}), 400
+
+
+def _tags_are_personal():
+    return jsonify({'error': 'Tags can only be used on your own todos'}), 400
+
+
+def _todos_changed(current_user, list_id):
+    # Only the user's own list is cached: shared lists change under other members
+    if list_id is None:
+        todo_cache.invalidate(current_user.id)
+
+
+@app.route('/api/todos/<int:todo_id>', methods=['PUT', 'PATCH'])
+@app.route('/api/lists/<int:list_id>/todos/<int:todo_id>', methods=['PUT', 'PATCH'])
+@require_user
+def update_todo(current_user, todo_id, list_id=None):
+    # Step 1: Keep only the fields that may change
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return _json_object_required()
+    values = {}
     if 'is_completed' in data:
-        todo.is_completed = data['is_completed']
+        if not isinstance(data['is_completed'], bool):
+            return jsonify({'error': 'is_completed must be true or false'}), 400
+        values['is_completed'] = data['is_completed']
+    try:
+        if 'task_content' in data:
+            values['task_content'] = parse_task_content(data['task_content'])
+        if 'due_at' in data:
+            values['due_at'] = parse_due_at(data['due_at'])  # null removes the due date
+        tags = parse_tags(data['tags']) if 'tags' in data else None  # [] removes all
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if not values and tags is None:
+        return jsonify({'error': 'Nothing to update'}), 400
+    if tags is not None and list_id is not None:
+        return _tags_are_personal()
+
+    # Step 2: UPDATE ... WHERE id = ? AND user_id = ? RETURNING ... (one statement)
+    todos = TodoRepository(current_user.id, list_id)
+    todo = todos.update(todo_id, values)  # Also bumps version when only tags change
+    if todo is None:
+        return _todo_not_found(current_user, list_id)
+
+    # Step 3: The todo is ours - now replace its tags
+    if tags is not None:
+        todos.set_tags(todo_id, tags)
+        todo.tag_names = tags
+    # Done means its subtasks are done too (one UPDATE for the whole subtree)
+    if values.get('is_completed') is True:
+        todos.complete_subtasks(todo_id)
 
     db.session.commit()
+    _todos_changed(current_user, list_id)
+    return jsonify(todo.to_dict())
+
+
+@app.route('/api/todos/<int:todo_id>/tree', methods=['GET'])
+@app.route('/api/lists/<int:list_id>/todos/<int:todo_id>/tree', methods=['GET'])
+@require_user
+def get_todo_tree(current_user, todo_id, list_id=None):
+    # Step 1: How many levels of subtasks? (?depth=, default all)
+    depth = request.args.get('depth', MAX_TODO_DEPTH, type=int)
+    if not 0 <= depth <= MAX_TODO_DEPTH:
+        return jsonify({'error': f'depth must be 0-{MAX_TODO_DEPTH}'}), 400
+
+    # Step 2: The whole subtree in ONE recursive query, parents first
+    rows = TodoRepository(current_user.id, list_id).subtree(todo_id, depth)
+    if not rows:
+        return _todo_not_found(current_user, list_id)
+
+    # Step 3: Nest each todo under its parent
+    nodes = {}
+    for todo, _ in rows:
+        node = nodes[todo.id] = dict(todo.to_dict(), children=[])
+        if todo.id != todo_id:
+            nodes[todo.parent_id]['children'].append(node)
+    return jsonify({'todo': nodes[todo_id]})
+
+
+@app.route('/api/todos/<int:todo_id>/toggle', methods=['POST'])
+@app.route('/api/lists/<int:list_id>/todos/<int:todo_id>/toggle', methods=['POST'])
+@require_user
+def toggle_todo(current_user, todo_id, list_id=None):
+    # Flip is_completed in the database - no read-modify-write in Python
+    todos = TodoRepository(current_user.id, list_id)
+    todo = todos.toggle(todo_id)
+    if todo is None:
+        return _todo_not_found(current_user, list_id)
+    if todo.is_completed:
+        todos.complete_subtasks(todo_id)
+
+    db.session.commit()
+    _todos_changed(current_user, list_id)
+    return jsonify(todo.to_dict())
+
+
+@app.route('/api/todos/<int:todo_id>/move', methods=['POST'])
+@app.route('/api/lists/<int:list_id>/todos/<int:todo_id>/move', methods=['POST'])
+@require_user
+def move_todo(current_user, todo_id, list_id=None):
+    # Step 1: Where to? {"after_id": 12} or {"after_id": null} for the top
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return _json_object_required()
+    if 'after_id' not in data:
+        return jsonify({'error': 'after_id is required (null = move to the top)'}), 400
+    after_id = data['after_id']
+    if after_id is not None and (not is_todo_id(after_id) or after_id == todo_id):
+        return jsonify({'error': 'after_id must be the id of another todo'}), 400
+
+    # Step 2: One UPDATE gives the todo a key between its new neighbours
+    moved = TodoRepository(current_user.id, list_id).move(todo_id, after_id)
+    if moved is None:
+        return _todo_not_found(current_user, list_id)
+    todo, position = moved
+
+    db.session.commit()
+    _todos_changed(current_user, list_id)
+
+    # Step 3: Keys grow when todos keep landing in the same gap - tidy up later
+    if len(position) > MAX_KEY_LENGTH:
+        rebalancer.request(current_user.id, list_id)
     return jsonify(todo.to_dict())
 
 
 @app.route('/api/todos/<int:todo_id>', methods=['DELETE'])
-def delete_todo(todo_id):
-    # Step 1: Check if user is logged in
-    current_user, error = get_current_user()
-    if error:
-        return error
+@app.route('/api/lists/<int:list_id>/todos/<int:todo_id>', methods=['DELETE'])
+@require_user
+def delete_todo(current_user, todo_id, list_id=None):
+    # Move the todo and its subtasks to the trash ... AND user_id = ? (one statement)
+    todos = TodoRepository(current_user.id, list_id)
+    deleted = todos.delete(todo_id)
+    if not deleted:
+        return _todo_not_found(current_user, list_id)
+
+    db.session.commit()
+    _todos_changed(current_user, list_id)
+    fragments.discard(todos.shard, *deleted)
+
+    return jsonify({'message': 'Todo moved to the trash'})
+
+
+@app.route('/api/todos/trash', methods=['GET'])
+@app.route('/api/lists/<int:list_id>/todos/trash', methods=['GET'])
+@require_user
+def get_trash(current_user, list_id=None):
+    # Deleted todos, newest first (only the trash is in ix_todos_trash)
+    if list_id is not None and list_id not in get_list_access(current_user.id):
+        return _list_not_found()
+    todos = TodoRepository(current_user.id, list_id).trash()
+    return app.response_class(encode_todo_list(todos), mimetype='application/json')
 
-    # Step 2: Find todo
-    todo = Todo.query.get_or_404(todo_id)
 
-    # Step 3: Check ownership
-    if todo.user_id != current_user.id:
-        return jsonify({'error': 'Not authorized'}), 403
+@app.route('/api/todos/<int:todo_id>/restore', methods=['POST'])
+@app.route('/api/lists/<int:list_id>/todos/<int:todo_id>/restore', methods=['POST'])
+@require_user
+def restore_todo(current_user, todo_id, list_id=None):
+    # Back from the trash, with the subtasks deleted along with it (one statement)
+    restored = TodoRepository(current_user.id, list_id).restore(todo_id)
+    if not restored:
+        return _todo_not_found(current_user, list_id)
 
-    # Step 4: Delete todo
-    db.session.delete(todo)
     db.session.commit()
+    _todos_changed(current_user, list_id)
+    return jsonify(restored[0].to_dict())
 
-    return jsonify({'message': 'Todo deleted'})
+
+# ============================================
+# SHARED LISTS API (Protected - list members)
+# ============================================
+# Permissions live in list_members (list_id, user_id, permission), indexed by
+# user. The statements check them themselves; get_list_access() reads all of
+# the user's lists once per request for the answers that need to know them.
+
+def _list_dict(list_id, name, owner_id, permission):
+    return {'id': list_id, 'name': name, 'owner_id': owner_id,
+            'permission': PERMISSION_NAMES[permission]}
+
+
+@app.route('/api/lists', methods=['GET'])
+@require_user
+def get_lists(current_user):
+    # Every list the user can see WITH all their todos: two queries, however
+    # many lists (the lists + permissions, then the todos of all of them)
+    access = get_list_access(current_user.id)
+    todos = ListRepository(current_user.id).todos(list(access))
+    lists = [(list_id, _list_dict(list_id, *fields)) for list_id, fields in access.items()]
+    return app.response_class(encode_lists(lists, todos), mimetype='application/json')
+
+
+@app.route('/api/lists', methods=['POST'])
+@require_user
+def create_list(current_user):
+    # Step 1: Validate the name
+    data = request.get_json(silent=True) or {}
+    name = data.get('name')
+    max_length = TodoList.__table__.c.name.type.length
+    if not isinstance(name, str) or not name.strip() or len(name) > max_length:
+        return jsonify({'error': f'name must be 1-{max_length} characters'}), 400
+
+    # Step 2: The list and its owner's membership, in one transaction
+    list_id = ListRepository(current_user.id).create(name.strip())
+    db.session.commit()
+    return jsonify(_list_dict(list_id, name.strip(), current_user.id, OWNER)), 201
+
+
+@app.route('/api/lists/<int:list_id>', methods=['DELETE'])
+@require_user
+def delete_list(current_user, list_id):
+    # Owner only: deletes the list, its todos and its members
+    deleted = ListRepository(current_user.id).delete(list_id)
+    if deleted is None:
+        return _list_owner_required(current_user, list_id)
+
+    db.session.commit()
+    fragments.discard(shards.for_list(list_id), *deleted)
+    return jsonify({'message': 'List deleted'})
+
+
+def _list_owner_required(current_user, list_id):
+    # Members learn the list is someone else's; everyone else gets a 404
+    if _list_permission(current_user, list_id) is None:
+        return _list_not_found()
+    return jsonify({'error': 'Only the list owner can do that'}), 403
+
+
+@app.route('/api/lists/<int:list_id>/members', methods=['PUT'])
+@require_user
+def share_list(current_user, list_id):
+    # Step 1: Who, and may they edit? {"email": "...", "permission": "view" | "edit"}
+    data = request.get_json(silent=True) or {}
+    permission = data.get('permission')
+    permission = PERMISSIONS.get(permission) if isinstance(permission, str) else None
+    if permission not in (VIEW, EDIT):
+        return jsonify({'error': 'permission must be view or edit'}), 400
+    if not isinstance(data.get('email'), str):
+        return jsonify({'error': 'email is required'}), 400
+    member = find_user_by_email(data['email'])
+    if member is None:
+        return jsonify({'error': 'User not found'}), 404
+    if member.id == current_user.id:
+        return jsonify({'error': 'You cannot change your own permission'}), 400
+
+    # Step 2: INSERT ... SELECT ... WHERE <you own the list>, or change the permission
+    if not ListRepository(current_user.id).share(list_id, member.id, permission):
+        return _list_owner_required(current_user, list_id)
+    db.session.commit()
+    return jsonify({'list_id': list_id, 'user_id': member.id,
+                    'permission': PERMISSION_NAMES[permission]})
+
+
+@app.route('/api/lists/<int:list_id>/members/<int:user_id>', methods=['DELETE'])
+@require_user
+def unshare_list(current_user, list_id, user_id):
+    # The owner removes a member, or a member leaves (user_id = their own id)
+    if not ListRepository(current_user.id).unshare(list_id, user_id):
+        permission = _list_permission(current_user, list_id)
+        if permission is None:
+            return _list_not_found()
+        if user_id == current_user.id:
+            return jsonify({'error': 'The owner cannot leave the list (delete it instead)'}), 400
+        if permission != OWNER:
+            return _list_owner_required(current_user, list_id)
+        return jsonify({'error': 'Member not found'}), 404
+    db.session.commit()
+    return jsonify({'message': 'Member removed'})
 
 
 # ============================================
 # ADMIN API (Only users with is_admin=True)
 # ============================================
-# These routes check: 1) Is user logged in? 2) Is user an admin?
+# @require_admin checks: 1) Is user logged in? (401) 2) Is user an admin? (403)
 
 @app.route('/api/admin/users', methods=['GET'])
-def get_all_users():
-    # Step 1: Check if user is logged in AND is admin
-    current_user, error = get_admin_user()
-    if error:
-        return error  # Returns 401 if not logged in, 403 if not admin
-
-    # Step 2: Get all users
+@require_admin
+def get_all_users(current_user):
+    # Get all users (their todo counts: one query per shard, in parallel)
     users = User.query.all()
-    return jsonify({'users': [user.to_dict_with_stats() for user in users]})
+    counts = todo_counts_by_user()
+    return jsonify({'users': [user.to_dict_with_stats(counts) for user in users]})
 
 
 @app.route('/api/admin/users/<int:user_id>', methods=['DELETE'])
-def delete_user(user_id):
-    # Step 1: Check if user is admin
-    current_user, error = get_admin_user()
-    if error:
-        return error
-
-    # Step 2: Can't delete yourself
+@require_admin
+def delete_user(current_user, user_id):
+    # Step 1: Can't delete yourself
     if user_id == current_user.id:
         return jsonify({'error': 'Cannot delete yourself'}), 400
 
-    # Step 3: Find and delete user
+    # Step 2: Find and delete user
     user = User.query.get_or_404(user_id)
-    Todo.query.filter_by(user_id=user_id).delete()  # Delete user's todos first
+    owned = db.session.query(TodoList.id).filter_by(owner_id=user_id)
+    theirs = (Todo.user_id == user_id) | Todo.list_id.in_(owned)  # Incl. others' in their lists
+    todo_ids = {}  # shard -> ids
+    for shard in shards.names:  # Their todos in shared lists can be on any shard
+        options = shards.options(shard)
+        todos = Todo.query.filter(theirs).execution_options(**options)
+        todo_ids[shard] = [todo_id for (todo_id,) in todos.with_entities(Todo.id)]
+        todos.delete(synchronize_session=False)  # Delete user's todos first
+        archived = ArchivedTodo.query.filter(
+            (ArchivedTodo.user_id == user_id) | ArchivedTodo.list_id.in_(owned)  # And the archive
+        ).execution_options(**options)
+        todo_ids[shard] += [todo_id for (todo_id,) in archived.with_entities(ArchivedTodo.id)]
+        archived.delete(synchronize_session=False)
+    Tag.query.filter_by(user_id=user_id).execution_options(  # (their todo_tags went with the todos)
+        **shards.options(shards.for_user(user_id))).delete()
+    ListMember.query.filter((ListMember.user_id == user_id) | ListMember.list_id.in_(owned)) \
+        .delete(synchronize_session=False)  # Their memberships, and everyone's in their lists
+    TodoList.query.filter_by(owner_id=user_id).delete()
+    revoke_user_tokens(user)  # Their tokens stop working right away
     db.session.delete(user)
     db.session.commit()
+    todo_cache.invalidate(user_id)
+    for shard, ids in todo_ids.items():
+        fragments.discard(shard, *ids)
 
     return jsonify({'message': f'User {user.username} deleted'})
 
 
-@app.route('/api/admin/stats', methods=['GET'])
-def get_stats():
-    # Step 1: Check if user is admin
-    current_user, error = get_admin_user()
-    if error:
-        return error
+@app.route('/api/admin/users/import', methods=['POST'])
+@require_admin
+def import_users(current_user):
+    # Step 1: Check the format (?format=csv or ?format=ndjson)
+    if request.args.get('format', 'csv') not in EXPORT_FORMATS:
+        return jsonify({'error': 'format must be csv or ndjson'}), 400
+
+    # Step 2: The body is a CSV or NDJSON file, read as a stream (see bulk_import.py)
+    report = import_users_from_request(request)
+    return jsonify(report), 200 if report['imported'] else 400
 
-    # Step 2: Calculate stats
+
+@app.route('/api/admin/stats', methods=['GET'])
+@require_admin
+def get_stats(current_user):
+    # Calculate stats (the todo counts: every shard at once, then summed)
     total_users = User.query.count()
-    total_todos = Todo.query.count()
-    completed_todos = Todo.query.filter_by(is_completed=True).count()
+    todos = todo_stats()  # The trash doesn't count as total
 
     return jsonify({
         'total_users': total_users,
-        'total_todos': total_todos,
-        'completed_todos': completed_todos,
-        'pending_todos': total_todos - completed_todos
+        'total_todos': todos['total'],
+        'completed_todos': todos['completed'],
+        'pending_todos': todos['total'] - todos['completed'],
+        'trashed_todos': todos['trashed'],
+        'archived_todos': todos['archived']
     })
 
 
 @app.route('/api/admin/todos', methods=['GET'])
-def get_all_todos():
-    # Step 1: Check if user is admin
-    current_user, error = get_admin_user()
-    if error:
-        return error
-
-    # Step 2: Get ALL todos (not just admin's)
-    todos = Todo.query.all()
-    result = []
-    for todo in todos:
-        todo_data = todo.to_dict()
-        todo_data['username'] = todo.user.username  # Add owner's username
-        result.append(todo_data)
-    return jsonify({'todos': result})
+@require_admin
+def get_all_todos(current_user):
+    # Get ALL todos (not just admin's)
+    rows = all_todo_rows_with_owner()  # (todo, owner's username) pairs
+    return app.response_class(encode_todo_list_with_owner(rows), mimetype='application/json')
+
+
+@app.route('/api/admin/cache', methods=['GET'])
+@require_admin
+def get_cache_stats(current_user):
+    # Hit/miss counters and memory use of the todo list cache
+    return jsonify(todo_cache.stats())
 
 
 if __name__ == '__main__':
@@ -0,0 +1,169 @@
+# =============================================================================
+# Part 7: Archiver
+# =============================================================================
+# Heavy users pile up years of completed todos. They are rarely read again,
+# but every one of them makes the todos table - and each of its indexes -
+# bigger, and every list query and write walks those b-trees.
+#
+# This moves completed todos older than ARCHIVE_AFTER_DAYS (config.py, by
+# created_at) into todos_archive (migrations/0014), outside the request path:
+#
+#   1. Per transaction, copy at most ARCHIVE_BATCH of the oldest ones
+#      (a range read of ix_todos_is_completed, already in that order) with
+#      INSERT ... SELECT, then DELETE them from todos. Pause between batches
+#      so API requests get their writes in between.
+#   2. Only todos without subtasks left in todos (the trash counts) move, so
+#      a subtree goes leaves first and never loses the middle. A parent
+#      moves in a later batch, once its last subtask has.
+#
+# Archived todos keep their id. todos.id is AUTOINCREMENT (migrations/0015),
+# so a new todo never gets the id of an archived one.
+#
+# GET /api/todos only reads todos; ?include_archived=1 adds the archive.
+# Each user whose todos moved gets users.todo_list_version bumped, right
+# after the batch commits: the app's cached GET /api/todos (cache.py, in
+# another process) no longer matches it and is read again.
+#
+# Usage:
+#   python archive.py            # archive every ARCHIVE_INTERVAL_SECONDS (separate from the app)
+#   python archive.py --once     # one pass, then print the report
+# =============================================================================
+
+import sys
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, insert, delete, exists, literal, DateTime
+from sqlalchemy.orm import aliased
+
+from models import db, Todo, ArchivedTodo, _tag_names, bump_todo_list_versions
+from shards import shards
+from logs import get_logger
+
+ARCHIVE_BATCH = 500                # Todos moved per transaction
+PAUSE_SECONDS = 0.05               # Between batches, so other writers get the lock
+ARCHIVE_INTERVAL_SECONDS = 86400   # run_forever: how often to look for old todos
+
+# Copied as they are, except the version (+1: the todo's JSON gains archived_at)
+ARCHIVED_COLUMNS = ['id', 'task_content', 'is_completed', 'created_at', 'user_id', 'version',
+                    'position', 'due_at', 'parent_id', 'list_id', 'tags', 'archived_at']
+
+logger = get_logger(__name__)
+
+
+class TodoArchiver:
+    """Moves old completed todos to todos_archive in small batches. Call inside an app context.
+
+    clock: returns the current time as a naive UTC datetime (like
+    TrashPurger). sleep: called between batches. shard: the shard file to
+    archive in (None: not sharded) - the archive is on the todos' shard.
+    """
+
+    def __init__(self, age_days, batch_size=ARCHIVE_BATCH, pause=PAUSE_SECONDS,
+                 clock=datetime.utcnow, sleep=time.sleep, shard=None):
+        self.shard = shard
+        self.age = timedelta(days=age_days)
+        self.batch_size = batch_size
+        self.pause = pause
+        self.clock = clock
+        self.sleep = sleep
+
+    def _due(self, cutoff):
+        """SQL for the ids of up to batch_size todos to move, oldest first."""
+        candidate, child = aliased(Todo), aliased(Todo)
+        return (
+            select(candidate.id)
+            .where(candidate.is_completed == True,  # noqa: E712
+                   candidate.deleted_at.is_(None),
+                   candidate.created_at < cutoff,
+                   ~exists().where(child.parent_id == candidate.id))
+            .order_by(candidate.created_at)
+            .limit(self.batch_size)
+        )
+
+    def archive_batch(self, cutoff):
+        """Moves up to batch_size todos created before cutoff.
+
+        One transaction: the INSERT takes the write lock, so the DELETE
+        removes exactly the rows that were copied. Returns the moved
+        [(id, user_id)] (empty: nothing left to move).
+        """
+        rows = select(
+            Todo.id, Todo.task_content, Todo.is_completed, Todo.created_at, Todo.user_id,
+            Todo.version + 1, Todo.position, Todo.due_at, Todo.parent_id, Todo.list_id,
+            _tag_names, literal(self.clock(), DateTime),
+        ).where(Todo.id.in_(self._due(cutoff)))
+        options = shards.options(self.shard)
+        moved = db.session.execute(
+            insert(ArchivedTodo).from_select(ARCHIVED_COLUMNS, rows)
+            .returning(ArchivedTodo.id, ArchivedTodo.user_id, ArchivedTodo.list_id),
+            execution_options=options,
+        ).all()
+        if moved:
+            # The triggers delete the todo_tags rows and lower the tag counts
+            db.session.execute(
+                delete(Todo)
+                .where(Todo.id.in_([todo_id for todo_id, _, _ in moved]))
+                .execution_options(synchronize_session=False, **options)
+            )
+        db.session.commit()
+        # Shared lists aren't cached. After the move's commit (the users are
+        # in the main file): a list read in between is stored with the old
+        # version and missed on the next read.
+        users = {user_id for _, user_id, list_id in moved if list_id is None}
+        if users:
+            bump_todo_list_versions(users)
+            db.session.commit()
+        return moved
+
+    def run_once(self):
+        """Archives everything old enough now. Returns a report dict."""
+        started = time.perf_counter()
+        cutoff = self.clock() - self.age
+        archived = batches = 0
+        users = set()
+        longest = 0.0
+
+        while True:
+            batch_started = time.perf_counter()
+            moved = self.archive_batch(cutoff)
+            longest = max(longest, time.perf_counter() - batch_started)
+            batches += 1
+            if not moved:
+                # Not "fewer than batch_size": the batch may have freed
+                # parents that can only move now
+                break
+            archived += len(moved)
+            users.update(user_id for _, user_id, _ in moved)
+            self.sleep(self.pause)
+
+        report = {
+            'shard': self.shard,
+            'archived': archived,
+            'users': len(users),
+            'batches': batches,
+            'longest_batch_ms': round(longest * 1000, 1),
+            'seconds': round(time.perf_counter() - started, 2),
+        }
+        if archived:
+            logger.info('Archived todos', extra=report)
+        return report
+
+    def run_forever(self, interval=ARCHIVE_INTERVAL_SECONDS):
+        while True:
+            self.run_once()
+            self.sleep(interval)
+
+
+if __name__ == '__main__':
+    from app import app
+
+    with app.app_context():
+        archivers = [TodoArchiver(app.config['ARCHIVE_AFTER_DAYS'], shard=shard)
+                     for shard in shards.names]
+        if '--once' in sys.argv:
+            for archiver in archivers:
+                print(archiver.run_once())
+        else:
+            logger.info('Archiver started', extra={'shards': len(archivers)})
+            shards.run_each(app, [archiver.run_forever for archiver in archivers])
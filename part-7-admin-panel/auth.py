@@ -1,15 +1,25 @@
 # =============================================================================
-# Part 7: Authentication Helpers (with helper functions instead of decorators)
+# Part 7: Authentication Helpers (helper functions + @require_user decorators)
 # =============================================================================
 
 import jwt
+import time
+import hashlib
+import secrets
+import threading
+from functools import wraps
 from datetime import datetime, timedelta
 from werkzeug.security import generate_password_hash, check_password_hash
-# Note: We don't need 'wraps' anymore since we're not using decorators
-from flask import request, jsonify
+from flask import request, jsonify, current_app, g
+from sqlalchemy import update
 
 SECRET_KEY = 'your-secret-key-change-in-production'
 
+# Access tokens are sent with every request and live only a few minutes.
+# Refresh tokens are only sent to /api/token/refresh to get a new pair.
+ACCESS_TOKEN_EXPIRATION_MINUTES = 15
+REFRESH_TOKEN_EXPIRATION_DAYS = 30
+
 
 # =============================================================================
 # PASSWORD FUNCTIONS
@@ -26,34 +36,212 @@ def verify_password(password, password_hash):
 # JWT TOKEN FUNCTIONS
 # =============================================================================
 
-def create_token(user_id):
+def create_token(user_id, is_admin=False, token_version=0):
+    """Creates a short-lived access token."""
     payload = {
         'user_id': user_id,
-        'exp': datetime.utcnow() + timedelta(hours=24)
+        'is_admin': is_admin,      # Lets routes authorize without a DB lookup
+        'tv': token_version,       # Must match users.token_version
+        'iat': time.time(),        # Compared against token revocations
+        'jti': secrets.token_hex(8),  # Unique id, so logout can revoke just this token
+        'exp': datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRATION_MINUTES)
     }
     return jwt.encode(payload, SECRET_KEY, algorithm='HS256')
 
 def decode_token(token):
+    """Returns the token's claims (dict), or None if invalid/expired."""
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
-        return payload['user_id']
+        return jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
     except jwt.ExpiredSignatureError:
         return None
     except jwt.InvalidTokenError:
         return None
 
 
+# =============================================================================
+# REFRESH TOKENS
+# =============================================================================
+# A refresh token is a random string. The database only keeps its SHA-256
+# hash (indexed), so looking one up is a single index search.
+# Each refresh token works ONCE: using it revokes it and returns a new pair.
+
+def _hash_refresh_token(raw_token):
+    return hashlib.sha256(raw_token.encode()).hexdigest()
+
+
+def create_token_pair(user):
+    """Returns (access_token, refresh_token). Adds to the session; caller commits."""
+    from models import RefreshToken, db
+
+    raw_token = secrets.token_urlsafe(32)
+    db.session.add(RefreshToken(
+        token_hash=_hash_refresh_token(raw_token),
+        user_id=user.id,
+        expires_at=datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRATION_DAYS),
+    ))
+    return create_token(user.id, user.is_admin, user.token_version), raw_token
+
+
+def use_refresh_token(raw_token):
+    """Revokes raw_token and returns its user, or None if it can't be used.
+
+    ONE conditional UPDATE: a SELECT first would let two requests with the
+    same token both see it unused. The UPDATE takes the write lock, so the
+    second one waits and then matches no row.
+    """
+    from models import RefreshToken, User, db
+
+    now = datetime.utcnow()
+    user_id = db.session.execute(
+        update(RefreshToken)
+        .where(RefreshToken.token_hash == _hash_refresh_token(raw_token),
+               RefreshToken.revoked_at.is_(None),
+               RefreshToken.expires_at > now)
+        .values(revoked_at=now)
+        .returning(RefreshToken.user_id)
+        .execution_options(synchronize_session=False)
+    ).scalar()
+    if user_id is None:
+        return None
+    return db.session.get(User, user_id)
+
+
+def revoke_refresh_token(raw_token):
+    from models import RefreshToken
+
+    RefreshToken.query.filter_by(token_hash=_hash_refresh_token(raw_token), revoked_at=None) \
+        .update({'revoked_at': datetime.utcnow()})
+
+
+# =============================================================================
+# STATELESS MODE: TRUST SIGNED CLAIMS (AUTH_TRUST_CLAIMS = True)
+# =============================================================================
+# The token is signed, so nobody can change the user_id or is_admin inside it.
+# We can skip the User.query.get() on every request and build the user from
+# the token itself. The one thing a token can't tell us is whether it was
+# revoked after it was issued (user deleted, or admin rights removed).
+#
+# For that we keep a small in-memory list of revocations:
+#   user_id -> time of the latest revocation  (reject older tokens)
+#   set of jti                                (single logged-out tokens)
+# Both are O(1) lookups, done on every request in both modes. This process
+# updates them immediately; other processes reload them from the database
+# every AUTH_REVOCATION_REFRESH_SECONDS. Access tokens are short-lived, so
+# only the last few minutes of revocations ever need to be in memory.
+
+class ClaimsUser:
+    """Current user built from token claims (no database row)."""
+
+    __slots__ = ('id', 'is_admin', 'token_version')
+
+    def __init__(self, claims):
+        self.id = claims['user_id']
+        self.is_admin = claims.get('is_admin', False)
+        self.token_version = claims.get('tv', 0)
+
+
+class RevocationList:
+    def __init__(self):
+        self._revoked = {}         # user_id -> revoked_at (unix time)
+        self._revoked_jtis = set()
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """Reloads revocations young enough to matter (tokens expire)."""
+        from models import TokenRevocation, db
+
+        cutoff = time.time() - ACCESS_TOKEN_EXPIRATION_MINUTES * 60
+        rows = db.session.query(TokenRevocation.user_id, TokenRevocation.revoked_at,
+                                TokenRevocation.jti) \
+            .filter(TokenRevocation.revoked_at > cutoff)
+        revoked, revoked_jtis = {}, set()
+        for user_id, revoked_at, jti in rows:
+            if jti:
+                revoked_jtis.add(jti)
+            else:
+                revoked[user_id] = max(revoked_at, revoked.get(user_id, 0.0))
+        with self._lock:
+            self._revoked = revoked
+            self._revoked_jtis = revoked_jtis
+            self._loaded_at = time.time()
+
+    def refresh_if_due(self, interval):
+        if time.time() - self._loaded_at >= interval:
+            self.refresh()
+
+    def add(self, user_id, revoked_at):
+        with self._lock:
+            self._revoked[user_id] = max(revoked_at, self._revoked.get(user_id, 0.0))
+
+    def add_jti(self, jti):
+        with self._lock:
+            self._revoked_jtis.add(jti)
+
+    def is_revoked(self, claims):
+        if claims.get('jti') in self._revoked_jtis:
+            return True
+        revoked_at = self._revoked.get(claims['user_id'])
+        return revoked_at is not None and claims.get('iat', 0) <= revoked_at
+
+
+revocations = RevocationList()
+
+
+def revoke_user_tokens(user):
+    """Invalidates every token issued to user so far (on delete or demotion).
+
+    Adds to the current session; the caller commits.
+    """
+    from models import TokenRevocation, RefreshToken, db
+
+    revoked_at = time.time()
+    user.token_version = (user.token_version or 0) + 1
+    db.session.add(TokenRevocation(user_id=user.id, revoked_at=revoked_at))
+    RefreshToken.query.filter_by(user_id=user.id, revoked_at=None) \
+        .update({'revoked_at': datetime.utcnow()})
+    revocations.add(user.id, revoked_at)
+
+
+def revoke_access_token(claims):
+    """Invalidates one access token (logout). Caller commits."""
+    from models import TokenRevocation, db
+
+    db.session.add(TokenRevocation(user_id=claims['user_id'], revoked_at=time.time(),
+                                   jti=claims['jti']))
+    revocations.add_jti(claims['jti'])
+
+
 # =============================================================================
 # GET CURRENT USER (Helper Function)
 # =============================================================================
 # Returns: (user, None) if valid, or (None, error_response) if invalid
+#
+# The result is remembered for the rest of the request (in the WSGI environ,
+# which - unlike flask.g - is never shared between requests), so calling it
+# again (get_admin_user, a decorator, a helper) costs nothing.
+#
+# columns: load only these User columns (e.g. ('id', 'is_admin')) instead of
+# the whole row. You get a read-only row with those attributes. None = the
+# full User object.
 
-def get_current_user():
+def get_current_user(columns=None):
     """
     Validates JWT token and returns current user.
     Returns: (user, None) on success, (None, error_response) on failure
     """
-    from models import User
+    key = tuple(columns) if columns else None
+    results = request.environ.setdefault('todo.auth_results', {})
+    if key not in results:
+        if key is not None and results.get(None, (None, None))[0] is not None:
+            results[key] = results[None]  # Full user already loaded: reuse it
+        else:
+            results[key] = _resolve_current_user(key)
+    return results[key]
+
+
+def _resolve_current_user(columns):
+    from models import User, db
 
     # Step 1: Check if Authorization header exists
     if 'Authorization' not in request.headers:
@@ -67,14 +255,33 @@ def get_current_user():
     token = auth_header.split(' ')[1]
 
     # Step 3: Decode and validate token
-    user_id = decode_token(token)
-    if not user_id:
+    claims = decode_token(token)
+    if not claims:
         return None, (jsonify({'error': 'Token is invalid or expired'}), 401)
 
-    # Step 4: Get user from database
-    current_user = User.query.get(user_id)
+    # Step 4: Reject logged-out / revoked tokens (in-memory, O(1))
+    revocations.refresh_if_due(current_app.config.get('AUTH_REVOCATION_REFRESH_SECONDS', 30))
+    if revocations.is_revoked(claims):
+        return None, (jsonify({'error': 'Token has been revoked'}), 401)
+    g.token_claims = claims  # For /api/logout
+
+    # Step 5a: Stateless mode - trust the signed claims, no database query
+    if current_app.config.get('AUTH_TRUST_CLAIMS'):
+        return ClaimsUser(claims), None
+
+    # Step 5b: Get user from database (whole row, or just the columns asked for)
+    if columns is None:
+        current_user = User.query.get(claims['user_id'])
+    else:
+        # Keep order, no duplicates. todo_list_version: for the todo list cache (cache.py)
+        names = dict.fromkeys(('id', 'token_version', 'todo_list_version') + columns)
+        query = db.select(*[getattr(User, name) for name in names]) \
+            .where(User.id == claims['user_id'])
+        current_user = db.session.execute(query).first()
     if not current_user:
         return None, (jsonify({'error': 'User not found'}), 401)
+    if claims.get('tv', 0) != current_user.token_version:
+        return None, (jsonify({'error': 'Token has been revoked'}), 401)
 
     return current_user, None
 
@@ -84,13 +291,16 @@ def get_current_user():
 # =============================================================================
 # Same as get_current_user but also checks if user is admin
 
-def get_admin_user():
+def get_admin_user(columns=None):
     """
     Validates JWT token and returns current user IF they are admin.
     Returns: (user, None) on success, (None, error_response) on failure
     """
+    if columns is not None and 'is_admin' not in columns:
+        columns = tuple(columns) + ('is_admin',)
+
     # First, get the current user
-    current_user, error = get_current_user()
+    current_user, error = get_current_user(columns)
     if error:
         return None, error
 
@@ -99,3 +309,72 @@ def get_admin_user():
         return None, (jsonify({'error': 'Admin access required'}), 403)
 
     return current_user, None
+
+
+# =============================================================================
+# SHARED LIST ACCESS (Helper Function)
+# =============================================================================
+# Todo statements check list permissions themselves (see TodoRepository).
+# Routes that need to KNOW a permission - the dashboard shows each list's,
+# and a failed write must tell "read-only" (403) from "no such list" (404) -
+# get all of the user's lists in ONE indexed query, remembered for the rest
+# of the request like the auth result above.
+
+def get_list_access(user_id):
+    """{list_id: (name, owner_id, permission)} for every list user_id can see."""
+    from models import ListRepository
+
+    access = request.environ.setdefault('todo.list_access', {})
+    if user_id not in access:
+        access[user_id] = {
+            list_id: (name, owner_id, permission)
+            for list_id, name, owner_id, permission in ListRepository(user_id).visible()
+        }
+    return access[user_id]
+
+
+# =============================================================================
+# @require_user / @require_admin (Decorators)
+# =============================================================================
+# Instead of starting every route with:
+#
+#     current_user, error = get_current_user()
+#     if error:
+#         return error
+#
+# write:
+#
+#     @app.route('/api/todos')
+#     @require_user
+#     def get_todos(current_user):
+#         ...
+#
+# The decorator runs the check and passes the user as the first argument.
+# Routes that only need a few fields can ask for just those columns:
+#
+#     @require_user(columns=('id',))
+#
+# By default the columns come from app.config['AUTH_USER_COLUMNS'].
+
+_DEFAULT = object()
+
+
+def _auth_decorator(resolve):
+    def make(view=None, *, columns=_DEFAULT):
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                cols = current_app.config.get('AUTH_USER_COLUMNS') if columns is _DEFAULT else columns
+                current_user, error = resolve(cols)
+                if error:
+                    return error
+                return view(current_user, *args, **kwargs)
+            return wrapper
+
+        # Works both as @require_user and @require_user(columns=...)
+        return decorator(view) if view is not None else decorator
+    return make
+
+
+require_user = _auth_decorator(get_current_user)
+require_admin = _auth_decorator(get_admin_user)
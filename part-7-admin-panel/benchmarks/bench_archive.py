@@ -0,0 +1,141 @@
+# =============================================================================
+# Benchmark: the hot todos table before and after archiving
+# =============================================================================
+# One HEAVY user with years of history: RECENT todos they still work on and
+# OLD completed ones, plus LIGHT users with a few todos each.
+#
+# Measured before and after TodoArchiver moves the old completed todos to
+# todos_archive:
+#   size            - pages of the todos table and its indexes (dbstat)
+#   heavy list      - GET /api/todos query for the heavy user
+#   light list      - the same for a light user (smaller b-trees everywhere)
+#   create          - TodoRepository.create (finds the last position)
+#   toggle          - TodoRepository.toggle by id
+#   include_archived list - both tables, after archiving only
+#
+# Run from part-7-admin-panel/:   python benchmarks/bench_archive.py
+# =============================================================================
+
+import os
+import sys
+import time
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+
+from sqlalchemy import insert, text  # noqa: E402
+
+from app import app  # noqa: E402
+from models import db, User, Todo, ArchivedTodo, TodoRepository  # noqa: E402
+from positions import rank_key  # noqa: E402
+from archive import TodoArchiver, ARCHIVE_BATCH  # noqa: E402
+
+RECENT = 2_000
+OLD_COMPLETED = 200_000
+LIGHT_USERS = 500
+LIGHT_TODOS = 20
+SEED_BATCH = 10_000
+ARCHIVE_AFTER_DAYS = 365
+ROUNDS = 5
+WRITES = 1000  # creates / toggles per measurement
+
+
+def seed():
+    users = [User(username='heavy', email='heavy@example.com', password_hash='x')] + [
+        User(username=f'light{i}', email=f'light{i}@example.com', password_hash='x')
+        for i in range(LIGHT_USERS)
+    ]
+    db.session.add_all(users)
+    db.session.commit()
+    heavy, light = users[0].id, [user.id for user in users[1:]]
+    now = datetime.utcnow()
+    total = OLD_COMPLETED + RECENT
+    for start in range(0, total, SEED_BATCH):
+        rows = []
+        for i in range(start, min(start + SEED_BATCH, total)):
+            old = i < OLD_COMPLETED  # Oldest first, like a real history
+            rows.append({'task_content': f'Task {i}', 'is_completed': old or i % 3 == 0,
+                         'created_at': now - timedelta(days=ARCHIVE_AFTER_DAYS * 3 if old else 1),
+                         'user_id': heavy, 'version': 1, 'position': rank_key(i)})
+        db.session.execute(insert(Todo), rows)
+        db.session.commit()
+    for user_id in light:
+        TodoRepository(user_id).insert_many(
+            {'task_content': f'Task {n}', 'is_completed': n % 2 == 0} for n in range(LIGHT_TODOS))
+    db.session.commit()
+    return heavy, light[LIGHT_USERS // 2]
+
+
+def best_ms(run):
+    best = float('inf')
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        result = run()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+
+def per_write_us(run):
+    """Average microseconds per call over WRITES calls (rolled back after)."""
+    start = time.perf_counter()
+    for n in range(WRITES):
+        run(n)
+    elapsed = time.perf_counter() - start
+    db.session.rollback()
+    return elapsed / WRITES * 1_000_000
+
+
+def todos_pages():
+    """Pages used by the todos table and its indexes."""
+    return db.session.execute(text(
+        "SELECT sum(pageno) FROM (SELECT count(*) AS pageno FROM dbstat "
+        "WHERE name = 'todos' OR name IN "
+        "(SELECT name FROM sqlite_master WHERE tbl_name = 'todos' AND type = 'index'))"
+    )).scalar()
+
+
+def measure(heavy, light):
+    heavy_todos, light_todos = TodoRepository(heavy), TodoRepository(light)
+    ids = [todo.id for todo in heavy_todos.list()[-WRITES:]]
+    heavy_ms, heavy_rows = best_ms(heavy_todos.list)
+    light_ms, _ = best_ms(light_todos.list)
+    return {
+        'rows in todos': db.session.query(Todo).count(),
+        'todos + index pages': todos_pages(),
+        'heavy list (ms)': heavy_ms,
+        'heavy list rows': len(heavy_rows),
+        'light list (ms)': light_ms,
+        'create (us)': per_write_us(lambda n: heavy_todos.create(f'New {n}')),
+        'toggle (us)': per_write_us(lambda n: heavy_todos.toggle(ids[n % len(ids)])),
+    }
+
+
+def main():
+    with app.app_context():
+        heavy, light = seed()
+        before = measure(heavy, light)
+
+        report = TodoArchiver(ARCHIVE_AFTER_DAYS, pause=0).run_once()
+        assert report['archived'] == OLD_COMPLETED
+        assert db.session.query(ArchivedTodo).count() == report['archived']
+        after = measure(heavy, light)
+
+        print(f'Heavy user: {RECENT} recent todos, {OLD_COMPLETED} completed ones older than '
+              f'{ARCHIVE_AFTER_DAYS} days; {LIGHT_USERS} light users\n')
+        print(f'{"":22} {"before":>10} {"after":>10}')
+        for name in before:
+            print(f'{name:22} {before[name]:>10.1f} {after[name]:>10.1f}'
+                  if isinstance(before[name], float) else
+                  f'{name:22} {before[name]:>10} {after[name]:>10}')
+
+        archived_ms, rows = best_ms(lambda: TodoRepository(heavy).list(include_archived=True))
+        print(f'\nlist(include_archived=True): {archived_ms:.1f}ms for {len(rows)} rows')
+        print(f'Archived {report["archived"]} todos in {report["batches"]} batches of '
+              f'{ARCHIVE_BATCH}, {report["seconds"]}s; longest batch (write lock held): '
+              f'{report["longest_batch_ms"]}ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+# =============================================================================
+# Benchmark: resolving the current user
+# =============================================================================
+# Time spent on authentication per request (no route work):
+#
+#   helper           - old pattern: full User row, no memoization
+#   helper x2        - same, with a second helper call in the same request
+#   decorator        - @require_admin with the default column projection
+#   decorator x2     - same, plus a second lookup in the request (from flask.g)
+#
+# Run from part-7-admin-panel/:   python benchmarks/bench_auth.py
+# =============================================================================
+
+import os
+import sys
+import time
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+
+from app import app  # noqa: E402
+from models import User  # noqa: E402
+from auth import create_token, get_admin_user, require_admin, _resolve_current_user  # noqa: E402
+
+REQUESTS = 2_000
+ROUNDS = 5
+
+
+def per_request_us(headers, handle):
+    """Best of ROUNDS, in microseconds per request."""
+    best = float('inf')
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        for _ in range(REQUESTS):
+            with app.test_request_context('/api/admin/stats', headers=headers):
+                handle()
+        best = min(best, time.perf_counter() - start)
+    return best / REQUESTS * 1e6
+
+
+@require_admin
+def view(current_user):
+    return current_user.id
+
+
+def main():
+    with app.app_context():
+        admin = User.query.filter_by(email='admin@example.com').first()
+        token = create_token(admin.id, admin.is_admin, admin.token_version)
+    headers = {'Authorization': f'Bearer {token}'}
+
+    def helper_twice():
+        _resolve_current_user(None)
+        _resolve_current_user(None)
+
+    def decorator_twice():
+        view()
+        get_admin_user(app.config['AUTH_USER_COLUMNS'])
+
+    no_context = per_request_us(headers, lambda: None)
+    results = [
+        ('helper (full row)', per_request_us(headers, lambda: _resolve_current_user(None))),
+        ('helper x2 (full row)', per_request_us(headers, helper_twice)),
+        ('decorator (projection)', per_request_us(headers, view)),
+        ('decorator x2 (memoized)', per_request_us(headers, decorator_twice)),
+    ]
+    print(f'{REQUESTS} requests, request context overhead {no_context:.0f}us subtracted')
+    for label, us in results:
+        print(f'  {label:<26} {us - no_context:>7.0f}us per request')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+# =============================================================================
+# Benchmark: streaming export memory
+# =============================================================================
+# Exports one account with many todos through GET /api/todos/export and
+# samples the process RSS while the response is being read. With streaming
+# (yield_per + generator response) RSS should stay flat instead of growing
+# with the number of rows.
+#
+# Run from part-7-admin-panel/:
+#   python benchmarks/bench_export.py                 # 1,000,000 rows
+#   python benchmarks/bench_export.py --rows 100000
+# =============================================================================
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+from sqlalchemy import insert  # noqa: E402
+
+from app import app  # noqa: E402
+from models import db, User, Todo  # noqa: E402
+from positions import rank_key  # noqa: E402
+from auth import create_token  # noqa: E402
+
+SEED_BATCH = 50_000
+
+
+def rss_mb():
+    """Current resident memory of this process (Linux)."""
+    with open('/proc/self/statm') as f:
+        pages = int(f.read().split()[1])
+    return pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+
+
+def seed(rows):
+    with app.app_context():
+        user = User(username='exporter', email='exporter@example.com', password_hash='x')
+        db.session.add(user)
+        db.session.commit()
+        now = datetime.utcnow()
+        for start in range(0, rows, SEED_BATCH):
+            db.session.execute(insert(Todo), [
+                {'task_content': f'Task number {i}', 'is_completed': i % 3 == 0,
+                 'created_at': now, 'user_id': user.id, 'version': 1, 'position': rank_key(i)}
+                for i in range(start, min(start + SEED_BATCH, rows))
+            ])
+            db.session.commit()
+        return create_token(user.id, user.is_admin, user.token_version)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    print(f'Seeding {args.rows:,} todos...')
+    token = seed(args.rows)
+    client = app.test_client()
+
+    for fmt in ('csv', 'ndjson'):
+        response = client.get(f'/api/todos/export?format={fmt}',
+                              headers={'Authorization': f'Bearer {token}'}, buffered=False)
+        start_rss = rss_mb()
+        samples = []
+        total_bytes = 0
+        started = time.perf_counter()
+        for n, chunk in enumerate(response.response, start=1):
+            total_bytes += len(chunk)
+            if n % 200 == 0:
+                samples.append(rss_mb())
+        response.close()
+        seconds = time.perf_counter() - started
+
+        print(f'{fmt:>6}: {total_bytes / 1e6:.0f} MB in {seconds:.1f}s, '
+              f'RSS start {start_rss:.0f} MB, max {max(samples, default=start_rss):.0f} MB, '
+              f'end {rss_mb():.0f} MB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+# =============================================================================
+# Benchmark: ORM objects vs column-projected rows for list endpoints
+# =============================================================================
+# Loads one user's todos both ways and reports time and peak memory:
+#
+#   ORM       - Todo.query.filter_by(user_id=...).all()
+#   projected - TodoRepository.list(): select(columns) -> TodoRow (__slots__)
+#
+# Run from part-7-admin-panel/:   python benchmarks/bench_list_queries.py
+# =============================================================================
+
+import os
+import sys
+import time
+import tempfile
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+
+from sqlalchemy import insert  # noqa: E402
+
+from app import app  # noqa: E402
+from models import db, User, Todo, TodoRepository  # noqa: E402
+from positions import rank_key  # noqa: E402
+
+SIZES = [1_000, 10_000, 100_000]
+REPEAT = 5
+
+
+def seed(user_id, count, start_id):
+    rows = [
+        {'id': start_id + i, 'task_content': f'Task number {i}', 'is_completed': i % 3 == 0,
+         'created_at': datetime.utcnow(), 'user_id': user_id, 'version': 1,
+         'position': rank_key(i)}
+        for i in range(count)
+    ]
+    db.session.execute(insert(Todo), rows)
+    db.session.commit()
+
+
+def measure(load):
+    """Returns (best milliseconds, peak KiB) for load()."""
+    best = float('inf')
+    for _ in range(REPEAT):
+        db.session.expunge_all()  # Start every run with an empty identity map
+        start = time.perf_counter()
+        load()
+        best = min(best, time.perf_counter() - start)
+
+    db.session.expunge_all()
+    tracemalloc.start()
+    result = load()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del result
+    return best * 1000, peak / 1024
+
+
+def main():
+    with app.app_context():
+        print(f'{"todos":>8}  {"ORM":>10}  {"projected":>10}  {"ORM mem":>10}  {"proj mem":>10}')
+        next_id = 1
+        for n, count in enumerate(SIZES):
+            user = User(username=f'bench{n}', email=f'bench{n}@example.com', password_hash='x')
+            db.session.add(user)
+            db.session.commit()
+            user_id = user.id
+            seed(user_id, count, next_id)
+            next_id += count
+
+            orm_ms, orm_kb = measure(
+                lambda: Todo.query.filter_by(user_id=user_id).order_by(Todo.id).all())
+            row_ms, row_kb = measure(lambda: TodoRepository(user_id).list())
+            print(f'{count:>8}  {orm_ms:>8.1f}ms  {row_ms:>8.1f}ms  '
+                  f'{orm_kb:>8.0f}KB  {row_kb:>8.0f}KB')
+
+
+if __name__ == '__main__':
+    main()
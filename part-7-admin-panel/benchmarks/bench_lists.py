@@ -0,0 +1,112 @@
+# =============================================================================
+# Benchmark: the shared-lists dashboard as a user joins more lists
+# =============================================================================
+# GET /api/lists returns every list the user can see with all its todos.
+#
+#   two queries  - ListRepository.visible() + ListRepository.todos()
+#                  (the ACL is a subquery: same 2 queries for 1 or 500 lists)
+#   per list     - visible(), then TodoRepository(user, list).list() for each
+#                  list (the N+1 pattern)
+#
+# The user is a member of LISTS lists owned by others, each with TODOS_PER_LIST
+# todos; other users' lists they can't see fill the table around them.
+#
+# Run from part-7-admin-panel/:   python benchmarks/bench_lists.py
+# =============================================================================
+
+import os
+import sys
+import time
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+
+from sqlalchemy import insert, event  # noqa: E402
+
+from app import app  # noqa: E402
+from models import (db, User, TodoRepository, ListRepository, ListMember,  # noqa: E402
+                    VIEW, EDIT)
+
+ROUNDS = 5
+LIST_COUNTS = [1, 10, 100, 500]
+TODOS_PER_LIST = 20
+HIDDEN_LISTS = 1_000  # Lists the user is NOT a member of
+
+
+def make_list(owner_id, name):
+    list_id = ListRepository(owner_id).create(name)
+    TodoRepository(owner_id, list_id).insert_many(
+        {'task_content': f'Task {n}', 'is_completed': n % 4 == 0} for n in range(TODOS_PER_LIST)
+    )
+    return list_id
+
+
+def seed():
+    db.session.add_all([
+        User(username='reader', email='reader@example.com', password_hash='x'),
+        User(username='owner', email='owner@example.com', password_hash='x'),
+    ])
+    db.session.commit()
+    reader, owner = [User.query.filter_by(username=name).one().id for name in ('reader', 'owner')]
+    for n in range(HIDDEN_LISTS):
+        make_list(owner, f'Hidden {n}')
+    db.session.commit()
+    return reader, owner
+
+
+def join_lists(reader, owner, count, joined):
+    """Makes reader a member of count lists (creating the ones still missing)."""
+    while len(joined) < count:
+        list_id = make_list(owner, f'Shared {len(joined)}')
+        db.session.execute(insert(ListMember).values(
+            list_id=list_id, user_id=reader, permission=(VIEW, EDIT)[len(joined) % 2]))
+        joined.append(list_id)
+    db.session.commit()
+
+
+def two_queries(user_id):
+    lists = ListRepository(user_id)
+    return lists.visible(), lists.todos()
+
+
+def per_list(user_id):
+    visible = ListRepository(user_id).visible()
+    return visible, [todo for list_id, *_ in visible
+                     for todo in TodoRepository(user_id, list_id).list()]
+
+
+def measure(run, user_id):
+    """(best ms, statements per call, todos returned)."""
+    statements = []
+    listener = lambda *args: statements.append(1)  # noqa: E731
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        _, todos = run(user_id)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    best = float('inf')
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        run(user_id)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, len(statements), len(todos)
+
+
+def main():
+    with app.app_context():
+        reader, owner = seed()
+        joined = []
+        print(f'{"lists":>5} {"todos":>6} {"two queries":>12} {"per list":>10}   statements')
+        for count in LIST_COUNTS:
+            join_lists(reader, owner, count, joined)
+            fast_ms, fast_statements, fast_todos = measure(two_queries, reader)
+            slow_ms, slow_statements, slow_todos = measure(per_list, reader)
+            assert fast_todos == slow_todos == count * TODOS_PER_LIST
+            assert fast_statements == 2
+            print(f'{count:>5} {fast_todos:>6} {fast_ms:>10.1f}ms {slow_ms:>8.1f}ms'
+                  f'   {fast_statements} / {slow_statements}')
+
+
+if __name__ == '__main__':
+    main()
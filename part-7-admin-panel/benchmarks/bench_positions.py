@@ -0,0 +1,124 @@
+# =============================================================================
+# Benchmark: reordering a 100k-todo list
+# =============================================================================
+#   fractional - TodoRepository.move(): one UPDATE, one row written
+#   integers   - positions 0..n-1: every todo between the old and the new
+#                place is shifted by one (the approach we did NOT take)
+#
+# Also shows how many moves into the SAME gap it takes before a key is long
+# enough to trigger a rebalance, and how long that rebalance takes.
+#
+# Run from part-7-admin-panel/:   python benchmarks/bench_positions.py
+# =============================================================================
+
+import os
+import sys
+import time
+import random
+import tempfile
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+
+from sqlalchemy import insert, text  # noqa: E402
+
+from app import app  # noqa: E402
+from models import db, User, Todo, TodoRepository  # noqa: E402
+from positions import rank_key, MAX_KEY_LENGTH  # noqa: E402
+
+TODOS = 100_000
+MOVES = 1_000
+INTEGER_MOVES = 100  # Each one rewrites thousands of rows - keep it short
+SEED_BATCH = 10_000
+
+
+def seed():
+    user = User(username='bench', email='bench@example.com', password_hash='x')
+    db.session.add(user)
+    db.session.commit()
+    now = datetime.utcnow()
+    for start in range(0, TODOS, SEED_BATCH):
+        db.session.execute(insert(Todo), [
+            {'task_content': f'Task {i}', 'is_completed': False, 'created_at': now,
+             'user_id': user.id, 'version': 1, 'position': rank_key(i)}
+            for i in range(start, min(start + SEED_BATCH, TODOS))
+        ])
+    db.session.commit()
+
+    # The same list with plain integer positions, for comparison
+    db.session.execute(text(
+        'CREATE TABLE int_positions (id INTEGER PRIMARY KEY, user_id INTEGER, pos INTEGER)'))
+    db.session.execute(text('CREATE INDEX ix_int_positions ON int_positions (user_id, pos)'))
+    db.session.execute(text(
+        'INSERT INTO int_positions SELECT id, user_id, id - 1 FROM todos WHERE user_id = :u'),
+        {'u': user.id})
+    db.session.commit()
+    return user.id
+
+
+def fractional_moves(user_id, todo_ids):
+    todos = TodoRepository(user_id)
+    start = time.perf_counter()
+    for _ in range(MOVES):
+        todo_id, after_id = random.sample(todo_ids, 2)
+        todos.move(todo_id, after_id)
+        db.session.commit()
+    return (time.perf_counter() - start) / MOVES * 1000
+
+
+def integer_moves(user_id):
+    rewritten = 0
+    start = time.perf_counter()
+    for _ in range(INTEGER_MOVES):
+        old, new = random.sample(range(TODOS), 2)
+        params = {'u': user_id, 'old': old, 'new': new}
+        todo_id = db.session.execute(text(
+            'SELECT id FROM int_positions WHERE user_id = :u AND pos = :old'), params).scalar()
+        if new < old:
+            shift = 'pos = pos + 1 WHERE user_id = :u AND pos >= :new AND pos < :old'
+        else:
+            shift = 'pos = pos - 1 WHERE user_id = :u AND pos > :old AND pos <= :new'
+        rewritten += db.session.execute(text('UPDATE int_positions SET ' + shift), params).rowcount
+        db.session.execute(text('UPDATE int_positions SET pos = :new WHERE id = :id'),
+                           {'new': new, 'id': todo_id})
+        db.session.commit()
+    return (time.perf_counter() - start) / INTEGER_MOVES * 1000, rewritten / INTEGER_MOVES + 1
+
+
+def same_gap_moves(user_id, todo_ids):
+    """Moves todos into the same gap until the key is too long. Returns the count."""
+    todos = TodoRepository(user_id)
+    anchor, movers = todo_ids[0], todo_ids[1:]
+    for count, todo_id in enumerate(movers, start=1):
+        _, position = todos.move(todo_id, anchor)
+        db.session.commit()
+        if len(position) > MAX_KEY_LENGTH:
+            return count, len(position)
+
+
+def main():
+    random.seed(42)
+    with app.app_context():
+        user_id = seed()
+        todo_ids = [todo_id for (todo_id,) in db.session.query(Todo.id).filter_by(user_id=user_id)]
+
+        fractional_ms = fractional_moves(user_id, todo_ids)
+        integer_ms, integer_rows = integer_moves(user_id)
+        print(f'{TODOS} todos, random moves')
+        print(f'  fractional keys  {fractional_ms:>8.2f}ms per move   1 row written')
+        print(f'  integer shift    {integer_ms:>8.2f}ms per move   {integer_rows:.0f} rows written')
+
+        moves, length = same_gap_moves(user_id, todo_ids)
+        print(f'\nWorst case: {moves} moves into the same gap -> {length}-char key')
+
+        start = time.perf_counter()
+        rewritten = TodoRepository(user_id).rebalance_positions()
+        longest = db.session.execute(text(
+            'SELECT MAX(LENGTH(position)) FROM todos WHERE user_id = :u'), {'u': user_id}).scalar()
+        print(f'Rebalance: {rewritten} keys in {(time.perf_counter() - start) * 1000:.0f}ms, '
+              f'longest key now {longest} chars')
+
+
+if __name__ == '__main__':
+    main()
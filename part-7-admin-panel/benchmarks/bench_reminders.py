@@ -0,0 +1,163 @@
+# =============================================================================
+# Benchmark: 1M scheduled reminders, one simulated day
+# =============================================================================
+# Seeds 1,000,000 open todos with due dates spread over 24 hours, then runs
+# ReminderScheduler on a FAKE clock: "sleeping" just moves the clock forward,
+# so the whole day runs in a minute or two.
+#
+# Checks while it runs (the script fails with an AssertionError otherwise):
+#   - every open todo gets exactly ONE reminder
+#   - no reminder is sent before its due_at, and none is late
+#   - completed todos get none
+#   - todos rescheduled mid-run fire at the NEW time only
+#   - the heap never holds much more than one horizon's worth of todos
+#
+# For comparison: one "poll the whole table" query without the index.
+#
+# Run from part-7-admin-panel/:   python benchmarks/bench_reminders.py
+# =============================================================================
+
+import os
+import sys
+import time
+import random
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+
+from sqlalchemy import insert, text  # noqa: E402
+
+from app import app  # noqa: E402
+from models import db, User, Todo, TodoRepository  # noqa: E402
+from positions import rank_key  # noqa: E402
+from reminders import ReminderScheduler, HORIZON_SECONDS  # noqa: E402
+
+TODOS = 1_000_000
+USERS = 1_000
+DAY = 24 * 3600
+COMPLETED_EVERY = 100       # Every 100th todo is already done
+RESCHEDULED = 1_000         # Todos moved one hour later halfway through the day
+SEED_BATCH = 10_000
+START = datetime(2030, 1, 1)
+
+
+class FakeClock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += timedelta(seconds=seconds)
+
+
+class RecordingSink:
+    """Remembers when each todo was reminded, and checks it wasn't early."""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.fired = {}  # todo_id -> (fired at, due_at)
+
+    def send(self, reminders):
+        now = self.clock()
+        for reminder in reminders:
+            todo_id = reminder['todo_id']
+            assert todo_id not in self.fired, f'todo {todo_id} reminded twice'
+            due_at = datetime.fromisoformat(reminder['due_at'])
+            assert due_at <= now, f'todo {todo_id} reminded early'
+            self.fired[todo_id] = (now, due_at)
+
+
+def seed():
+    db.session.execute(insert(User), [
+        {'username': f'bench{u}', 'email': f'bench{u}@example.com', 'password_hash': 'x',
+         'is_admin': False, 'created_at': START, 'token_version': 0}
+        for u in range(USERS)
+    ])
+    user_ids = [user_id for (user_id,) in db.session.query(User.id).order_by(User.id)]
+    per_user = TODOS // USERS
+    rng = random.Random(42)
+    for start in range(0, TODOS, SEED_BATCH):
+        db.session.execute(insert(Todo), [
+            {'task_content': f'Task {i}', 'is_completed': i % COMPLETED_EVERY == 0,
+             'created_at': START, 'user_id': user_ids[i // per_user], 'version': 1,
+             'position': rank_key(i % per_user),
+             'due_at': START + timedelta(seconds=rng.randrange(DAY))}
+            for i in range(start, min(start + SEED_BATCH, TODOS))
+        ])
+        db.session.commit()
+
+
+def reschedule(clock):
+    """Moves RESCHEDULED todos due in the next hour to one hour later (via the app's update)."""
+    rows = db.session.execute(text(
+        'SELECT id, user_id, due_at FROM todos '
+        'WHERE is_completed = 0 AND reminded_at IS NULL AND due_at BETWEEN :a AND :b LIMIT :n'),
+        {'a': clock() + timedelta(seconds=1), 'b': clock() + timedelta(hours=1),
+         'n': RESCHEDULED}).all()
+    moved = {}
+    for todo_id, user_id, due_at in rows:
+        new_due_at = datetime.fromisoformat(str(due_at)) + timedelta(hours=1)
+        TodoRepository(user_id).update(todo_id, {'due_at': new_due_at})
+        moved[todo_id] = new_due_at
+    db.session.commit()
+    return moved
+
+
+def full_table_poll_ms(now):
+    """What polling without ix_todos_due_at_pending would cost per tick."""
+    start = time.perf_counter()
+    db.session.execute(text(
+        'SELECT id FROM todos NOT INDEXED '
+        'WHERE is_completed = 0 AND reminded_at IS NULL AND due_at <= :now'), {'now': now}).all()
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    with app.app_context():
+        start = time.perf_counter()
+        seed()
+        print(f'Seeded {TODOS} todos in {time.perf_counter() - start:.1f}s')
+
+        clock = FakeClock(START)
+        sink = RecordingSink(clock)
+        scheduler = ReminderScheduler(sink, clock=clock)
+
+        moved = {}
+        wakeups = 0
+        largest_heap = 0
+        start = time.perf_counter()
+        while clock() <= START + timedelta(seconds=DAY) + timedelta(hours=1):
+            scheduler.run_pending()
+            wakeups += 1
+            largest_heap = max(largest_heap, len(scheduler))
+            if not moved and clock() >= START + timedelta(seconds=DAY // 2):
+                moved = reschedule(clock)
+            clock.sleep(scheduler.seconds_until_next())
+        seconds = time.perf_counter() - start
+
+        # Every open todo exactly once, at its (possibly new) due time
+        expected = TODOS - TODOS // COMPLETED_EVERY
+        assert len(sink.fired) == expected, (len(sink.fired), expected)
+        completed = {todo_id for (todo_id,) in db.session.query(Todo.id).filter_by(is_completed=True)}
+        assert not completed & sink.fired.keys(), 'completed todo reminded'
+        for todo_id, new_due_at in moved.items():
+            assert sink.fired[todo_id][1] == new_due_at, f'todo {todo_id} used the old due_at'
+        latest = max(fired_at - due_at for fired_at, due_at in sink.fired.values())
+        assert latest == timedelta(0), f'reminder sent {latest} late'
+
+        poll_ms = full_table_poll_ms(START + timedelta(seconds=DAY // 2))
+        print(f'Simulated 1 day: {len(sink.fired)} reminders, {wakeups} wake-ups, '
+              f'{seconds:.1f}s ({len(sink.fired) / seconds:,.0f} reminders/s)')
+        print(f'  {len(moved)} rescheduled todos fired at the new time, '
+              f'{len(completed)} completed todos skipped')
+        print(f'  Largest heap: {largest_heap} todos ({HORIZON_SECONDS}s horizon)')
+        print(f'  Polling the whole table instead: {poll_ms:.0f}ms per tick')
+        print('OK: every reminder sent once, none early or late')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+# =============================================================================
+# Benchmark: JSON serialization of todo lists
+# =============================================================================
+# Compares the CPU time to build a GET /api/todos body for 1k/10k/100k todos:
+#
+#   to_dict + json   - what jsonify() did before (dict + isoformat per row)
+#   fragments (cold) - first request: encode every todo and cache it
+#   fragments (warm) - later requests: join the cached bytes
+#
+# Run from part-7-admin-panel/:   python benchmarks/bench_serialization.py
+# =============================================================================
+
+import os
+import sys
+import json
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import Todo  # noqa: E402
+from serializers import fragments, encode_todo_list  # noqa: E402
+
+SIZES = [1_000, 10_000, 100_000]
+REPEAT = 5
+
+
+def make_todos(count):
+    start = datetime(2024, 1, 1)
+    return [
+        Todo(id=i, task_content=f'Task number {i}', is_completed=(i % 3 == 0),
+             created_at=start + timedelta(seconds=i), user_id=1, version=1)
+        for i in range(1, count + 1)
+    ]
+
+
+def cpu_time(func):
+    """Best of REPEAT runs, in milliseconds of process CPU time."""
+    best = float('inf')
+    for _ in range(REPEAT):
+        start = time.process_time()
+        func()
+        best = min(best, time.process_time() - start)
+    return best * 1000
+
+
+def main():
+    print(f'{"todos":>8}  {"to_dict+json":>13}  {"frag cold":>10}  {"frag warm":>10}  {"speedup":>8}')
+    for count in SIZES:
+        todos = make_todos(count)
+        fragments.max_entries = max(fragments.max_entries, count)
+
+        def baseline():
+            json.dumps({'todos': [todo.to_dict() for todo in todos]},
+                       sort_keys=True, separators=(',', ':')).encode()
+
+        def cold():
+            fragments.clear()
+            encode_todo_list(todos)
+
+        def warm():
+            encode_todo_list(todos)
+
+        base_ms = cpu_time(baseline)
+        cold_ms = cpu_time(cold)
+        encode_todo_list(todos)  # Fill the cache for the warm runs
+        warm_ms = cpu_time(warm)
+        print(f'{count:>8}  {base_ms:>11.1f}ms  {cold_ms:>8.1f}ms  {warm_ms:>8.1f}ms  '
+              f'{base_ms / warm_ms:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
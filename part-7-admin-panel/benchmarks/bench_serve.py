@@ -0,0 +1,154 @@
+# =============================================================================
+# Benchmark: serve.py with different numbers of workers and threads
+# =============================================================================
+# Starts `python serve.py --workers W --threads T` for every pair in
+# WORKER_COUNTS x THREAD_COUNTS and sends it CLIENTS concurrent clients for
+# DURATION_SECONDS, each its own user:
+#   read   - GET /api/todos?tag=work (not cached, so every worker count
+#            does the same work: with more than one worker, serve.py turns
+#            the todo list cache off)
+#   write  - POST /api/todos, one in every WRITE_EVERY requests
+#
+# The clients run in this process, on the same machine: they take CPU from
+# the server, so compare the rows with each other, not with production.
+#
+# Run from part-7-admin-panel/:   python benchmarks/bench_serve.py
+# =============================================================================
+
+import os
+import sys
+import json
+import time
+import signal
+import socket
+import tempfile
+import threading
+import subprocess
+import http.client
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+
+from app import app  # noqa: E402
+from models import db, User, TodoRepository  # noqa: E402
+from auth import create_token  # noqa: E402
+
+WORKER_COUNTS = [1, 2, 4]
+THREAD_COUNTS = [1, 4, 8]
+CLIENTS = 16
+DURATION_SECONDS = 5
+WRITE_EVERY = 5
+SEED_TODOS = 200  # Per user; every other one tagged 'work'
+START_TIMEOUT_SECONDS = 30
+
+
+def seed():
+    """One user per client, with todos. Returns their access tokens."""
+    users = [User(username=f'client{i}', email=f'client{i}@example.com', password_hash='x')
+             for i in range(CLIENTS)]
+    db.session.add_all(users)
+    db.session.commit()
+    for user in users:
+        todos = TodoRepository(user.id)
+        todos.insert_many({'task_content': f'Task {n}', 'is_completed': False}
+                          for n in range(SEED_TODOS))
+        for n, todo in enumerate(todos.list()):
+            if n % 2 == 0:
+                todos.set_tags(todo.id, ['work'])
+    db.session.commit()
+    tokens = [create_token(user.id, user.is_admin, user.token_version) for user in users]
+    db.engine.dispose()  # serve.py opens its own
+    return tokens
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port, workers, threads):
+    server = subprocess.Popen(
+        [sys.executable, 'serve.py', '--bind', f'127.0.0.1:{port}',
+         '--workers', str(workers), '--threads', str(threads)],
+        cwd=APP_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + START_TIMEOUT_SECONDS
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return server
+        except OSError:
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError(f'serve.py did not start on port {port}')
+
+
+def request(port, method, path, token, body=None):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    try:
+        conn.request(method, path, body=json.dumps(body) if body is not None else None,
+                     headers={'Authorization': f'Bearer {token}',
+                              'Content-Type': 'application/json'})
+        response = conn.getresponse()
+        response.read()
+        return response.status
+    finally:
+        conn.close()
+
+
+def load(port, tokens):
+    """CLIENTS threads for DURATION_SECONDS. Returns (requests/s, p50 ms, p99 ms, errors)."""
+    latencies, errors = [], []
+    stop_at = time.monotonic() + DURATION_SECONDS
+
+    def client(token):
+        n = 0
+        while time.monotonic() < stop_at:
+            n += 1
+            started = time.perf_counter()
+            try:
+                if n % WRITE_EVERY == 0:
+                    status = request(port, 'POST', '/api/todos', token, {'task_content': f'New {n}'})
+                else:
+                    status = request(port, 'GET', '/api/todos?tag=work', token)
+            except OSError:
+                status = None
+            latencies.append(time.perf_counter() - started)
+            if status not in (200, 201):
+                errors.append(status)
+
+    threads = [threading.Thread(target=client, args=(token,)) for token in tokens]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - started
+    latencies.sort()
+    return (len(latencies) / seconds, latencies[len(latencies) // 2] * 1000,
+            latencies[len(latencies) * 99 // 100] * 1000, len(errors))
+
+
+def main():
+    with app.app_context():
+        tokens = seed()
+
+    print(f'{CLIENTS} clients for {DURATION_SECONDS}s each: GET /api/todos?tag=work, and '
+          f'1 in {WRITE_EVERY} POST /api/todos ({os.cpu_count()} CPUs)\n')
+    print(f'{"workers":>8} {"threads":>8} {"req/s":>8} {"p50 ms":>8} {"p99 ms":>8} {"errors":>7}')
+    for workers in WORKER_COUNTS:
+        for threads in THREAD_COUNTS:
+            port = free_port()
+            server = start_server(port, workers, threads)
+            try:
+                rate, p50, p99, errors = load(port, tokens)
+            finally:
+                server.send_signal(signal.SIGTERM)
+                server.wait()
+            print(f'{workers:>8} {threads:>8} {rate:>8.0f} {p50:>8.1f} {p99:>8.1f} {errors:>7}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+# =============================================================================
+# Benchmark: one database file vs todos spread over shard files
+# =============================================================================
+# WRITERS processes, each creating todos for its own user and committing
+# every one (like app processes serving POST /api/todos), while one more
+# process imports BULK todos per transaction for another user (like
+# POST /api/todos/import):
+#   TODO_SHARDS=0  - every commit waits for the one write lock of the file,
+#                    also while the import holds it
+#   TODO_SHARDS=N  - the writers' users are on other shards than the
+#                    importer's, and commit meanwhile
+#
+# Then the admin queries over SEED_TODOS todos (all_todo_rows_with_owner
+# for GET /api/admin/todos, todo_stats for GET /api/admin/stats), the
+# shards read in parallel (shards.fan_out) and one after the other.
+#
+# config.py reads TODO_SHARDS at import, so each setting runs in its own
+# process (python bench_shards.py --run N).
+#
+# Run from part-7-admin-panel/:   python benchmarks/bench_shards.py
+# =============================================================================
+
+import os
+import sys
+import json
+import time
+import tempfile
+import subprocess
+import multiprocessing
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SHARD_COUNTS = [0, 2, 4, 8]
+WRITERS = 7
+WRITES = 200          # Commits per writer
+BULK = 20_000         # Todos per import transaction
+BULK_ROUNDS = 3
+SEED_USERS = 400
+SEED_TODOS = 200_000  # For the admin queries
+ROUNDS = 3
+
+
+def best_ms(run):
+    best = float('inf')
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def run(shard_count):
+    """Runs in a subprocess: measures one TODO_SHARDS setting, prints JSON."""
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+    os.environ['TODO_SHARDS'] = str(shard_count)
+
+    from app import app
+    from models import db, User, TodoRepository, all_todo_rows_with_owner, todo_stats
+    from shards import shards
+
+    with app.app_context():
+        users = [User(username=f'user{i}', email=f'user{i}@example.com', password_hash='x')
+                 for i in range(SEED_USERS)]
+        db.session.add_all(users)
+        db.session.commit()
+        user_ids = [user.id for user in users]
+        for n, user_id in enumerate(user_ids):
+            TodoRepository(user_id).insert_many(
+                {'task_content': f'Task {i}', 'is_completed': i % 3 == 0}
+                for i in range(SEED_TODOS // SEED_USERS))
+            if n % 50 == 0:
+                db.session.commit()
+        db.session.commit()
+
+        # The importer's user on the first shard, the writers' round robin on
+        # the others (not sharded: everyone in the main file)
+        by_shard = {}
+        for user_id in user_ids:
+            by_shard.setdefault(shards.for_user(user_id), []).append(user_id)
+        names = sorted(by_shard, key=str)
+        importer = by_shard[names[0]].pop()
+        others = names[1:] or names
+        writers = [by_shard[others[n % len(others)]][n // len(others)] for n in range(WRITERS)]
+        db.engine.dispose()  # No open connections across fork()
+
+    def write(user_id, latencies):
+        with app.app_context():
+            todos = TodoRepository(user_id)
+            for n in range(WRITES):
+                started = time.perf_counter()
+                todos.create(f'Write {n}')
+                db.session.commit()
+                latencies.put(time.perf_counter() - started)
+
+    def bulk_import(user_id):
+        with app.app_context():
+            todos = TodoRepository(user_id)
+            for _ in range(BULK_ROUNDS):
+                todos.insert_many({'task_content': f'Import {i}', 'is_completed': False}
+                                  for i in range(BULK))
+                db.session.commit()
+
+    fork = multiprocessing.get_context('fork')
+    latencies = fork.Queue()
+    processes = [fork.Process(target=bulk_import, args=(importer,))] + [
+        fork.Process(target=write, args=(user_id, latencies)) for user_id in writers]
+    started = time.perf_counter()
+    for process in processes:
+        process.start()
+    commits = sorted(latencies.get() for _ in range(WRITERS * WRITES))
+    seconds = time.perf_counter() - started
+    for process in processes:
+        process.join()
+
+    with app.app_context():
+        rows = len(all_todo_rows_with_owner())
+        parallel_todos = best_ms(all_todo_rows_with_owner)
+        parallel_stats = best_ms(todo_stats)
+        pool, shards._pool = shards._pool, None  # fan_out without the pool: one by one
+        sequential_todos = best_ms(all_todo_rows_with_owner)
+        sequential_stats = best_ms(todo_stats)
+        shards._pool = pool
+
+    print(json.dumps({
+        'writes/s': WRITERS * WRITES / seconds,
+        'write p50 (ms)': commits[len(commits) // 2] * 1000,
+        'write p99 (ms)': commits[len(commits) * 99 // 100] * 1000,
+        'write max (ms)': commits[-1] * 1000,
+        'admin todos rows': rows,
+        'admin todos parallel (ms)': parallel_todos,
+        'admin todos sequential (ms)': sequential_todos,
+        'admin stats parallel (ms)': parallel_stats,
+        'admin stats sequential (ms)': sequential_stats,
+    }))
+
+
+def main():
+    results = {}
+    for count in SHARD_COUNTS:
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--run', str(count)],
+            capture_output=True, text=True, check=True,
+        ).stdout
+        results[count] = json.loads(next(line for line in output.splitlines()
+                                         if line.startswith('{"writes/s"')))
+
+    print(f'{WRITERS} writer processes x {WRITES} commits next to {BULK_ROUNDS} imports of '
+          f'{BULK} todos; admin queries over {SEED_TODOS} todos of {SEED_USERS} users '
+          f'({os.cpu_count()} CPUs)\n')
+    print(f'{"TODO_SHARDS":28}' + ''.join(f'{count:>10}' for count in SHARD_COUNTS))
+    for name in results[SHARD_COUNTS[0]]:
+        print(f'{name:28}' + ''.join(
+            f'{results[count][name]:>10.1f}' if isinstance(results[count][name], float)
+            else f'{results[count][name]:>10}' for count in SHARD_COUNTS))
+
+
+if __name__ == '__main__':
+    if '--run' in sys.argv:
+        run(int(sys.argv[sys.argv.index('--run') + 1]))
+    else:
+        main()
@@ -0,0 +1,149 @@
+# =============================================================================
+# Benchmark: loading, completing and deleting subtask trees
+# =============================================================================
+# Three tree shapes:
+#   wide   - 1 todo with 10,000 direct subtasks
+#   deep   - a chain MAX_TODO_DEPTH levels deep
+#   bushy  - 3 subtasks per todo, 8 levels (9,841 todos)
+#
+# Loading a subtree three ways:
+#   recursive CTE  - TodoRepository.subtree(): ONE query
+#   per level      - one query per level (WHERE parent_id IN (<previous level>))
+#   per todo       - one query per todo for its children (the N+1 pattern)
+#
+# Then complete_subtasks() and delete() on the same trees (one statement each).
+#
+# Run from part-7-admin-panel/:   python benchmarks/bench_subtasks.py
+# =============================================================================
+
+import os
+import sys
+import time
+import tempfile
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+
+from sqlalchemy import insert, select, func  # noqa: E402
+
+from app import app  # noqa: E402
+from models import db, User, Todo, TodoRepository, TodoRow, TODO_ROW_COLUMNS, MAX_TODO_DEPTH  # noqa: E402
+from positions import rank_key  # noqa: E402
+
+ROUNDS = 5
+OTHER_TODOS = 50_000  # Top-level todos of the same user, so the table isn't tiny
+SHAPES = [
+    ('wide', 10_000, 1),             # (name, children per todo, levels)
+    ('deep', 1, MAX_TODO_DEPTH),
+    ('bushy', 3, 8),
+]
+
+
+class Seeder:
+    """Inserts todos with ids chosen up front, so a whole level is one executemany."""
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.next_id = (db.session.query(func.max(Todo.id)).scalar() or 0) + 1
+        self.count = 0
+
+    def add(self, parent_ids):
+        rows = []
+        for parent_id in parent_ids:
+            rows.append({'id': self.next_id, 'task_content': f'Task {self.next_id}',
+                         'is_completed': False, 'created_at': datetime.utcnow(),
+                         'user_id': self.user_id, 'version': 1,
+                         'position': rank_key(self.count), 'parent_id': parent_id})
+            self.next_id += 1
+            self.count += 1
+        db.session.execute(insert(Todo), rows)
+        return [row['id'] for row in rows]
+
+    def tree(self, children, levels):
+        """Returns (root id, number of todos in the tree)."""
+        level = self.add([None])
+        root, size = level[0], 1
+        for _ in range(levels):
+            level = self.add([parent_id for parent_id in level for _ in range(children)])
+            size += len(level)
+        db.session.commit()
+        return root, size
+
+
+def per_level(todos, root_id):
+    rows = [TodoRow(*db.session.execute(todos._select().where(Todo.id == root_id)).one())]
+    level = [root_id]
+    while level:
+        children = [TodoRow(*row) for row in db.session.execute(
+            select(*TODO_ROW_COLUMNS)
+            .where(Todo.user_id == todos.user_id, Todo.parent_id.in_(level)))]
+        rows += children
+        level = [todo.id for todo in children]
+    return rows
+
+
+def per_todo(todos, root_id):
+    rows = [TodoRow(*db.session.execute(todos._select().where(Todo.id == root_id)).one())]
+    stack = [root_id]
+    while stack:
+        children = [TodoRow(*row) for row in db.session.execute(
+            select(*TODO_ROW_COLUMNS)
+            .where(Todo.user_id == todos.user_id, Todo.parent_id == stack.pop()))]
+        rows += children
+        stack += [todo.id for todo in children]
+    return rows
+
+
+def best_ms(run):
+    best = float('inf')
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        result = run()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+
+def timed_ms(run):
+    start = time.perf_counter()
+    result = run()
+    db.session.commit()
+    return (time.perf_counter() - start) * 1000, result
+
+
+def main():
+    with app.app_context():
+        user = User(username='bench', email='bench@example.com', password_hash='x')
+        db.session.add(user)
+        db.session.commit()
+        todos = TodoRepository(user.id)
+        seeder = Seeder(user.id)
+        seeder.add([None] * OTHER_TODOS)
+        trees = [(name, *seeder.tree(children, levels)) for name, children, levels in SHAPES]
+
+        print(f'{"tree":<7} {"todos":>6} {"CTE":>9} {"per level":>11} {"per todo":>10}'
+              f'   queries (CTE / level / todo)')
+        for name, root_id, size in trees:
+            cte_ms, cte_rows = best_ms(lambda: todos.subtree(root_id))
+            level_ms, level_rows = best_ms(lambda: per_level(todos, root_id))
+            todo_ms, todo_rows = best_ms(lambda: per_todo(todos, root_id))
+            assert len(cte_rows) == len(level_rows) == len(todo_rows) == size
+            levels = max(depth for _, depth in cte_rows) + 1
+            print(f'{name:<7} {size:>6} {cte_ms:>7.1f}ms {level_ms:>9.1f}ms {todo_ms:>8.1f}ms'
+                  f'   1 / {levels + 1} / {size + 1}')
+
+        # The depth limit is checked inside the INSERT
+        deepest = max(todos.subtree(trees[1][1]), key=lambda row: row[1])[0]
+        assert todos.create('Too deep', parent_id=deepest.id) is None
+        print(f'\nSubtask below level {MAX_TODO_DEPTH}: rejected')
+
+        print(f'\n{"tree":<7} {"complete all":>13} {"delete all":>11}')
+        for name, root_id, size in trees:
+            complete_ms, completed = timed_ms(lambda: todos.complete_subtasks(root_id))
+            delete_ms, deleted = timed_ms(lambda: todos.delete(root_id))
+            assert completed == size - 1 and len(deleted) == size
+            print(f'{name:<7} {complete_ms:>11.1f}ms {delete_ms:>9.1f}ms')
+
+
+if __name__ == '__main__':
+    main()
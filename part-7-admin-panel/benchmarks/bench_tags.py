@@ -0,0 +1,114 @@
+# =============================================================================
+# Benchmark: filtering 100k todos by tag
+# =============================================================================
+#   SQL     - TodoRepository.list(tags): INTERSECT / IN on the todo_tags index
+#   Python  - load every todo with its tags, keep the matching ones
+#
+# Also checks that tags.todo_count (kept by triggers) still equals a real
+# COUNT(*) after thousands of random retags and deletes (to the trash).
+#
+# Run from part-7-admin-panel/:   python benchmarks/bench_tags.py
+# =============================================================================
+
+import os
+import sys
+import time
+import random
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+
+from sqlalchemy import insert, text  # noqa: E402
+
+from app import app  # noqa: E402
+from models import db, User, Tag, TodoRepository, todo_tags  # noqa: E402
+
+TODOS = 100_000
+TAGS = [f'tag{i}' for i in range(20)]
+TAGS_PER_TODO = 3
+RETAGS = 5_000
+ROUNDS = 5
+QUERIES = [
+    (['tag1'], True),
+    (['tag1', 'tag2'], True),           # Both tags
+    (['tag1', 'tag2', 'tag3'], True),   # All three
+    (['tag1', 'tag2'], False),          # Either tag
+]
+
+
+def seed(rng):
+    user = User(username='bench', email='bench@example.com', password_hash='x')
+    db.session.add(user)
+    db.session.commit()
+    todos = TodoRepository(user.id)
+    todos.insert_many({'task_content': f'Task {i}', 'is_completed': False} for i in range(TODOS))
+    todo_ids = [todo.id for todo in todos.list()]
+    db.session.add_all(Tag(user_id=user.id, name=name, todo_count=0) for name in TAGS)
+    db.session.flush()
+    tag_ids = [tag_id for (tag_id,) in db.session.query(Tag.id).filter_by(user_id=user.id)]
+    # One executemany instead of set_tags() per todo (the triggers still count)
+    db.session.execute(insert(todo_tags), [
+        {'tag_id': tag_id, 'todo_id': todo_id}
+        for todo_id in todo_ids for tag_id in rng.sample(tag_ids, TAGS_PER_TODO)
+    ])
+    db.session.commit()
+    return todos, todo_ids
+
+
+def best_ms(run):
+    best = float('inf')
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        result = run()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+
+def python_filter(todos, tags, match_all):
+    wanted = set(tags)
+    test = wanted.issubset if match_all else wanted.intersection
+    return [todo for todo in todos.list() if test(todo.tag_names)]
+
+
+def counts_match(user_id):
+    """True if every stored todo_count equals the real number of live tagged todos."""
+    wrong = db.session.execute(text(
+        'SELECT COUNT(*) FROM tags WHERE user_id = :u AND todo_count != '
+        '(SELECT COUNT(*) FROM todo_tags JOIN todos ON todos.id = todo_tags.todo_id '
+        ' WHERE tag_id = tags.id AND todos.deleted_at IS NULL)'), {'u': user_id}).scalar()
+    return wrong == 0
+
+
+def main():
+    rng = random.Random(42)
+    with app.app_context():
+        start = time.perf_counter()
+        todos, todo_ids = seed(rng)
+        print(f'Seeded {TODOS} todos x {TAGS_PER_TODO} tags in {time.perf_counter() - start:.1f}s')
+
+        print(f'{"filter":<28} {"SQL":>9} {"Python":>9}  matches')
+        for tags, match_all in QUERIES:
+            sql_ms, sql_rows = best_ms(lambda: todos.list(tags, match_all))
+            py_ms, py_rows = best_ms(lambda: python_filter(todos, tags, match_all))
+            assert [t.id for t in sql_rows] == [t.id for t in py_rows]
+            label = (' AND ' if match_all else ' OR ').join(tags)
+            print(f'  {label:<26} {sql_ms:>7.1f}ms {py_ms:>7.1f}ms  {len(sql_rows)}')
+
+        # Incremental counts stay exact through retags and deletes
+        start = time.perf_counter()
+        for _ in range(RETAGS):
+            todos.set_tags(rng.choice(todo_ids), sorted(rng.sample(TAGS, rng.randint(0, 5))))
+        for todo_id in rng.sample(todo_ids, RETAGS // 5):
+            todos.delete(todo_id)
+        db.session.commit()
+        elapsed = (time.perf_counter() - start) * 1000 / (RETAGS + RETAGS // 5)
+        assert counts_match(todos.user_id), 'tags.todo_count out of sync'
+        print(f'\n{RETAGS} retags + {RETAGS // 5} deletes: {elapsed:.2f}ms each, counts exact')
+
+        count_ms, _ = best_ms(todos.tag_counts)
+        print(f'GET /api/tags query: {count_ms:.2f}ms (stored counts, nothing counted)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+# =============================================================================
+# Benchmark: toggling a todo from the dashboard
+# =============================================================================
+# The dashboard checkbox flips one todo. Two ways to do it:
+#
+#   read-modify-write - the old PUT: get_or_404, ownership check in Python,
+#                       set attribute, commit (SELECT + UPDATE through the ORM).
+#                       Registered below as a benchmark-only route.
+#   toggle            - POST /api/todos/<id>/toggle: one UPDATE ... RETURNING
+#
+# Reports requests/sec and the SQL statements each request sends.
+#
+# Run from part-7-admin-panel/:   python benchmarks/bench_toggle.py
+# =============================================================================
+
+import os
+import sys
+import time
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+
+from flask import request, jsonify  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+from app import app  # noqa: E402
+from models import db, User, Todo, TodoRepository  # noqa: E402
+from auth import create_token, require_user  # noqa: E402
+
+TODOS = 1_000
+REQUESTS = 2_000
+ROUNDS = 3
+
+
+@app.route('/bench/read-modify-write/<int:todo_id>', methods=['PUT'])
+@require_user
+def read_modify_write(current_user, todo_id):
+    todo = Todo.query.get_or_404(todo_id)
+    if todo.user_id != current_user.id:
+        return jsonify({'error': 'Not authorized'}), 403
+    todo.is_completed = request.get_json()['is_completed']
+    db.session.commit()
+    return jsonify(todo.to_dict())
+
+
+def setup():
+    with app.app_context():
+        user = User(username='bench', email='bench@example.com', password_hash='x')
+        db.session.add(user)
+        db.session.commit()
+        TodoRepository(user.id).insert_many(
+            {'task_content': f'Task {i}', 'is_completed': False} for i in range(TODOS))
+        db.session.commit()
+        todo_ids = [todo_id for (todo_id,) in db.session.query(Todo.id).filter_by(user_id=user.id)]
+        token = create_token(user.id, user.is_admin, user.token_version)
+    return {'Authorization': f'Bearer {token}'}, todo_ids
+
+
+def run(client, headers, todo_ids, send):
+    """Best of ROUNDS, in requests per second."""
+    best = float('inf')
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        for i in range(REQUESTS):
+            response = send(client, todo_ids[i % len(todo_ids)], headers, i)
+            assert response.status_code == 200, response.status_code
+        best = min(best, time.perf_counter() - start)
+    return REQUESTS / best
+
+
+def statements(client, headers, todo_id, send):
+    """SQL statements (excluding auth) that one request sends."""
+    sent = []
+
+    def record(conn, cursor, statement, *args):
+        if 'todos' in statement:
+            sent.append(statement.split()[0])
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            send(client, todo_id, headers, 0)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+    return sent
+
+
+completed = {}  # What the dashboard believes each checkbox shows
+
+
+def via_put(client, todo_id, headers, i):
+    completed[todo_id] = not completed.get(todo_id, False)
+    return client.put(f'/bench/read-modify-write/{todo_id}', json={'is_completed': completed[todo_id]},
+                      headers=headers)
+
+
+def via_toggle(client, todo_id, headers, i):
+    return client.post(f'/api/todos/{todo_id}/toggle', headers=headers)
+
+
+def main():
+    headers, todo_ids = setup()
+    client = app.test_client()
+
+    print(f'{REQUESTS} toggles over {TODOS} todos (best of {ROUNDS})')
+    for label, send in (('read-modify-write', via_put), ('POST toggle', via_toggle)):
+        rate = run(client, headers, todo_ids, send)
+        sql = statements(client, headers, todo_ids[0], send)
+        print(f'  {label:<24} {rate:>7.0f} req/s   SQL: {", ".join(sql)}')
+
+
+if __name__ == '__main__':
+    main()
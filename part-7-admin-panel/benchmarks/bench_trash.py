@@ -0,0 +1,109 @@
+# =============================================================================
+# Benchmark: a big trash next to a small live list, then purging it
+# =============================================================================
+# One user with LIVE todos and TRASHED todos (9 of every 10 rows deleted).
+#
+# Listing the live todos (TodoRepository.list()) through:
+#   partial index  - ix_todos_user_id_position (WHERE deleted_at IS NULL):
+#                    holds only the live todos
+#   full index     - the same columns without the WHERE: walks past every
+#                    trashed todo and reads its row to skip it
+#
+# Then TrashPurger deletes the whole (expired) trash in bounded batches and
+# gives the pages back with PRAGMA incremental_vacuum.
+#
+# Run from part-7-admin-panel/:   python benchmarks/bench_trash.py
+# =============================================================================
+
+import os
+import sys
+import time
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+
+from sqlalchemy import insert, text  # noqa: E402
+
+from app import app  # noqa: E402
+from models import db, User, Todo, TodoRepository  # noqa: E402
+from positions import rank_key  # noqa: E402
+from trash import TrashPurger, PURGE_BATCH  # noqa: E402
+
+LIVE = 20_000
+TRASHED = 180_000
+SEED_BATCH = 10_000
+RETENTION_DAYS = 30
+ROUNDS = 5
+LIST_SQL = ('SELECT id FROM todos {hint} WHERE user_id = :u AND list_id IS NULL '
+            'AND deleted_at IS NULL ORDER BY position, id')
+
+
+def seed():
+    user = User(username='bench', email='bench@example.com', password_hash='x')
+    db.session.add(user)
+    db.session.commit()
+    long_ago = datetime.utcnow() - timedelta(days=RETENTION_DAYS + 1)
+    total = LIVE + TRASHED
+    for start in range(0, total, SEED_BATCH):
+        db.session.execute(insert(Todo), [
+            {'task_content': f'Task {i}', 'is_completed': False, 'created_at': long_ago,
+             'user_id': user.id, 'version': 1, 'position': rank_key(i),
+             'deleted_at': None if i % 10 == 0 else long_ago}  # 1 in 10 is live
+            for i in range(start, min(start + SEED_BATCH, total))
+        ])
+        db.session.commit()
+    return user.id
+
+
+def best_ms(run):
+    best = float('inf')
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        result = run()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+
+def main():
+    with app.app_context():
+        user_id = seed()
+        todos = TodoRepository(user_id)
+        db.session.execute(text('CREATE INDEX ix_bench_full ON todos (user_id, position)'))
+        db.session.commit()
+
+        def list_with(hint):
+            return db.session.execute(text(LIST_SQL.format(hint=hint)), {'u': user_id}).all()
+
+        partial_ms, partial_rows = best_ms(lambda: list_with('INDEXED BY ix_todos_user_id_position'))
+        full_ms, full_rows = best_ms(lambda: list_with('INDEXED BY ix_bench_full'))
+        repo_ms, repo_rows = best_ms(todos.list)
+        assert len(partial_rows) == len(full_rows) == len(repo_rows) == LIVE
+        print(f'{LIVE} live todos, {TRASHED} in the trash')
+        print(f'  id list, partial index: {partial_ms:7.1f}ms  (index holds {LIVE} rows)')
+        print(f'  id list, full index:    {full_ms:7.1f}ms  (index holds {LIVE + TRASHED} rows)')
+        print(f'  TodoRepository.list():  {repo_ms:7.1f}ms  (all columns + tags)')
+        db.session.execute(text('DROP INDEX ix_bench_full'))
+        db.session.commit()
+
+        trash_ms, trash_rows = best_ms(todos.trash)
+        assert len(trash_rows) == TRASHED
+        print(f'  GET /api/todos/trash query: {trash_ms:.1f}ms')
+
+        report = TrashPurger(RETENTION_DAYS, pause=0).run_once()
+        assert report['purged'] == TRASHED
+        assert db.session.query(Todo).count() == LIVE
+        print(f'\nPurged {report["purged"]} todos in {report["batches"]} batches of '
+              f'{PURGE_BATCH}, {report["seconds"]}s')
+        print(f'  Longest batch (write lock held): {report["longest_batch_ms"]}ms')
+        if report['incremental_vacuum']:
+            print(f'  Pages given back: {report["pages_reclaimed"]} of {report["pages_before"]} '
+                  f'({report["bytes_reclaimed"] / 1024 / 1024:.1f} MB), '
+                  f'{report["free_pages"]} still free in the file')
+        else:
+            print('  auto_vacuum is not INCREMENTAL: no pages given back')
+
+
+if __name__ == '__main__':
+    main()
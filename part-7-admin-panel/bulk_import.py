@@ -0,0 +1,329 @@
+# =============================================================================
+# Part 7: Bulk Import (users and todos)
+# =============================================================================
+# Creating thousands of accounts through POST /api/register is slow: one
+# request, one password hash and one transaction per user. Password hashing
+# is deliberately slow (that's what makes it secure), so it dominates.
+#
+# This importer:
+#   1. Streams the file (CSV or NDJSON) - never loads it all into memory
+#   2. Works in chunks of CHUNK_SIZE rows
+#   3. Hashes each chunk's passwords in parallel on a process pool
+#   4. Inserts each chunk with ONE executemany in ONE transaction
+#   5. Reports rows/sec and an error for every row it skipped
+#
+# CSV needs a header row: username,email,password[,is_admin]
+# NDJSON is one object per line: {"username": ..., "email": ..., "password": ...}
+#
+# Usage:
+#   python bulk_import.py users.csv
+#   python bulk_import.py users.ndjson --workers 8 --chunk-size 1000
+# Or as admin: POST /api/admin/users/import?format=csv  (file as request body)
+#
+# Todos: POST /api/todos/import?format=csv|ndjson imports into the logged-in
+# user's list (see import_todos below), batch_size rows per transaction.
+# =============================================================================
+
+import io
+import os
+import re
+import csv
+import sys
+import json
+import time
+import argparse
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+from sqlalchemy import insert, or_
+from sqlalchemy.exc import IntegrityError
+
+from auth import hash_password
+from models import db, User, TodoRepository, normalize_email, parse_due_at, TASK_CONTENT_MAX
+
+CHUNK_SIZE = 500
+TODO_BATCH_SIZE = 1000
+MAX_TODO_BATCH_SIZE = 10_000  # Upper bound on one transaction's size
+MAX_REPORTED_ERRORS = 1000  # Keep the report small even if every row fails
+
+# Input is decoded with errors='surrogateescape': a byte that isn't UTF-8
+# becomes one of these characters instead of failing the whole import, and
+# its line is reported (valid UTF-8 never decodes to them)
+_UNDECODABLE = re.compile('[\udc80-\udcff]')
+NOT_UTF8 = 'Not valid UTF-8'
+
+
+# =============================================================================
+# READING
+# =============================================================================
+
+def iter_records(text_stream, fmt):
+    """Yields (line_number, dict) from a CSV or NDJSON text stream.
+
+    A line with bytes that aren't UTF-8 gives NOT_UTF8 instead of a dict.
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(text_stream)
+        for record in reader:
+            if _csv_undecodable(record):
+                record = NOT_UTF8
+            yield reader.line_num, record
+    elif fmt == 'ndjson':
+        for line_number, line in enumerate(text_stream, start=1):
+            if not line.strip():
+                continue
+            if _UNDECODABLE.search(line):
+                yield line_number, NOT_UTF8
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            yield line_number, record
+    else:
+        raise ValueError(f'Unknown format: {fmt} (use csv or ndjson)')
+
+
+def _csv_undecodable(record):
+    # Values are strings, None (missing) or a list (extra columns); keys too
+    for value in (*record.keys(), *record.values()):
+        for text in (value if isinstance(value, list) else [value]):
+            if isinstance(text, str) and _UNDECODABLE.search(text):
+                return True
+    return False
+
+
+def validate(record):
+    """Returns an error message, or None if the record can be imported."""
+    if record is NOT_UTF8:
+        return NOT_UTF8
+    if not isinstance(record, dict):
+        return 'Not a valid JSON object'
+    for field in ('username', 'email', 'password'):
+        if not record.get(field):
+            return f'{field} is required'
+        if not isinstance(record[field], str):  # NDJSON: {"username": 5}
+            return f'{field} must be a string'
+    if len(record['username']) > 80:
+        return 'username is longer than 80 characters'
+    if len(record['email']) > 120:
+        return 'email is longer than 120 characters'
+    return None
+
+
+def _is_true(value):
+    return str(value).strip().lower() in ('1', 'true', 'yes')
+
+
+# =============================================================================
+# IMPORTING
+# =============================================================================
+
+class ImportReport:
+    def __init__(self):
+        self.imported = 0
+        self.failed = 0
+        self.errors = []
+        self.started = time.perf_counter()
+
+    def error(self, line, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'error': message})
+
+    def to_dict(self):
+        seconds = time.perf_counter() - self.started
+        return {
+            'imported': self.imported,
+            'failed': self.failed,
+            'errors': self.errors,
+            'seconds': round(seconds, 2),
+            'rows_per_sec': round(self.imported / seconds, 1) if seconds else 0.0,
+        }
+
+
+def _drop_duplicates(chunk, report):
+    """Removes rows whose username/email is already taken (in DB or earlier in chunk)."""
+    usernames = [row['username'] for _, row in chunk]
+    emails = [row['email'] for _, row in chunk]
+    taken = db.session.execute(
+        db.select(User.username, db.func.lower(User.email))
+        .where(or_(User.username.in_(usernames), db.func.lower(User.email).in_(emails)))
+    ).all()
+    taken_usernames = {username for username, _ in taken}
+    taken_emails = {email for _, email in taken}
+
+    unique = []
+    for line, row in chunk:
+        if row['username'] in taken_usernames:
+            report.error(line, 'Username already taken')
+        elif row['email'] in taken_emails:
+            report.error(line, 'Email already registered')
+        else:
+            taken_usernames.add(row['username'])
+            taken_emails.add(row['email'])
+            unique.append((line, row))
+    return unique
+
+
+def _insert_chunk(chunk, pool, report):
+    chunk = _drop_duplicates(chunk, report)
+    if not chunk:
+        return
+
+    # Hash in parallel: this is where almost all the time goes
+    passwords = [row['password'] for _, row in chunk]
+    hashes = list(pool.map(hash_password, passwords, chunksize=max(1, len(passwords) // 32)))
+
+    now = datetime.utcnow()
+    rows = [
+        {'username': row['username'], 'email': row['email'], 'password_hash': password_hash,
+         'is_admin': _is_true(row.get('is_admin', False)), 'created_at': now,
+         'token_version': 0}
+        for (_, row), password_hash in zip(chunk, hashes)
+    ]
+
+    try:
+        db.session.execute(insert(User), rows)  # One executemany for the chunk
+        db.session.commit()
+        report.imported += len(rows)
+    except IntegrityError:
+        # Someone registered one of these names meanwhile - retry row by row
+        db.session.rollback()
+        for (line, _), values in zip(chunk, rows):
+            try:
+                db.session.execute(insert(User), [values])
+                db.session.commit()
+                report.imported += 1
+            except IntegrityError:
+                db.session.rollback()
+                report.error(line, 'Username or email already taken')
+
+
+def import_users(text_stream, fmt='csv', workers=None, chunk_size=CHUNK_SIZE):
+    """Imports users from a stream. Call inside an app context. Returns the report dict."""
+    report = ImportReport()
+    chunk = []
+
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        for line, record in iter_records(text_stream, fmt):
+            error = validate(record)
+            if error:
+                report.error(line, error)
+                continue
+            record['email'] = normalize_email(record['email'])
+            chunk.append((line, record))
+            if len(chunk) >= chunk_size:
+                _insert_chunk(chunk, pool, report)
+                chunk = []
+        if chunk:
+            _insert_chunk(chunk, pool, report)
+
+    return report.to_dict()
+
+
+def _request_text_stream(request):
+    """The request body as text, read as it arrives (works with chunked uploads)."""
+    return io.TextIOWrapper(request.stream, encoding='utf-8', errors='surrogateescape',
+                            newline='')
+
+
+def import_users_from_request(request, workers=None, chunk_size=CHUNK_SIZE):
+    """Streams the request body (CSV or NDJSON, per ?format=) into import_users."""
+    fmt = request.args.get('format', 'csv')
+    return import_users(_request_text_stream(request), fmt, workers, chunk_size)
+
+
+# =============================================================================
+# TODO IMPORT
+# =============================================================================
+# CSV header: task_content[,is_completed][,due_at]
+# NDJSON:     {"task_content": "...", "is_completed": false, "due_at": "2030-01-31T09:00:00Z"}
+
+def validate_todo(record):
+    """Returns an error message, or None if the todo can be imported."""
+    if record is NOT_UTF8:
+        return NOT_UTF8
+    if not isinstance(record, dict):
+        return 'Not a valid JSON object'
+    content = record.get('task_content')
+    if not isinstance(content, str) or not content.strip():
+        return 'task_content is required'
+    if len(content) > TASK_CONTENT_MAX:
+        return f'task_content is longer than {TASK_CONTENT_MAX} characters'
+    completed = record.get('is_completed', False)
+    if not isinstance(completed, bool) and str(completed).strip().lower() not in (
+            '', '0', '1', 'true', 'false', 'yes', 'no'):
+        return 'is_completed must be true or false'
+    try:
+        parse_due_at(record.get('due_at') or None)
+    except ValueError:
+        return 'due_at must be an ISO 8601 date/time'
+    return None
+
+
+def import_todos(user_id, text_stream, fmt='ndjson', batch_size=TODO_BATCH_SIZE):
+    """Imports todos for user_id, committing every batch_size rows.
+
+    Each batch is one executemany in one transaction, so a huge file never
+    holds the write lock for long. Batches already committed stay imported
+    if a later line is bad - bad lines are skipped and reported.
+    """
+    report = ImportReport()
+    batch_size = max(1, min(batch_size, MAX_TODO_BATCH_SIZE))
+    todos = TodoRepository(user_id)
+    batch = []
+
+    def flush():
+        todos.insert_many(batch)
+        db.session.commit()
+        report.imported += len(batch)
+        batch.clear()
+
+    for line, record in iter_records(text_stream, fmt):
+        error = validate_todo(record)
+        if error:
+            report.error(line, error)
+            continue
+        completed = record.get('is_completed', False)
+        batch.append({
+            'task_content': record['task_content'],
+            'is_completed': completed if isinstance(completed, bool) else _is_true(completed),
+            'due_at': parse_due_at(record.get('due_at') or None),
+        })
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+
+    return report.to_dict()
+
+
+def import_todos_from_request(request, user_id, default_batch_size=TODO_BATCH_SIZE):
+    """Streams the request body into import_todos (?format=, ?batch_size=)."""
+    fmt = request.args.get('format', 'ndjson')
+    batch_size = request.args.get('batch_size', default_batch_size, type=int)
+    return import_todos(user_id, _request_text_stream(request), fmt, batch_size)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Bulk import users from CSV or NDJSON')
+    parser.add_argument('path')
+    parser.add_argument('--format', choices=['csv', 'ndjson'],
+                        help='Default: from the file extension')
+    parser.add_argument('--workers', type=int, default=None, help='Default: CPU count')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+
+    fmt = args.format or ('ndjson' if args.path.endswith(('.ndjson', '.jsonl')) else 'csv')
+
+    from app import app
+
+    with app.app_context(), open(args.path, encoding='utf-8', errors='surrogateescape',
+                                     newline='') as f:
+        result = import_users(f, fmt, args.workers, args.chunk_size)
+
+    for error in result['errors']:
+        print(f'line {error["line"]}: {error["error"]}', file=sys.stderr)
+    print(f'Imported {result["imported"]} users, {result["failed"]} failed, '
+          f'{result["seconds"]}s ({result["rows_per_sec"]} rows/sec)')
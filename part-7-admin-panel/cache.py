@@ -0,0 +1,285 @@
+# =============================================================================
+# Part 7: Todo List Cache
+# =============================================================================
+# GET /api/todos is the most-read endpoint, and a user usually reads the same
+# list many times between changes. We keep each user's finished JSON response
+# in a cache and only go to the database when the list has changed.
+#
+#   read:   cache hit  -> return stored bytes (no query, no JSON encoding)
+#           cache miss -> query, encode, store
+#   write:  create/update/delete todo, delete user -> invalidate that user
+#
+# Other processes can't reach a 'local' cache: archive.py bumps the user's
+# users.todo_list_version instead (models.bump_todo_list_versions). Each
+# entry is stored with the version the reader saw, and an entry with
+# another version is a miss. @require_user loads the version with the
+# user row (auth.py), so a cache hit is still one statement.
+#
+# With AUTH_TRUST_CLAIMS there is no user row. Like the revocation list in
+# auth.py, each process then reloads the versions that changed from the
+# database every AUTH_REVOCATION_REFRESH_SECONDS (a range read of
+# ix_users_todo_list_version) - not a query per request. Archived todos can
+# show up that long after the move.
+#
+# Backends (TODO_CACHE_BACKEND in config.py):
+#   'local'  - LocalCache: in this process, LRU eviction under a memory cap
+#   'shared' - SharedCache: any client with get/set/delete (e.g. redis-py),
+#              so several app processes see the same cache. Without a real
+#              server, InMemorySharedClient stands in for it.
+# =============================================================================
+
+import time
+import threading
+from collections import OrderedDict
+
+# A bump is stamped before its transaction commits: reload from this much
+# before the last reload, so a slow commit isn't missed
+VERSION_COMMIT_SLACK_MS = 60_000
+
+
+# =============================================================================
+# BACKENDS
+# =============================================================================
+
+class LocalCache:
+    """Bounded in-process cache. Evicts least-recently-used entries
+    once the stored values exceed max_bytes."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> bytes, oldest first
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)  # Mark as recently used
+            return value
+
+    def set(self, key, value):
+        size = len(value)
+        if size > self.max_bytes:
+            return  # Would evict everything else; not worth caching
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= len(old)
+            self._entries[key] = value
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= len(evicted)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= len(old)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        return {
+            'backend': 'local',
+            'entries': len(self._entries),
+            'bytes': self.current_bytes,
+            'max_bytes': self.max_bytes,
+            'evictions': self.evictions,
+        }
+
+
+class InMemorySharedClient:
+    """Stand-in for a shared cache server (same get/set/delete calls as
+    redis-py). Used when no real server is configured."""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            return self._data.get(key)
+
+    def set(self, key, value, ex=None):
+        with self._lock:
+            self._data[key] = value
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def flushdb(self):
+        with self._lock:
+            self._data.clear()
+
+
+class SharedCache:
+    """Cache stored in a shared server. The server enforces its own memory
+    limit (e.g. Redis maxmemory + allkeys-lru), so entries just get a TTL."""
+
+    def __init__(self, client, ttl_seconds):
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+
+    def get(self, key):
+        return self.client.get(key)
+
+    def set(self, key, value):
+        self.client.set(key, value, ex=self.ttl_seconds)
+
+    def delete(self, key):
+        self.client.delete(key)
+
+    def clear(self):
+        self.client.flushdb()
+
+    def stats(self):
+        return {'backend': 'shared', 'ttl_seconds': self.ttl_seconds}
+
+
+# =============================================================================
+# TODO LIST CACHE
+# =============================================================================
+
+class TodoListCache:
+    """Caches each user's GET /api/todos response body."""
+
+    def __init__(self):
+        self.backend = None
+        self.hits = 0
+        self.misses = 0
+        # Bumped on every invalidation. A reader that started before an
+        # invalidation must not store its (now stale) result afterwards.
+        self._generations = {}
+        self._lock = threading.Lock()
+        # AUTH_TRUST_CLAIMS: user_id -> users.todo_list_version, if ever bumped
+        self._versions = {}
+        self._versions_loaded_ms = None  # None: not loaded yet
+        self._version_refresh_seconds = 30
+
+    def init_app(self, app, shared_client=None):
+        self._version_refresh_seconds = app.config.get('AUTH_REVOCATION_REFRESH_SECONDS', 30)
+        app.config.setdefault('TODO_CACHE_ENABLED', True)
+        app.config.setdefault('TODO_CACHE_BACKEND', 'local')
+        app.config.setdefault('TODO_CACHE_MAX_BYTES', 64 * 1024 * 1024)
+        app.config.setdefault('TODO_CACHE_TTL_SECONDS', 300)
+
+        if not app.config['TODO_CACHE_ENABLED']:
+            self.backend = None
+        elif app.config['TODO_CACHE_BACKEND'] == 'shared':
+            self.backend = SharedCache(shared_client or InMemorySharedClient(),
+                                       app.config['TODO_CACHE_TTL_SECONDS'])
+        else:
+            self.backend = LocalCache(app.config['TODO_CACHE_MAX_BYTES'])
+
+    @property
+    def process_local(self):
+        """True if the entries live in this process: another process (serve.py
+        worker) would never see this one's invalidations."""
+        if isinstance(self.backend, SharedCache):
+            return isinstance(self.backend.client, InMemorySharedClient)
+        return self.backend is not None
+
+    @property
+    def enabled(self):
+        return self.backend is not None
+
+    def disable(self):
+        self.backend = None
+
+    @staticmethod
+    def _key(user_id):
+        return f'todos:user:{user_id}'
+
+    def version(self, user):
+        """The current user's users.todo_list_version, for get() and set()."""
+        if self.backend is None:
+            return 0
+        version = getattr(user, 'todo_list_version', None)
+        if version is not None:
+            return version  # Loaded with the user row
+        # ClaimsUser (AUTH_TRUST_CLAIMS): no row
+        loaded_ms = self._versions_loaded_ms
+        if loaded_ms is None or time.time() - loaded_ms / 1000 >= self._version_refresh_seconds:
+            self._reload_versions()
+        return self._versions.get(user.id, 0)
+
+    def _reload_versions(self):
+        """All bumped versions the first time, then those bumped since the last reload."""
+        from models import User, db
+
+        started_ms = int(time.time() * 1000)
+        since = 1 if self._versions_loaded_ms is None \
+            else self._versions_loaded_ms - VERSION_COMMIT_SLACK_MS
+        rows = db.session.execute(
+            db.select(User.id, User.todo_list_version).where(User.todo_list_version >= since))
+        with self._lock:
+            self._versions.update(rows.all())
+            self._versions_loaded_ms = started_ms
+
+    def generation(self, user_id):
+        """Call before reading from the database; pass the result to set()."""
+        return self._generations.get(user_id, 0)
+
+    def get(self, user_id, version=0):
+        """Returns the cached response body (bytes), or None.
+
+        version: the user's users.todo_list_version. An entry stored under
+        another one is out of date.
+        """
+        if self.backend is None:
+            return None
+        body = None
+        entry = self.backend.get(self._key(user_id))
+        if entry is not None:
+            stored_version, _, body = entry.partition(b' ')
+            if int(stored_version) != version:
+                body = None
+        with self._lock:
+            if body is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return body
+
+    def set(self, user_id, body, generation, version=0):
+        """version: the users.todo_list_version read BEFORE the list was."""
+        if self.backend is None:
+            return
+        with self._lock:
+            if self._generations.get(user_id, 0) != generation:
+                return  # List changed while we were reading it
+            self.backend.set(self._key(user_id), b'%d %s' % (version, body))
+
+    def invalidate(self, user_id):
+        if self.backend is None:
+            return
+        with self._lock:
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            self.backend.delete(self._key(user_id))
+
+    def clear(self):
+        if self.backend is not None:
+            self.backend.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        result = {
+            'enabled': self.backend is not None,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 3) if total else 0.0,
+        }
+        if self.backend is not None:
+            result.update(self.backend.stats())
+        return result
+
+
+todo_cache = TodoListCache()
@@ -0,0 +1,380 @@
+# =============================================================================
+# Part 7: Query Plan Regression Check
+# =============================================================================
+# Calls every API route against a seeded throwaway database, records the SQL
+# each route runs, and asks SQLite how it would run it (EXPLAIN QUERY PLAN).
+#
+# If a hot route reads a whole table ("SCAN todos") instead of using an
+# index ("SEARCH todos USING INDEX ..."), the check fails. Run it after
+# changing models.py, a migration, or a query in app.py:
+#
+#   python check_query_plans.py
+#
+# It also checks that todo routes stay ownership-scoped (models.TodoRepository):
+# each sends at most TODO_STATEMENT_BUDGET statements to the todos table, and
+# touching another user's todo answers exactly like a missing one (404, or
+# 400 for a bad parent_id). Shared lists likewise: non-members get 404,
+# read-only members 403, and neither can change anything.
+#
+# With shards: TODO_SHARDS=3 python check_query_plans.py (every statement
+# must still pick its shard, see shards.py).
+#
+# Exit code 0 = all plans OK, 1 = at least one regression.
+# =============================================================================
+
+import os
+import re
+import sys
+import tempfile
+
+# Must happen before config.py is imported (by app.py)
+_tmp_dir = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_tmp_dir, 'plans.db')
+
+from datetime import datetime, timedelta  # noqa: E402
+
+from sqlalchemy import event, update  # noqa: E402
+
+from app import app  # noqa: E402
+from models import db, User, Todo, TodoRepository, ListRepository, VIEW, EDIT, OWNER  # noqa: E402
+from auth import hash_password, create_token, create_token_pair  # noqa: E402
+from archive import TodoArchiver  # noqa: E402
+from shards import shards  # noqa: E402
+
+SEED_USERS = 50
+SEED_TODOS_PER_USER = 40
+SEED_TAGS = ['work', 'home', 'urgent']  # Todo n gets tag i if n % (i + 2) == 0
+SEED_SUBTASK_LEVELS = 4
+SEED_LIST_TODOS = 20  # Every user owns a list, shared with the next two users
+SEED_ARCHIVE_AFTER_DAYS = 365  # Every other completed todo is older, and archived
+
+# Routes that list EVERYTHING have to read the whole table; that's expected.
+# Any other route doing a table scan is a regression.
+ALLOWED_SCANS = {
+    'GET /api/admin/users': {'users'},
+    'GET /api/admin/todos': {'todos'},
+}
+
+# Statements that reach the todos table (auth lookups not counted)
+TODO_STATEMENT_BUDGET = {
+    'GET /api/todos': 1,
+    'GET /api/todos?include_archived=1': 2,  # todos, then todos_archive
+    'GET /api/todos?tag=&tag=': 1,
+    'GET /api/todos?tag=&match=any': 1,
+    'POST /api/todos': 1,
+    'POST /api/todos (subtask)': 1,
+    'GET /api/todos/<id>/tree': 1,
+    # +1 when the todo becomes done: its open subtasks are completed too
+    'PUT /api/todos/<id>': 2,
+    'PATCH /api/todos/<id>': 1,
+    'POST /api/todos/<id>/toggle': 2,
+    'POST /api/todos/<id>/move': 1,
+    'DELETE /api/todos/<id>': 1,
+    'GET /api/todos/trash': 1,
+    'POST /api/todos/<id>/restore': 1,
+    'GET /api/lists': 1,  # The todos of ALL the user's lists in one query (per shard)
+    'GET /api/lists/<id>/todos': 1,
+    'GET /api/lists/<id>/todos?include_archived=1': 2,
+    'POST /api/lists/<id>/todos': 1,
+    'POST /api/lists/<id>/todos/<id>/toggle': 2,
+    'POST /api/lists/<id>/todos/<id>/move': 1,
+    'DELETE /api/lists/<id>/todos/<id>': 1,
+    'DELETE /api/lists/<id>': 2,  # Its todos, and its archived todos
+}
+
+
+# =============================================================================
+# SEED DATA
+# =============================================================================
+
+def seed():
+    password_hash = hash_password('password')  # Hash once, reuse (hashing is slow)
+    users = [
+        User(username=f'user{i}', email=f'user{i}@example.com', password_hash=password_hash)
+        for i in range(SEED_USERS)
+    ]
+    db.session.add_all(users)
+    db.session.flush()
+    for user in users:
+        todos = TodoRepository(user.id)
+        todos.insert_many(
+            {'task_content': f'Task {n}', 'is_completed': n % 3 == 0}
+            for n in range(SEED_TODOS_PER_USER)
+        )
+        for n, todo in enumerate(todos.list()):
+            todos.set_tags(todo.id, [tag for i, tag in enumerate(SEED_TAGS) if n % (i + 2) == 0])
+        # A few levels of subtasks under the first todo
+        parent_id = todos.list()[0].id
+        for level in range(SEED_SUBTASK_LEVELS):
+            children = [todos.create(f'Subtask {level}.{n}', parent_id=parent_id) for n in range(3)]
+            parent_id = children[0].id
+    # User i owns a list; user i+1 may view it, user i+2 may edit it
+    for i, user in enumerate(users):
+        lists = ListRepository(user.id)
+        list_id = lists.create(f'List {i}')
+        lists.share(list_id, users[(i + 1) % SEED_USERS].id, VIEW)
+        lists.share(list_id, users[(i + 2) % SEED_USERS].id, EDIT)
+        TodoRepository(user.id, list_id).insert_many(
+            {'task_content': f'Shared {n}', 'is_completed': n % 5 == 0}
+            for n in range(SEED_LIST_TODOS)
+        )
+    # Half the completed todos are old enough for archive.py
+    long_ago = datetime.utcnow() - timedelta(days=SEED_ARCHIVE_AFTER_DAYS + 1)
+    for shard in shards.names:
+        db.session.execute(update(Todo).where(Todo.is_completed == True, Todo.id % 2 == 0)  # noqa: E712
+                           .values(created_at=long_ago), execution_options=shards.options(shard))
+    db.session.commit()
+    for shard in shards.names:
+        TodoArchiver(SEED_ARCHIVE_AFTER_DAYS, pause=0, shard=shard).run_once()
+    return users[0]
+
+
+# =============================================================================
+# CAPTURE + EXPLAIN
+# =============================================================================
+
+def capture_sql(run_request):
+    """Runs run_request() and returns (its result, [(statement, parameters), ...])."""
+    captured = []
+
+    def before_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH')):
+            captured.append((statement, parameters))
+
+    event.listen(db.engine, 'before_cursor_execute', before_execute)
+    try:
+        result = run_request()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_execute)
+    return result, captured
+
+
+def table_scans(statement, parameters):
+    """Returns the tables this statement reads with a full scan."""
+    if statement.lstrip().upper().startswith('INSERT'):
+        return set()  # Nothing to search
+    raw = db.engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        cursor.execute('EXPLAIN QUERY PLAN ' + statement, parameters)
+        details = [row[3] for row in cursor.fetchall()]
+    finally:
+        raw.close()
+
+    scans = set()
+    for detail in details:
+        # "SCAN todos USING COVERING INDEX ..." only reads the (small) index
+        if detail.startswith('SCAN ') and 'COVERING INDEX' not in detail:
+            scans.add(detail.split()[1])
+    # "SCAN subtree" reads the rows a recursive CTE has found so far, not a table
+    return scans & {table.name for table in db.metadata.tables.values()}
+
+
+# =============================================================================
+# ROUTES TO CHECK
+# =============================================================================
+
+def list_todos(list_id):
+    return [todo_id for (todo_id,) in db.session.query(Todo.id).filter_by(list_id=list_id)
+            .order_by(Todo.id).execution_options(**shards.options(shards.for_list(list_id)))]
+
+
+def own_todos(user):
+    """Todo query on the user's shard."""
+    return Todo.query.execution_options(**shards.options(shards.for_user(user.id)))
+
+
+def shared_todo_count():
+    return sum(Todo.query.filter(Todo.list_id.isnot(None), Todo.deleted_at.is_(None))
+               .execution_options(**shards.options(shard)).count() for shard in shards.names)
+
+
+def hot_routes(user, admin, todo_id, lists):
+    """(label, method, url, json, token) for every API route."""
+    user_token = create_token(user.id, user.is_admin, user.token_version)
+    admin_token = create_token(admin.id, admin.is_admin, admin.token_version)
+    _, refresh_token = create_token_pair(user)
+    neighbour_id = own_todos(user).filter(Todo.user_id == user.id, Todo.id != todo_id).first().id
+    shared = f'/api/lists/{lists["edit"]}/todos'
+    shared_todo_id, shared_neighbour_id = list_todos(lists['edit'])[:2]
+    own_list = f'/api/lists/{lists["owner"]}'
+    member = User.query.filter(User.id != user.id, User.is_admin == False).first()  # noqa: E712
+    db.session.commit()
+    return [
+        ('POST /api/register', 'post', '/api/register',
+         {'username': 'newuser', 'email': 'new@example.com', 'password': 'x'}, None),
+        ('POST /api/login', 'post', '/api/login',
+         {'email': user.email, 'password': 'password'}, None),
+        ('POST /api/token/refresh', 'post', '/api/token/refresh',
+         {'refresh_token': refresh_token}, None),
+        ('GET /api/todos', 'get', '/api/todos', None, user_token),
+        ('GET /api/todos?include_archived=1', 'get', '/api/todos?include_archived=1',
+         None, user_token),
+        ('GET /api/todos?tag=&tag=', 'get', '/api/todos?tag=work&tag=home', None, user_token),
+        ('GET /api/todos?tag=&match=any', 'get', '/api/todos?tag=work&tag=urgent&match=any',
+         None, user_token),
+        ('GET /api/tags', 'get', '/api/tags', None, user_token),
+        ('POST /api/todos', 'post', '/api/todos', {'task_content': 'New'}, user_token),
+        ('POST /api/todos (subtask)', 'post', '/api/todos',
+         {'task_content': 'New subtask', 'parent_id': todo_id}, user_token),
+        ('GET /api/todos/<id>/tree', 'get', f'/api/todos/{todo_id}/tree', None, user_token),
+        ('PUT /api/todos/<id>', 'put', f'/api/todos/{todo_id}',
+         {'is_completed': True}, user_token),
+        ('PATCH /api/todos/<id>', 'patch', f'/api/todos/{todo_id}',
+         {'task_content': 'Edited', 'tags': ['work', 'new']}, user_token),
+        ('POST /api/todos/<id>/toggle', 'post', f'/api/todos/{todo_id}/toggle',
+         None, user_token),
+        ('POST /api/todos/<id>/move', 'post', f'/api/todos/{todo_id}/move',
+         {'after_id': neighbour_id}, user_token),
+        ('DELETE /api/todos/<id>', 'delete', f'/api/todos/{todo_id}', None, user_token),
+        ('GET /api/todos/trash', 'get', '/api/todos/trash', None, user_token),
+        ('POST /api/todos/<id>/restore', 'post', f'/api/todos/{todo_id}/restore',
+         None, user_token),
+        ('GET /api/lists/<id>/todos/trash', 'get', f'{shared}/trash', None, user_token),
+        ('GET /api/lists', 'get', '/api/lists', None, user_token),
+        ('POST /api/lists', 'post', '/api/lists', {'name': 'New list'}, user_token),
+        ('GET /api/lists/<id>/todos', 'get', shared, None, user_token),
+        ('GET /api/lists/<id>/todos?include_archived=1', 'get', f'{shared}?include_archived=1',
+         None, user_token),
+        ('POST /api/lists/<id>/todos', 'post', shared, {'task_content': 'New'}, user_token),
+        ('POST /api/lists/<id>/todos/<id>/toggle', 'post', f'{shared}/{shared_todo_id}/toggle',
+         None, user_token),
+        ('POST /api/lists/<id>/todos/<id>/move', 'post', f'{shared}/{shared_todo_id}/move',
+         {'after_id': shared_neighbour_id}, user_token),
+        ('DELETE /api/lists/<id>/todos/<id>', 'delete', f'{shared}/{shared_todo_id}',
+         None, user_token),
+        ('PUT /api/lists/<id>/members', 'put', f'{own_list}/members',
+         {'email': member.email, 'permission': 'edit'}, user_token),
+        ('DELETE /api/lists/<id>/members/<id>', 'delete', f'{own_list}/members/{member.id}',
+         None, user_token),
+        ('DELETE /api/lists/<id>', 'delete', own_list, None, user_token),
+        ('GET /api/admin/users', 'get', '/api/admin/users', None, admin_token),
+        ('GET /api/admin/stats', 'get', '/api/admin/stats', None, admin_token),
+        ('GET /api/admin/todos', 'get', '/api/admin/todos', None, admin_token),
+        ('POST /api/logout', 'post', '/api/logout', {}, user_token),
+        ('DELETE /api/admin/users/<id>', 'delete', f'/api/admin/users/{user.id}',
+         None, admin_token),
+    ]
+
+
+def ownership_probes(user, other_todo_id, lists):
+    """(label, method, url, json, token, status) that touch ANOTHER user's todo.
+
+    status is what a missing todo gets, so the two can't be told apart.
+    Shared lists: 403 where the user may only view, 404 where not a member.
+    """
+    token = create_token(user.id, user.is_admin, user.token_version)
+    url = f'/api/todos/{other_todo_id}'
+    viewed_list = f'/api/lists/{lists["view"]}'
+    viewed = f'{viewed_list}/todos/{list_todos(lists["view"])[0]}'
+    other_list = f'/api/lists/{lists["other"]}'
+    foreign = f'{other_list}/todos/{list_todos(lists["other"])[0]}'
+    return [
+        ('PUT /api/todos/<id>', 'put', url, {'is_completed': True}, token, 404),
+        ('PATCH /api/todos/<id>', 'patch', url, {'task_content': 'Mine now'}, token, 404),
+        ('PATCH /api/todos/<id> tags', 'patch', url, {'tags': ['mine']}, token, 404),
+        ('POST /api/todos/<id>/toggle', 'post', url + '/toggle', None, token, 404),
+        ('POST /api/todos/<id>/move', 'post', url + '/move', {'after_id': None}, token, 404),
+        ('GET /api/todos/<id>/tree', 'get', url + '/tree', None, token, 404),
+        ('POST /api/todos (subtask)', 'post', '/api/todos',
+         {'task_content': 'Mine now', 'parent_id': other_todo_id}, token, 400),
+        ('DELETE /api/todos/<id>', 'delete', url, None, token, 404),
+        ('POST /api/todos/<id>/restore', 'post', url + '/restore', None, token, 404),
+        ('PATCH /api/lists/<id>/todos/<id> (viewer)', 'patch', viewed,
+         {'task_content': 'Mine now'}, token, 403),
+        ('POST /api/lists/<id>/todos (viewer)', 'post', f'{viewed_list}/todos',
+         {'task_content': 'Mine now'}, token, 403),
+        ('POST /api/lists/<id>/todos/<id>/toggle (viewer)', 'post', viewed + '/toggle',
+         None, token, 403),
+        ('DELETE /api/lists/<id>/todos/<id> (viewer)', 'delete', viewed, None, token, 403),
+        ('DELETE /api/lists/<id> (viewer)', 'delete', viewed_list, None, token, 403),
+        ('GET /api/lists/<id>/todos (non-member)', 'get', f'{other_list}/todos',
+         None, token, 404),
+        ('GET /api/lists/<id>/todos?include_archived=1 (non-member)', 'get',
+         f'{other_list}/todos?include_archived=1', None, token, 404),
+        ('POST /api/lists/<id>/todos/<id>/toggle (non-member)', 'post', foreign + '/toggle',
+         None, token, 404),
+        ('DELETE /api/lists/<id>/todos/<id> (non-member)', 'delete', foreign, None, token, 404),
+        ('DELETE /api/lists/<id> (non-member)', 'delete', other_list, None, token, 404),
+    ]
+
+
+def todo_statements(statements):
+    # "FROM todos", "FROM shard2.todos", "todos_archive"
+    return sum(1 for statement, _ in statements if re.search(r'[ .]todos', statement))
+
+
+def main():
+    client = app.test_client()
+    failures = []
+
+    with app.app_context():
+        user = seed()
+        admin = User.query.filter_by(email='admin@example.com').first()
+        todo_id = own_todos(user).filter_by(user_id=user.id).first().id
+        # On the user's shard: ids are only unique per shard
+        other_todo_id = own_todos(user).filter(Todo.user_id != user.id, Todo.list_id.is_(None)) \
+            .order_by(Todo.id).first().id
+        stranger = User.query.filter_by(username=f'user{SEED_USERS // 2}').first()
+        lists = {permission: list_id
+                 for list_id, _, _, permission in ListRepository(user.id).visible()}
+        lists = {'owner': lists[OWNER], 'edit': lists[EDIT], 'view': lists[VIEW],
+                 'other': ListRepository(stranger.id).visible()[0][0]}
+        shared_todos = shared_todo_count()
+
+        # Step 1: Someone else's todo must look missing, and stay unchanged
+        # (other_todo_id has subtasks: a cascading delete must not reach them)
+        for label, method, url, body, token, status in ownership_probes(user, other_todo_id,
+                                                                        lists):
+            headers = {'Authorization': f'Bearer {token}'}
+            response, statements = capture_sql(
+                lambda: getattr(client, method)(url, json=body, headers=headers)
+            )
+            ok = response.status_code == status and todo_statements(statements) <= 1
+            if not ok:
+                failures.append((label, 'ownership', f'got {response.status_code}, '
+                                 f'{todo_statements(statements)} todo statements'))
+            print(f'{"ok" if ok else "FAIL":4}  {label} on another user\'s todo -> {response.status_code}')
+        other_todo = db.session.get(Todo, other_todo_id, execution_options=shards.options(
+            shards.for_user(user.id)))
+        if other_todo.deleted_at is not None:
+            failures.append(('DELETE /api/todos/<id>', 'ownership', "another user's todo was deleted"))
+        if shared_todo_count() != shared_todos:
+            failures.append(('/api/lists/<id>/todos', 'ownership', 'a shared list was changed'))
+
+        # Step 2: Query plans and statement counts of every route
+        routes = hot_routes(user, admin, todo_id, lists)
+        list_shards = len({shards.for_list(list_id)
+                           for list_id, *_ in ListRepository(user.id).visible()})
+
+        for label, method, url, body, token in routes:
+            headers = {'Authorization': f'Bearer {token}'} if token else {}
+            response, statements = capture_sql(
+                lambda: getattr(client, method)(url, json=body, headers=headers)
+            )
+            allowed = ALLOWED_SCANS.get(label, set())
+            for statement, parameters in statements:
+                bad = table_scans(statement, parameters) - allowed
+                if bad:
+                    failures.append((label, 'SCAN ' + ', '.join(sorted(bad)),
+                                     ' '.join(statement.split())))
+            budget = TODO_STATEMENT_BUDGET.get(label)
+            if label == 'GET /api/lists':
+                budget *= list_shards
+            if budget is not None and todo_statements(statements) > budget:
+                failures.append((label, 'statements', f'{todo_statements(statements)} '
+                                 f'statements on todos, budget is {budget}'))
+            status = 'FAIL' if any(f[0] == label for f in failures) else 'ok'
+            print(f'{status:4}  {label}  ({len(statements)} statements)')
+
+    if failures:
+        print('\nRegressions:')
+        for label, problem, detail in failures:
+            print(f'  {label}: {problem}\n    {detail}')
+        return 1
+    print('\nAll query plans use indexes.')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,72 @@
+# =============================================================================
+# Part 7: Configuration
+# =============================================================================
+# app.py loads these values with app.config.from_object('config').
+# Tools that run without the Flask app (like migrate.py) import them directly,
+# so both always talk to the same database file.
+
+import os
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+INSTANCE_DIR = os.path.join(BASE_DIR, 'instance')
+
+# Same file Flask-SQLAlchemy used for 'sqlite:///todo_part7.db' (instance/ folder)
+SQLALCHEMY_DATABASE_URI = os.environ.get(
+    'DATABASE_URL',
+    'sqlite:///' + os.path.join(INSTANCE_DIR, 'todo_part7.db')
+)
+SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+# Wait up to 30 seconds for a lock instead of failing with "database is locked"
+SQLALCHEMY_ENGINE_OPTIONS = {'connect_args': {'timeout': 30}}
+
+# Cache of each user's GET /api/todos response (see cache.py)
+TODO_CACHE_ENABLED = True
+TODO_CACHE_BACKEND = os.environ.get('TODO_CACHE_BACKEND', 'local')  # 'local' or 'shared'
+TODO_CACHE_MAX_BYTES = 64 * 1024 * 1024  # Local backend: LRU eviction above this
+TODO_CACHE_TTL_SECONDS = 300              # Shared backend: entry lifetime
+
+# Stateless auth (see auth.py): authorize from the signed token claims instead
+# of loading the user on every request. Deleted/demoted users are caught by an
+# in-memory revocation list reloaded from the database this often.
+AUTH_TRUST_CLAIMS = os.environ.get('AUTH_TRUST_CLAIMS', '0') == '1'
+AUTH_REVOCATION_REFRESH_SECONDS = 30
+
+# Columns @require_user / @require_admin load for the current user. Routes only
+# read .id and .is_admin, so there's no need to load the whole row.
+# None = load the full User object.
+AUTH_USER_COLUMNS = ('id', 'is_admin')
+
+# Logging (see logs.py): JSON lines written by a background thread
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+LOG_REQUESTS = True
+# Fraction of successful requests to log per route (errors are always logged)
+LOG_SAMPLE_RATES = {
+    'get_todos': 0.01,
+}
+
+# POST /api/todos/import: rows per transaction (override with ?batch_size=)
+TODO_IMPORT_BATCH_SIZE = 1000
+
+# reminders.py: POST due-date reminders here (unset = write them to the log)
+REMINDER_WEBHOOK_URL = os.environ.get('REMINDER_WEBHOOK_URL')
+
+# Deleted todos stay in the trash (restorable) this long; then trash.py
+# deletes them for real
+TRASH_RETENTION_DAYS = 30
+
+# archive.py moves completed todos older than this out of the todos table
+# (GET /api/todos?include_archived=1 still shows them)
+ARCHIVE_AFTER_DAYS = 365
+
+# Spread the todos over this many SQLite files next to the main one (see
+# shards.py), so users on different files don't wait for each other's
+# writes. 0 = everything in the main file. Fixed once there is data: moving
+# users between shards is not automated.
+TODO_SHARDS = int(os.environ.get('TODO_SHARDS', '0'))
+
+# serve.py (the production launcher): worker processes x threads per worker.
+# Each worker has its own database connections; see serve.py.
+SERVE_BIND = os.environ.get('SERVE_BIND', '127.0.0.1:8000')
+SERVE_WORKERS = int(os.environ.get('SERVE_WORKERS', os.cpu_count() or 1))
+SERVE_THREADS = int(os.environ.get('SERVE_THREADS', '4'))
@@ -0,0 +1,142 @@
+# =============================================================================
+# Part 7: Logging
+# =============================================================================
+# print() writes to stdout right away, inside the request, while the user
+# waits. Under load that I/O becomes the bottleneck. Instead:
+#
+#   1. Level-gated: logger.debug(...) costs almost nothing when LOG_LEVEL is
+#      INFO - the message is never even formatted.
+#   2. Asynchronous: the request only puts the record on a queue
+#      (QueueHandler). A background thread (QueueListener) does the writing.
+#   3. Structured: each line is one JSON object, easy to search and parse.
+#   4. Sampled: busy routes can log only a fraction of their requests
+#      (LOG_SAMPLE_RATES = {'get_todos': 0.01} logs 1 in 100).
+#
+# Usage:
+#   from logs import get_logger
+#   logger = get_logger(__name__)
+#   logger.info('Todo created', extra={'todo_id': todo.id})
+#
+# Never log passwords, tokens or Authorization headers.
+#
+# A forked process (serve.py workers) doesn't inherit the writer thread:
+# it starts its own, on a fresh queue.
+# =============================================================================
+
+import os
+import json
+import time
+import queue
+import atexit
+import random
+import logging
+import logging.handlers
+
+from flask import g, request
+
+ROOT_LOGGER = 'todo'
+
+# Attributes every LogRecord has; anything else came from extra={...}
+_STANDARD_ATTRS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message + extra fields."""
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def get_logger(name):
+    """Returns a logger under the app's 'todo' logger (so it uses the queue)."""
+    return logging.getLogger(f'{ROOT_LOGGER}.{name}')
+
+
+def setup_logging(app):
+    """Sends all 'todo.*' logs through a queue to a background writer thread."""
+    global _listener
+
+    app.config.setdefault('LOG_LEVEL', 'INFO')
+    app.config.setdefault('LOG_SAMPLE_RATES', {})
+    app.config.setdefault('LOG_REQUESTS', True)
+
+    root = logging.getLogger(ROOT_LOGGER)
+    root.setLevel(app.config['LOG_LEVEL'])
+    root.propagate = False
+
+    if _listener is None:
+        # The slow part (formatting + writing) happens on the listener's thread
+        writer = logging.StreamHandler()
+        writer.setFormatter(JsonFormatter())
+        log_queue = queue.SimpleQueue()
+        root.addHandler(logging.handlers.QueueHandler(log_queue))
+        _listener = logging.handlers.QueueListener(log_queue, writer)
+        _listener.start()
+        atexit.register(stop_logging)  # Flush what's left on exit
+        os.register_at_fork(after_in_child=_restart_after_fork)
+
+    if app.config['LOG_REQUESTS']:
+        _install_request_logging(app)
+
+
+def stop_logging():
+    """Writes out every queued record, then stops the writer thread."""
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
+
+
+def _restart_after_fork():
+    # The parent's records still in the queue are the parent's to write: the
+    # child gets an empty queue and its own writer thread
+    global _listener
+    log_queue = queue.SimpleQueue()
+    for handler in logging.getLogger(ROOT_LOGGER).handlers:
+        if isinstance(handler, logging.handlers.QueueHandler):
+            handler.queue = log_queue
+    _listener = logging.handlers.QueueListener(log_queue, *_listener.handlers)
+    _listener.start()
+
+
+# =============================================================================
+# REQUEST LOGGING (WITH PER-ROUTE SAMPLING)
+# =============================================================================
+
+def _install_request_logging(app):
+    logger = get_logger('request')
+    sample_rates = app.config['LOG_SAMPLE_RATES']
+
+    @app.before_request
+    def start_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def log_request(response):
+        # Errors are always logged; successes only at the route's sample rate
+        rate = sample_rates.get(request.endpoint, 1.0)
+        if response.status_code < 400 and rate < 1.0 and random.random() >= rate:
+            return response
+        if not logger.isEnabledFor(logging.INFO):
+            return response
+
+        logger.info('request', extra={
+            'method': request.method,
+            'path': request.path,
+            'endpoint': request.endpoint,
+            'status': response.status_code,
+            'duration_ms': round((time.perf_counter() - g.get('request_started', 0)) * 1000, 2),
+            'sample_rate': rate,
+        })
+        return response
@@ -0,0 +1,242 @@
+# =============================================================================
+# Part 7: Schema Migrations
+# =============================================================================
+# db.create_all() only creates tables that don't exist yet. It can't add a
+# column or an index to a table that already has data in it, so every schema
+# change used to mean "delete the .db file and start again".
+#
+# Instead, each schema change is a small versioned script in migrations/:
+#
+#   migrations/0001_initial.py
+#   migrations/0002_something_new.py
+#
+# Each script has:
+#   upgrade(conn)  - DDL/data changes, run inside ONE transaction
+#   INDEXES        - (optional) indexes to build AFTER that transaction
+#
+# To change an index, a later migration drops it in upgrade() and declares
+# it again in INDEXES under the same name: the latest declaration wins.
+#
+# The database remembers which versions ran in the schema_version table.
+# With TODO_SHARDS (shards.py), every shard file is migrated too, on its own:
+# each one gets the whole schema and its own schema_version.
+#
+# Usage:
+#   python migrate.py            # apply pending migrations
+#   python migrate.py status     # show current vs latest version
+# =============================================================================
+
+import os
+import re
+import sys
+import time
+import importlib.util
+from datetime import datetime
+
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.exc import OperationalError
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+MIGRATION_FILE = re.compile(r'^(\d{4})_(\w+)\.py$')
+
+# Index builds retry this many times if another writer holds the lock
+INDEX_BUILD_RETRIES = 5
+
+
+class SchemaBehindError(RuntimeError):
+    """Raised at startup when the database needs `python migrate.py`."""
+
+
+# =============================================================================
+# LOADING MIGRATION SCRIPTS
+# =============================================================================
+
+def load_migrations():
+    """Returns [(version, name, module), ...] sorted by version."""
+    migrations = []
+    for filename in sorted(os.listdir(MIGRATIONS_DIR)):
+        match = MIGRATION_FILE.match(filename)
+        if not match:
+            continue
+        version, name = int(match.group(1)), match.group(2)
+        spec = importlib.util.spec_from_file_location(
+            f'migrations_{version:04d}', os.path.join(MIGRATIONS_DIR, filename)
+        )
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        migrations.append((version, name, module))
+    return migrations
+
+
+def latest_version():
+    migrations = load_migrations()
+    return migrations[-1][0] if migrations else 0
+
+
+def current_version(engine):
+    """Returns the highest applied version (0 for a brand-new database)."""
+    if not inspect(engine).has_table('schema_version'):
+        return 0
+    with engine.connect() as conn:
+        version = conn.exec_driver_sql('SELECT MAX(version) FROM schema_version').scalar()
+    return version or 0
+
+
+# =============================================================================
+# ONLINE INDEX BUILDS
+# =============================================================================
+# SQLite has no CREATE INDEX CONCURRENTLY: building an index holds the write
+# lock until it finishes. To keep that window short we:
+#   1. Use WAL mode, so readers keep reading while the index is built
+#   2. Build each index in its OWN transaction (not inside the migration)
+#   3. Retry if another writer currently holds the lock
+# Writers wait for one index at a time instead of the whole migration.
+
+def create_index_online(engine, name, table, columns, where=None, unique=False):
+    """Builds one index (if missing) in its own short transaction."""
+    sql = 'CREATE {unique}INDEX IF NOT EXISTS {name} ON {table} ({columns})'.format(
+        unique='UNIQUE ' if unique else '',
+        name=name,
+        table=table,
+        columns=', '.join(columns),
+    )
+    if where:
+        sql += f' WHERE {where}'
+
+    for attempt in range(INDEX_BUILD_RETRIES):
+        try:
+            with engine.begin() as conn:
+                conn.exec_driver_sql(sql)
+            return
+        except OperationalError as e:
+            if 'locked' not in str(e) or attempt == INDEX_BUILD_RETRIES - 1:
+                raise
+            time.sleep(0.5 * (attempt + 1))
+
+
+def declared_indexes(migrations, applied=None):
+    """{index name: definition} from the migrations (up to version applied).
+
+    If several migrations declare the same name, the latest one wins.
+    """
+    indexes = {}
+    for version, name, module in migrations:
+        if applied is not None and version > applied:
+            break
+        for index in getattr(module, 'INDEXES', []):
+            indexes[index['name']] = index
+    return indexes
+
+
+def missing_indexes(engine, migrations=None):
+    """Returns names of declared indexes (from applied migrations) that don't exist."""
+    migrations = migrations if migrations is not None else load_migrations()
+    applied = current_version(engine)
+    # Read sqlite_master directly: the inspector skips expression indexes
+    with engine.connect() as conn:
+        existing = {name for (name,) in conn.exec_driver_sql(
+            "SELECT name FROM sqlite_master WHERE type = 'index'")}
+
+    return [name for name in declared_indexes(migrations, applied) if name not in existing]
+
+
+# =============================================================================
+# UPGRADE
+# =============================================================================
+
+def _ensure_version_table(engine):
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            'CREATE TABLE IF NOT EXISTS schema_version ('
+            'version INTEGER PRIMARY KEY, name VARCHAR(100) NOT NULL, applied_at DATETIME)'
+        )
+
+
+def upgrade(engine, log=print):
+    """Applies every pending migration, then builds any missing indexes."""
+    migrations = load_migrations()
+
+    with engine.connect() as conn:
+        conn.exec_driver_sql('PRAGMA journal_mode=WAL')
+    _ensure_version_table(engine)
+    applied = current_version(engine)
+
+    # Step 1: Run each pending migration in its own transaction
+    for version, name, module in migrations:
+        if version <= applied:
+            continue
+        log(f'Applying migration {version:04d}_{name}')
+        with engine.connect() as conn:
+            # BEGIN IMMEDIATE takes the write lock up front, and makes the
+            # sqlite3 driver include DDL in the transaction (it doesn't by default)
+            conn.exec_driver_sql('BEGIN IMMEDIATE')
+            module.upgrade(conn)
+            conn.exec_driver_sql(
+                'INSERT INTO schema_version (version, name, applied_at) VALUES (?, ?, ?)',
+                (version, name, datetime.utcnow()),
+            )
+            conn.commit()
+
+    # Step 2: Build indexes one at a time (also repairs an interrupted build)
+    for index in declared_indexes(migrations).values():
+        create_index_online(engine, **index)
+
+    return current_version(engine)
+
+
+def bootstrap(engine, log=print):
+    """Creates the schema for a brand-new (empty) database."""
+    if not inspect(engine).get_table_names():
+        log('Empty database - applying all migrations')
+        # Only possible before the first table exists: lets trash.py give
+        # purged pages back to the OS a few at a time (PRAGMA incremental_vacuum)
+        with engine.connect() as conn:
+            conn.exec_driver_sql('PRAGMA auto_vacuum = INCREMENTAL')
+        upgrade(engine, log=log)
+
+
+# =============================================================================
+# STARTUP CHECK
+# =============================================================================
+
+def check_schema(engine):
+    """Raises SchemaBehindError if the database is older than the code."""
+    migrations = load_migrations()
+    latest = migrations[-1][0] if migrations else 0
+    current = current_version(engine)
+
+    if current < latest:
+        raise SchemaBehindError(
+            f'Database schema is at version {current}, code needs {latest}. '
+            f'Run: python migrate.py'
+        )
+
+    missing = missing_indexes(engine, migrations)
+    if missing:
+        raise SchemaBehindError(
+            f'Database is missing indexes: {", ".join(missing)}. '
+            f'Run: python migrate.py'
+        )
+
+
+if __name__ == '__main__':
+    import config
+    from shards import shard_files
+
+    os.makedirs(config.INSTANCE_DIR, exist_ok=True)
+    databases = [('main', config.SQLALCHEMY_DATABASE_URI)] + [
+        (name, f'sqlite:///{path}')
+        for name, path in shard_files(config.SQLALCHEMY_DATABASE_URI, config.TODO_SHARDS)]
+
+    for name, uri in databases:
+        engine = create_engine(uri, **config.SQLALCHEMY_ENGINE_OPTIONS)
+        if len(sys.argv) > 1 and sys.argv[1] == 'status':
+            print(f'[{name}] Current version: {current_version(engine)}')
+            print(f'[{name}] Latest version:  {latest_version()}')
+            missing = missing_indexes(engine) if current_version(engine) else []
+            if missing:
+                print(f'[{name}] Missing indexes: {", ".join(missing)}')
+        else:
+            version = upgrade(engine)
+            print(f'[{name}] Database is at version {version}')
+        engine.dispose()
@@ -0,0 +1,32 @@
+# =============================================================================
+# Migration 0001: Initial schema (users + todos)
+# =============================================================================
+# Matches what db.create_all() used to create, so databases made by earlier
+# versions of this app are adopted as-is (IF NOT EXISTS).
+
+
+def upgrade(conn):
+    conn.exec_driver_sql('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER NOT NULL,
+            username VARCHAR(80) NOT NULL,
+            email VARCHAR(120) NOT NULL,
+            password_hash VARCHAR(256) NOT NULL,
+            is_admin BOOLEAN,
+            created_at DATETIME,
+            PRIMARY KEY (id),
+            UNIQUE (username),
+            UNIQUE (email)
+        )
+    ''')
+    conn.exec_driver_sql('''
+        CREATE TABLE IF NOT EXISTS todos (
+            id INTEGER NOT NULL,
+            task_content VARCHAR(200) NOT NULL,
+            is_completed BOOLEAN,
+            created_at DATETIME,
+            user_id INTEGER NOT NULL,
+            PRIMARY KEY (id),
+            FOREIGN KEY(user_id) REFERENCES users (id)
+        )
+    ''')
@@ -0,0 +1,17 @@
+# =============================================================================
+# Migration 0002: Indexes for the hot todo queries
+# =============================================================================
+# Without these, filter_by(user_id=...) and filter_by(is_completed=True).count()
+# read every row in the todos table.
+
+
+def upgrade(conn):
+    pass  # Nothing to change in a transaction - only new indexes
+
+
+INDEXES = [
+    {'name': 'ix_todos_user_id_is_completed', 'table': 'todos',
+     'columns': ['user_id', 'is_completed']},
+    {'name': 'ix_todos_is_completed', 'table': 'todos',
+     'columns': ['is_completed']},
+]
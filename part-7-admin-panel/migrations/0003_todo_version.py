@@ -0,0 +1,11 @@
+# =============================================================================
+# Migration 0003: Row version for todos
+# =============================================================================
+# Todo.version is bumped on every update; serializers.py uses (id, version)
+# to cache each todo's encoded JSON.
+
+
+def upgrade(conn):
+    conn.exec_driver_sql(
+        'ALTER TABLE todos ADD COLUMN version INTEGER NOT NULL DEFAULT 1'
+    )
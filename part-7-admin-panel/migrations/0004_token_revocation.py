@@ -0,0 +1,25 @@
+# =============================================================================
+# Migration 0004: Token versions and revocations
+# =============================================================================
+# users.token_version is copied into each token; token_revocations lets
+# stateless auth (AUTH_TRUST_CLAIMS) reject tokens of deleted or demoted users.
+
+
+def upgrade(conn):
+    conn.exec_driver_sql(
+        'ALTER TABLE users ADD COLUMN token_version INTEGER NOT NULL DEFAULT 0'
+    )
+    conn.exec_driver_sql('''
+        CREATE TABLE token_revocations (
+            id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            revoked_at FLOAT NOT NULL,
+            PRIMARY KEY (id)
+        )
+    ''')
+
+
+INDEXES = [
+    {'name': 'ix_token_revocations_revoked_at', 'table': 'token_revocations',
+     'columns': ['revoked_at']},
+]
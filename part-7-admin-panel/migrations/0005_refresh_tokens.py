@@ -0,0 +1,27 @@
+# =============================================================================
+# Migration 0005: Refresh tokens and per-token revocation
+# =============================================================================
+# Access tokens become short-lived; refresh_tokens stores hashed long-lived
+# tokens, and token_revocations.jti records single logged-out access tokens.
+
+
+def upgrade(conn):
+    conn.exec_driver_sql('''
+        CREATE TABLE refresh_tokens (
+            id INTEGER NOT NULL,
+            token_hash VARCHAR(64) NOT NULL,
+            user_id INTEGER NOT NULL,
+            expires_at DATETIME NOT NULL,
+            revoked_at DATETIME,
+            PRIMARY KEY (id)
+        )
+    ''')
+    conn.exec_driver_sql('ALTER TABLE token_revocations ADD COLUMN jti VARCHAR(32)')
+
+
+INDEXES = [
+    {'name': 'ix_refresh_tokens_token_hash', 'table': 'refresh_tokens',
+     'columns': ['token_hash'], 'unique': True},
+    {'name': 'ix_refresh_tokens_user_id', 'table': 'refresh_tokens',
+     'columns': ['user_id']},
+]
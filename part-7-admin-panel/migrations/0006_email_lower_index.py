@@ -0,0 +1,23 @@
+# =============================================================================
+# Migration 0006: Case-insensitive unique email
+# =============================================================================
+# Registration now relies on unique indexes instead of SELECT-then-INSERT.
+# This one treats "Ann@Example.com" and "ann@example.com" as the same email.
+
+
+def upgrade(conn):
+    # The index can't be built while two accounts differ only by case
+    duplicates = conn.exec_driver_sql(
+        'SELECT lower(email) FROM users GROUP BY lower(email) HAVING COUNT(*) > 1'
+    ).fetchall()
+    if duplicates:
+        raise RuntimeError(
+            'Emails that differ only by case must be merged first: '
+            + ', '.join(row[0] for row in duplicates)
+        )
+
+
+INDEXES = [
+    {'name': 'ix_users_email_lower', 'table': 'users',
+     'columns': ['lower(email)'], 'unique': True},
+]
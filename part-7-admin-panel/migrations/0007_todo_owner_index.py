@@ -0,0 +1,15 @@
+# =============================================================================
+# Migration 0007: (user_id, id) index for ownership-scoped todo queries
+# =============================================================================
+# Every todo query now filters by user_id (see models.TodoRepository). With
+# this index a user's list comes back already in id order - no sort step.
+
+
+def upgrade(conn):
+    pass  # Nothing to change in a transaction - only a new index
+
+
+INDEXES = [
+    {'name': 'ix_todos_user_id_id', 'table': 'todos',
+     'columns': ['user_id', 'id']},
+]
@@ -0,0 +1,26 @@
+# =============================================================================
+# Migration 0008: Manual ordering (todos.position)
+# =============================================================================
+# Adds the position key column (see positions.py) and gives existing todos
+# keys in their current order (by id), per user.
+
+from positions import rank_key
+
+
+def upgrade(conn):
+    conn.exec_driver_sql('ALTER TABLE todos ADD COLUMN position VARCHAR(255)')
+
+    rows = conn.exec_driver_sql('SELECT id, user_id FROM todos ORDER BY user_id, id').fetchall()
+    updates, last_user, rank = [], None, 0
+    for todo_id, user_id in rows:
+        rank = rank + 1 if user_id == last_user else 0
+        last_user = user_id
+        updates.append((rank_key(rank), todo_id))
+    if updates:
+        conn.exec_driver_sql('UPDATE todos SET position = ? WHERE id = ?', updates)
+
+
+INDEXES = [
+    {'name': 'ix_todos_user_id_position', 'table': 'todos',
+     'columns': ['user_id', 'position']},
+]
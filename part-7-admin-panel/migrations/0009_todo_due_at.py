@@ -0,0 +1,18 @@
+# =============================================================================
+# Migration 0009: Due dates and reminders
+# =============================================================================
+# todos.due_at is the deadline, todos.reminded_at is set once reminders.py has
+# sent the reminder. The partial index only holds todos still waiting for
+# one; with is_completed first, "not done and due soon" is one range scan.
+# (is_completed leads so the planner prefers it over ix_todos_is_completed.)
+
+
+def upgrade(conn):
+    conn.exec_driver_sql('ALTER TABLE todos ADD COLUMN due_at DATETIME')
+    conn.exec_driver_sql('ALTER TABLE todos ADD COLUMN reminded_at DATETIME')
+
+
+INDEXES = [
+    {'name': 'ix_todos_due_at_pending', 'table': 'todos',
+     'columns': ['is_completed', 'due_at'], 'where': 'reminded_at IS NULL'},
+]
@@ -0,0 +1,55 @@
+# =============================================================================
+# Migration 0010: Tags
+# =============================================================================
+# tags: one row per (user, tag name), with the number of todos using it.
+# todo_tags: which todo has which tag. WITHOUT ROWID: the table is stored as
+# its (tag_id, todo_id) primary key, so "todos with tag X" is one range read.
+#
+# The triggers keep tags.todo_count up to date for every INSERT/DELETE on
+# todo_tags, and remove a deleted todo's todo_tags rows (which in turn lowers
+# the counts). The app never has to count or remember to update a count.
+
+
+def upgrade(conn):
+    conn.exec_driver_sql('''
+        CREATE TABLE tags (
+            id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            name VARCHAR(50) NOT NULL,
+            todo_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (id),
+            FOREIGN KEY(user_id) REFERENCES users (id)
+        )
+    ''')
+    conn.exec_driver_sql('''
+        CREATE TABLE todo_tags (
+            tag_id INTEGER NOT NULL,
+            todo_id INTEGER NOT NULL,
+            PRIMARY KEY (tag_id, todo_id),
+            FOREIGN KEY(tag_id) REFERENCES tags (id),
+            FOREIGN KEY(todo_id) REFERENCES todos (id)
+        ) WITHOUT ROWID
+    ''')
+    conn.exec_driver_sql('''
+        CREATE TRIGGER todo_tags_count_insert AFTER INSERT ON todo_tags BEGIN
+            UPDATE tags SET todo_count = todo_count + 1 WHERE id = NEW.tag_id;
+        END
+    ''')
+    conn.exec_driver_sql('''
+        CREATE TRIGGER todo_tags_count_delete AFTER DELETE ON todo_tags BEGIN
+            UPDATE tags SET todo_count = todo_count - 1 WHERE id = OLD.tag_id;
+        END
+    ''')
+    conn.exec_driver_sql('''
+        CREATE TRIGGER todos_delete_tags AFTER DELETE ON todos BEGIN
+            DELETE FROM todo_tags WHERE todo_id = OLD.id;
+        END
+    ''')
+
+
+INDEXES = [
+    {'name': 'ix_tags_user_id_name', 'table': 'tags',
+     'columns': ['user_id', 'name'], 'unique': True},
+    {'name': 'ix_todo_tags_todo_id', 'table': 'todo_tags',
+     'columns': ['todo_id', 'tag_id']},
+]
@@ -0,0 +1,16 @@
+# =============================================================================
+# Migration 0011: Subtasks (todos.parent_id)
+# =============================================================================
+# A todo can belong to a parent todo. Existing todos stay top level (NULL).
+# The index only holds subtasks: it's what the recursive subtree queries use
+# to find a todo's children.
+
+
+def upgrade(conn):
+    conn.exec_driver_sql('ALTER TABLE todos ADD COLUMN parent_id INTEGER REFERENCES todos (id)')
+
+
+INDEXES = [
+    {'name': 'ix_todos_parent_id', 'table': 'todos',
+     'columns': ['parent_id'], 'where': 'parent_id IS NOT NULL'},
+]
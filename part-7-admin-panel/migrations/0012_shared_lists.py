@@ -0,0 +1,44 @@
+# =============================================================================
+# Migration 0012: Shared lists
+# =============================================================================
+# todo_lists: a named list with an owner.
+# list_members: who may do what on which list (1 view, 2 edit, 3 owner).
+# WITHOUT ROWID: stored as its (list_id, user_id) primary key, so the
+# permission check inside every shared-list statement is one b-tree lookup.
+#
+# todos.list_id: NULL for a user's own todos (all existing ones), set for
+# todos in a shared list. The partial index only holds shared-list todos,
+# in list order.
+
+
+def upgrade(conn):
+    conn.exec_driver_sql('''
+        CREATE TABLE todo_lists (
+            id INTEGER NOT NULL,
+            name VARCHAR(100) NOT NULL,
+            owner_id INTEGER NOT NULL,
+            created_at DATETIME,
+            PRIMARY KEY (id),
+            FOREIGN KEY(owner_id) REFERENCES users (id)
+        )
+    ''')
+    conn.exec_driver_sql('''
+        CREATE TABLE list_members (
+            list_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            permission SMALLINT NOT NULL,
+            PRIMARY KEY (list_id, user_id),
+            FOREIGN KEY(list_id) REFERENCES todo_lists (id),
+            FOREIGN KEY(user_id) REFERENCES users (id)
+        ) WITHOUT ROWID
+    ''')
+    conn.exec_driver_sql('ALTER TABLE todos ADD COLUMN list_id INTEGER REFERENCES todo_lists (id)')
+
+
+INDEXES = [
+    {'name': 'ix_todo_lists_owner_id', 'table': 'todo_lists', 'columns': ['owner_id']},
+    {'name': 'ix_list_members_user_id', 'table': 'list_members',
+     'columns': ['user_id', 'list_id', 'permission']},
+    {'name': 'ix_todos_list_id_position', 'table': 'todos',
+     'columns': ['list_id', 'position'], 'where': 'list_id IS NOT NULL'},
+]
@@ -0,0 +1,67 @@
+# =============================================================================
+# Migration 0013: Soft delete (todos.deleted_at)
+# =============================================================================
+# Deleting a todo now only sets deleted_at; trash.py deletes it for real
+# after TRASH_RETENTION_DAYS.
+#
+# The list-order and reminder indexes are rebuilt as partial indexes
+# (WHERE deleted_at IS NULL), so the trash never makes them bigger, and
+# ix_todos_is_completed gets deleted_at so the admin counts of live todos
+# still come from the index alone. They are dropped here and built again,
+# under the same names, right after this migration (see migrate.py).
+#
+# New: the trash per user and by deletion time (for the purger), holding
+# ONLY the trash, and each shared list's todos by deleted_at.
+#
+# Tag counts leave the trash out: moving a todo there gives each of its tags
+# -1, restoring it +1. When a todo is purged its todo_tags rows are deleted
+# BEFORE the todo, so the delete trigger can see it was already uncounted.
+
+REBUILT_INDEXES = ['ix_todos_is_completed', 'ix_todos_user_id_position',
+                   'ix_todos_due_at_pending', 'ix_todos_list_id_position']
+
+
+def upgrade(conn):
+    conn.exec_driver_sql('ALTER TABLE todos ADD COLUMN deleted_at DATETIME')
+    for name in REBUILT_INDEXES:
+        conn.exec_driver_sql(f'DROP INDEX IF EXISTS {name}')
+
+    conn.exec_driver_sql('DROP TRIGGER todos_delete_tags')
+    conn.exec_driver_sql('''
+        CREATE TRIGGER todos_delete_tags BEFORE DELETE ON todos BEGIN
+            DELETE FROM todo_tags WHERE todo_id = OLD.id;
+        END
+    ''')
+    conn.exec_driver_sql('DROP TRIGGER todo_tags_count_delete')
+    conn.exec_driver_sql('''
+        CREATE TRIGGER todo_tags_count_delete AFTER DELETE ON todo_tags
+        WHEN (SELECT deleted_at FROM todos WHERE id = OLD.todo_id) IS NULL BEGIN
+            UPDATE tags SET todo_count = todo_count - 1 WHERE id = OLD.tag_id;
+        END
+    ''')
+    conn.exec_driver_sql('''
+        CREATE TRIGGER todos_trash_tags AFTER UPDATE OF deleted_at ON todos
+        WHEN (OLD.deleted_at IS NULL) != (NEW.deleted_at IS NULL) BEGIN
+            UPDATE tags
+            SET todo_count = todo_count + (CASE WHEN NEW.deleted_at IS NULL THEN 1 ELSE -1 END)
+            WHERE id IN (SELECT tag_id FROM todo_tags WHERE todo_id = NEW.id);
+        END
+    ''')
+
+
+INDEXES = [
+    {'name': 'ix_todos_is_completed', 'table': 'todos',
+     'columns': ['is_completed', 'deleted_at']},
+    {'name': 'ix_todos_user_id_position', 'table': 'todos',
+     'columns': ['user_id', 'position'], 'where': 'deleted_at IS NULL'},
+    {'name': 'ix_todos_due_at_pending', 'table': 'todos', 'columns': ['is_completed', 'due_at'],
+     'where': 'reminded_at IS NULL AND deleted_at IS NULL'},
+    {'name': 'ix_todos_list_id_position', 'table': 'todos', 'columns': ['list_id', 'position'],
+     'where': 'list_id IS NOT NULL AND deleted_at IS NULL'},
+    {'name': 'ix_todos_trash', 'table': 'todos',
+     'columns': ['user_id', 'deleted_at'], 'where': 'deleted_at IS NOT NULL'},
+    {'name': 'ix_todos_deleted_at', 'table': 'todos',
+     'columns': ['deleted_at'], 'where': 'deleted_at IS NOT NULL'},
+    {'name': 'ix_todos_list_id_deleted_at', 'table': 'todos',
+     'columns': ['list_id', 'deleted_at'], 'where': 'list_id IS NOT NULL'},
+]
@@ -0,0 +1,50 @@
+# =============================================================================
+# Migration 0014: Archive of old completed todos (todos_archive)
+# =============================================================================
+# archive.py moves completed todos older than ARCHIVE_AFTER_DAYS out of the
+# hot todos table into this one. They keep their id, so the API still knows
+# them (GET /api/todos?include_archived=1), and their tags as plain text:
+# archived todos no longer count in tags.todo_count.
+#
+# Same database file, different table: the move is one transaction (an
+# attached file in WAL mode only commits atomically per file), and the todos
+# table and all its indexes shrink by every row that leaves.
+#
+# parent_id has no foreign key here: the parent may still be in todos.
+#
+# ix_todos_is_completed gets created_at: completed live todos by age are the
+# archiver's queue, a range of this index already in created_at order. (A
+# separate partial index would cost every write on todos one more b-tree.)
+
+
+def upgrade(conn):
+    conn.exec_driver_sql('''
+        CREATE TABLE todos_archive (
+            id INTEGER NOT NULL,
+            task_content VARCHAR(200) NOT NULL,
+            is_completed BOOLEAN,
+            created_at DATETIME,
+            user_id INTEGER NOT NULL,
+            version INTEGER NOT NULL,
+            position VARCHAR(255) NOT NULL,
+            due_at DATETIME,
+            parent_id INTEGER,
+            list_id INTEGER,
+            tags TEXT,
+            archived_at DATETIME NOT NULL,
+            PRIMARY KEY (id),
+            FOREIGN KEY(user_id) REFERENCES users (id),
+            FOREIGN KEY(list_id) REFERENCES todo_lists (id)
+        )
+    ''')
+    conn.exec_driver_sql('DROP INDEX IF EXISTS ix_todos_is_completed')  # Rebuilt below
+
+
+INDEXES = [
+    {'name': 'ix_todos_archive_user_id_list_id', 'table': 'todos_archive',
+     'columns': ['user_id', 'list_id', 'position']},
+    {'name': 'ix_todos_archive_list_id', 'table': 'todos_archive',
+     'columns': ['list_id', 'position'], 'where': 'list_id IS NOT NULL'},
+    {'name': 'ix_todos_is_completed', 'table': 'todos',
+     'columns': ['is_completed', 'deleted_at', 'created_at']},
+]
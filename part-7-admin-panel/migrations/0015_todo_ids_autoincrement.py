@@ -0,0 +1,70 @@
+# =============================================================================
+# Migration 0015: Todo ids are never used twice (todos.id AUTOINCREMENT)
+# =============================================================================
+# Without AUTOINCREMENT, SQLite gives a new row max(id) + 1 of the rows still
+# in the table. Todos leave it for good (trash.py purges them, archive.py
+# moves them to todos_archive, deleting a user or a list), so a new todo
+# could get the id of an archived one: two todos 7 in
+# GET /api/todos?include_archived=1, and the next archive run fails on the
+# archive's primary key.
+#
+# With AUTOINCREMENT, SQLite keeps the highest id ever handed out in
+# sqlite_sequence and only goes up from there. We start it above every id in
+# todos AND todos_archive.
+#
+# SQLite can't add AUTOINCREMENT to an existing table, so the table is built
+# again: new table, copy, drop the old one, rename. Dropping it drops its
+# triggers (created again below) and indexes (built again right after this
+# migration, see migrate.py). Every row is copied in this one transaction,
+# which holds the write lock for as long as that takes.
+
+COLUMNS = ('id, task_content, is_completed, created_at, user_id, version, position, due_at, '
+           'reminded_at, parent_id, list_id, deleted_at')
+
+
+def upgrade(conn):
+    conn.exec_driver_sql('''
+        CREATE TABLE todos_new (
+            id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+            task_content VARCHAR(200) NOT NULL,
+            is_completed BOOLEAN,
+            created_at DATETIME,
+            user_id INTEGER NOT NULL REFERENCES users (id),
+            version INTEGER NOT NULL DEFAULT 1,
+            position VARCHAR(255),
+            due_at DATETIME,
+            reminded_at DATETIME,
+            parent_id INTEGER REFERENCES todos (id),
+            list_id INTEGER REFERENCES todo_lists (id),
+            deleted_at DATETIME
+        )
+    ''')
+    conn.exec_driver_sql(f'INSERT INTO todos_new ({COLUMNS}) SELECT {COLUMNS} FROM todos')
+    conn.exec_driver_sql('DROP TABLE todos')
+    # Legacy rename: the todo_tags triggers name "todos", which doesn't exist
+    # until the rename is done; a modern RENAME re-checks them and fails
+    conn.exec_driver_sql('PRAGMA legacy_alter_table = ON')
+    conn.exec_driver_sql('ALTER TABLE todos_new RENAME TO todos')
+    conn.exec_driver_sql('PRAGMA legacy_alter_table = OFF')
+
+    conn.exec_driver_sql("DELETE FROM sqlite_sequence WHERE name = 'todos'")
+    conn.exec_driver_sql('''
+        INSERT INTO sqlite_sequence (name, seq)
+        SELECT 'todos', coalesce(max(id), 0)
+        FROM (SELECT id FROM todos UNION ALL SELECT id FROM todos_archive)
+    ''')
+
+    # The triggers of 0010/0013 went with the old table
+    conn.exec_driver_sql('''
+        CREATE TRIGGER todos_delete_tags BEFORE DELETE ON todos BEGIN
+            DELETE FROM todo_tags WHERE todo_id = OLD.id;
+        END
+    ''')
+    conn.exec_driver_sql('''
+        CREATE TRIGGER todos_trash_tags AFTER UPDATE OF deleted_at ON todos
+        WHEN (OLD.deleted_at IS NULL) != (NEW.deleted_at IS NULL) BEGIN
+            UPDATE tags
+            SET todo_count = todo_count + (CASE WHEN NEW.deleted_at IS NULL THEN 1 ELSE -1 END)
+            WHERE id IN (SELECT tag_id FROM todo_tags WHERE todo_id = NEW.id);
+        END
+    ''')
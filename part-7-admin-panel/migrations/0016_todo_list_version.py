@@ -0,0 +1,13 @@
+# =============================================================================
+# Migration 0016: users.todo_list_version
+# =============================================================================
+# The app caches each user's GET /api/todos response in its own process
+# (cache.py). archive.py, a separate process, moves todos out of those lists
+# and can't reach that cache. It bumps this counter instead; the app reads
+# it with the user and treats an entry stored under an older value as a miss.
+
+
+def upgrade(conn):
+    conn.exec_driver_sql(
+        'ALTER TABLE users ADD COLUMN todo_list_version INTEGER NOT NULL DEFAULT 0'
+    )
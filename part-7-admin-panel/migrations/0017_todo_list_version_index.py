@@ -0,0 +1,17 @@
+# =============================================================================
+# Migration 0017: Index on users.todo_list_version
+# =============================================================================
+# With AUTH_TRUST_CLAIMS no user row is loaded per request, so each process
+# reloads the todo list versions bumped since its last look (cache.py):
+# "todo_list_version >= ?", a range read of this index instead of a scan of
+# users. Versions are times in milliseconds since this migration (see
+# models.bump_todo_list_versions).
+
+
+def upgrade(conn):
+    pass  # Nothing to change in a transaction - only a new index
+
+
+INDEXES = [
+    {'name': 'ix_users_todo_list_version', 'table': 'users', 'columns': ['todo_list_version']},
+]
@@ -1,5 +1,17 @@
+import time
+import heapq
+import sqlite3
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime
+from sqlalchemy import (select, insert, update, delete, not_, and_, or_, func, null, true,
+                        exists, event, text, intersect, literal, literal_column)
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import aliased
+from sqlalchemy.sql.expression import ColumnElement
+from datetime import datetime, timezone
+
+from positions import key_between, rank_key
+from shards import shards, SHARD_SCHEMA
 
 db = SQLAlchemy()
 
@@ -12,8 +24,13 @@ class User(db.Model):
     password_hash = db.Column(db.String(256), nullable=False)
     is_admin = db.Column(db.Boolean, default=False)  # NEW: Admin flag
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-
-    todos = db.relationship('Todo', backref='user', lazy=True)
+    # Copied into every token. Bumping it (see auth.revoke_user_tokens)
+    # makes all tokens issued before that point invalid.
+    token_version = db.Column(db.Integer, nullable=False, default=0)
+    # Bumped by processes that change the user's todo list behind the app's
+    # back (archive.py), so the app's cached list stops matching (0016).
+    # Loaded with the user by @require_user (auth.py).
+    todo_list_version = db.Column(db.Integer, nullable=False, default=0)
 
     def to_dict(self):
         return {
@@ -25,9 +42,9 @@ class User(db.Model):
         }
 
     # NEW: For admin panel - include user statistics
-    def to_dict_with_stats(self):
-        total_todos = len(self.todos)
-        completed_todos = len([t for t in self.todos if t.is_completed])
+    # (counts: {user_id: (total, completed)} from todo_counts_by_user())
+    def to_dict_with_stats(self, counts):
+        total_todos, completed_todos = counts.get(self.id, (0, 0))
         return {
             'id': self.id,
             'username': self.username,
@@ -39,20 +56,953 @@ class User(db.Model):
         }
 
 
+# Emails are compared case-insensitively: "Ann@Example.com" and
+# "ann@example.com" are the same account. New emails are stored normalized,
+# and this index makes lower(email) unique and fast to search.
+db.Index('ix_users_email_lower', db.func.lower(User.email), unique=True)
+# The todo list versions bumped since a time (cache.py, AUTH_TRUST_CLAIMS)
+db.Index('ix_users_todo_list_version', User.todo_list_version)
+
+
+def bump_todo_list_versions(user_ids):
+    """Makes every process's cached GET /api/todos of these users stale. Caller commits.
+
+    The new version is the time in milliseconds (or the old one + 1, if that
+    is higher), so processes without user rows can ask for the versions
+    changed since they last looked (see cache.py).
+    """
+    now_ms = int(time.time() * 1000)
+    db.session.execute(
+        update(User)
+        .where(User.id.in_(user_ids))
+        .values(todo_list_version=func.max(User.todo_list_version + 1, now_ms))
+        .execution_options(synchronize_session=False)
+    )
+
+
+def normalize_email(email):
+    return email.strip().lower()
+
+
+def find_user_by_email(email):
+    """Case-insensitive lookup that uses ix_users_email_lower."""
+    return User.query.filter(db.func.lower(User.email) == normalize_email(email)).first()
+
+
 class Todo(db.Model):
     __tablename__ = 'todos'
 
+    # Indexes for the hot queries in app.py (created by migrations/0002, 0007):
+    #   filter_by(user_id=...)            -> ix_todos_user_id_is_completed
+    #   filter_by(is_completed=True)      -> ix_todos_is_completed
+    #   user_id = ? ORDER BY id           -> ix_todos_user_id_id
+    #   user_id = ? ORDER BY position     -> ix_todos_user_id_position (0008)
+    #   is_completed = 0 AND due_at <= ?  -> ix_todos_due_at_pending (0009)
+    #   parent_id = ? (subtasks)          -> ix_todos_parent_id (0011)
+    #   list_id = ? ORDER BY position     -> ix_todos_list_id_position (0012)
+    #   the trash, and purging it        -> ix_todos_trash, ix_todos_list_id_deleted_at,
+    #                                       ix_todos_deleted_at (0013)
+    #   completed, by age (archive.py)   -> ix_todos_is_completed (0014)
+    # The first two are "covering" for the count() queries: SQLite can answer
+    # them from the index alone without reading the table rows.
+    #
+    # The list-order indexes leave the trash out (WHERE deleted_at IS NULL,
+    # since 0013): however much is in the trash, they stay the same size.
+    # Queries must say "deleted_at IS NULL" for SQLite to use them.
+    #
+    # Sharded (see shards.py): statements pick the file with shards.options().
+    # Ids are AUTOINCREMENT (0015): never reused, also not the id of a todo
+    # that was purged or moved to todos_archive.
+    __table_args__ = (
+        db.Index('ix_todos_user_id_is_completed', 'user_id', 'is_completed'),
+        # Not partial: SQLite only counts from an index alone if it has the
+        # column the query filters on (live todos: deleted_at IS NULL)
+        db.Index('ix_todos_is_completed', 'is_completed', 'deleted_at', 'created_at'),
+        db.Index('ix_todos_user_id_id', 'user_id', 'id'),
+        db.Index('ix_todos_user_id_position', 'user_id', 'position',
+                 sqlite_where=text('deleted_at IS NULL')),
+        # Partial: only todos still waiting for a reminder are in the index
+        db.Index('ix_todos_due_at_pending', 'is_completed', 'due_at',
+                 sqlite_where=text('reminded_at IS NULL AND deleted_at IS NULL')),
+        # Partial: top-level todos (parent_id NULL) are most todos; leave them out
+        db.Index('ix_todos_parent_id', 'parent_id', sqlite_where=text('parent_id IS NOT NULL')),
+        db.Index('ix_todos_list_id_position', 'list_id', 'position',
+                 sqlite_where=text('list_id IS NOT NULL AND deleted_at IS NULL')),
+        # Partial: ONLY the trash
+        db.Index('ix_todos_trash', 'user_id', 'deleted_at',
+                 sqlite_where=text('deleted_at IS NOT NULL')),
+        db.Index('ix_todos_deleted_at', 'deleted_at', sqlite_where=text('deleted_at IS NOT NULL')),
+        # All of a list's todos, trash included: its trash, and deleting the list
+        db.Index('ix_todos_list_id_deleted_at', 'list_id', 'deleted_at',
+                 sqlite_where=text('list_id IS NOT NULL')),
+        {'schema': SHARD_SCHEMA, 'sqlite_autoincrement': True},
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     task_content = db.Column(db.String(200), nullable=False)
     is_completed = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
 
+    # Goes up by 1 on every UPDATE (SQLAlchemy does this for us), so
+    # serializers.py knows when a cached JSON fragment is out of date
+    version = db.Column(db.Integer, nullable=False, default=1)
+    __mapper_args__ = {'version_id_col': version}
+
+    # Where the todo sits in the user's list (see positions.py). Set by
+    # TodoRepository on create and move - create todos through it.
+    position = db.Column(db.String(255), nullable=False)
+
+    # Optional deadline (UTC). reminders.py sends one reminder when it is
+    # reached and sets reminded_at; changing due_at clears reminded_at.
+    due_at = db.Column(db.DateTime)
+    reminded_at = db.Column(db.DateTime)
+
+    # Subtasks point at their parent todo (NULL = top level). Set once, on
+    # create; TodoRepository checks the parent is the user's and not too deep.
+    parent_id = db.Column(db.Integer, db.ForeignKey(f'{SHARD_SCHEMA}.todos.id'))
+
+    # Shared list the todo is in (see TodoList). NULL: one of user_id's own
+    # todos. In a shared list, user_id is whoever created the todo.
+    list_id = db.Column(db.Integer, db.ForeignKey('todo_lists.id'))
+
+    # Set when the todo is deleted: it waits in the trash (and can be
+    # restored) until trash.py purges it. NULL for every live todo.
+    deleted_at = db.Column(db.DateTime)
+
+    # Read-only here: tags are set through TodoRepository.set_tags
+    tags = db.relationship('Tag', secondary=f'{SHARD_SCHEMA}.todo_tags', lazy=True,
+                           viewonly=True)
+
+    # Not a column: todos in this table are never archived (see ArchivedTodo)
+    archived_at = None
+
+    @property
+    def tag_names(self):
+        return sorted(tag.name for tag in self.tags)
+
     def to_dict(self):
         return {
             'id': self.id,
             'task_content': self.task_content,
             'is_completed': self.is_completed,
+            'archived_at': self.archived_at.isoformat() if self.archived_at else None,
             'created_at': self.created_at.isoformat(),
+            'deleted_at': self.deleted_at.isoformat() if self.deleted_at else None,
+            'due_at': self.due_at.isoformat() if self.due_at else None,
+            'list_id': self.list_id,
+            'parent_id': self.parent_id,
+            'tags': self.tag_names,
             'user_id': self.user_id
         }
+
+
+class ArchivedTodo(db.Model):
+    """A completed todo archive.py moved out of the todos table (migrations/0014).
+
+    Same id and columns, plus archived_at. Its tags are kept as text
+    ('urgent,work'): archived todos are not in todo_tags or the tag counts.
+    Read-only - nothing in the app changes an archived todo.
+    """
+    __tablename__ = 'todos_archive'
+    __table_args__ = (
+        db.Index('ix_todos_archive_user_id_list_id', 'user_id', 'list_id', 'position'),
+        db.Index('ix_todos_archive_list_id', 'list_id', 'position',
+                 sqlite_where=text('list_id IS NOT NULL')),
+        {'schema': SHARD_SCHEMA},  # On the todo's shard
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    task_content = db.Column(db.String(200), nullable=False)
+    is_completed = db.Column(db.Boolean)
+    created_at = db.Column(db.DateTime)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    version = db.Column(db.Integer, nullable=False)
+    position = db.Column(db.String(255), nullable=False)
+    due_at = db.Column(db.DateTime)
+    parent_id = db.Column(db.Integer)  # No foreign key: the parent may still be in todos
+    list_id = db.Column(db.Integer, db.ForeignKey('todo_lists.id'))
+    tags = db.Column(db.Text)
+    archived_at = db.Column(db.DateTime, nullable=False)
+
+
+MAX_TODO_DEPTH = 20  # Subtasks can be at most this many levels below a top-level todo
+MAX_ID = 2 ** 63 - 1  # SQLite integers are 64-bit: a larger one can't even be bound
+TASK_CONTENT_MAX = Todo.__table__.c.task_content.type.length  # String(200)
+
+
+def is_todo_id(value):
+    """True for an int that can be a todo's id (JSON true is an int to Python: not that)."""
+    return isinstance(value, int) and not isinstance(value, bool) and 0 < value <= MAX_ID
+
+
+def parse_task_content(value):
+    """Non-empty string of at most TASK_CONTENT_MAX characters. Raises ValueError."""
+    if not isinstance(value, str) or not value.strip():
+        raise ValueError('task_content must be a non-empty string')
+    if len(value) > TASK_CONTENT_MAX:
+        raise ValueError(f'task_content is longer than {TASK_CONTENT_MAX} characters')
+    return value
+
+
+def parse_due_at(value):
+    """ISO 8601 string (or None) -> naive UTC datetime. Raises ValueError."""
+    if value is None:
+        return None
+    try:
+        due_at = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except (TypeError, AttributeError, ValueError):
+        raise ValueError('due_at must be an ISO 8601 date/time or null') from None
+    if due_at.tzinfo is not None:
+        due_at = due_at.astimezone(timezone.utc).replace(tzinfo=None)
+    return due_at
+
+
+# =============================================================================
+# TAGS
+# =============================================================================
+# Each user has their own tags ("work", "urgent", ...). todo_tags links todos
+# and tags; its primary key (tag_id, todo_id) is the index for "todos with
+# tag X", and ix_todo_tags_todo_id for "tags of todo Y".
+#
+# tags.todo_count is kept up to date by triggers (migrations/0010): +1 when a
+# todo_tags row is inserted, -1 when one is deleted, and deleting a todo
+# deletes its todo_tags rows. Todos in the trash don't count (0013): moving
+# one there gives -1 to each of its tags, restoring it +1. GET /api/tags
+# reads the counts instead of counting, and no code path can forget to
+# update them.
+
+TAG_NAME_MAX = 50
+MAX_TAGS_PER_TODO = 20
+
+
+class Tag(db.Model):
+    __tablename__ = 'tags'
+    __table_args__ = (
+        db.Index('ix_tags_user_id_name', 'user_id', 'name', unique=True),
+        {'schema': SHARD_SCHEMA},  # On the user's shard
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    name = db.Column(db.String(TAG_NAME_MAX), nullable=False)
+    todo_count = db.Column(db.Integer, nullable=False, default=0)
+
+
+todo_tags = db.Table(
+    'todo_tags',
+    db.Column('tag_id', db.Integer, db.ForeignKey(f'{SHARD_SCHEMA}.tags.id'), primary_key=True),
+    db.Column('todo_id', db.Integer, db.ForeignKey(f'{SHARD_SCHEMA}.todos.id'),
+              primary_key=True),
+    db.Index('ix_todo_tags_todo_id', 'todo_id', 'tag_id'),
+    schema=SHARD_SCHEMA,
+    sqlite_with_rowid=False,  # The table IS its primary key index
+)
+
+
+def parse_tags(value):
+    """List of tag names -> sorted, lower-case, without duplicates. Raises ValueError."""
+    if not isinstance(value, list) or not all(isinstance(name, str) for name in value):
+        raise ValueError('tags must be a list of strings')
+    names = sorted({name.strip().lower() for name in value})
+    if len(names) > MAX_TAGS_PER_TODO:
+        raise ValueError(f'A todo can have at most {MAX_TAGS_PER_TODO} tags')
+    for name in names:
+        # Commas are the separator in TodoRepository's group_concat()
+        if not name or len(name) > TAG_NAME_MAX or ',' in name:
+            raise ValueError(f'Tag names must be 1-{TAG_NAME_MAX} characters, without commas')
+    return names
+
+
+# =============================================================================
+# SHARED LISTS
+# =============================================================================
+# A TodoList is a list of todos several users work on. list_members is its
+# access control list (ACL): one row per (list, user) with a permission. The
+# owner has a row too, so "every list user X can see" is one range read of
+# ix_list_members_user_id, and every check has the same shape:
+#
+#   EXISTS (SELECT 1 FROM list_members
+#           WHERE list_id = ? AND user_id = ? AND permission >= ?)
+#
+# That condition goes INTO the todo statements (TodoRepository(user_id,
+# list_id)), just like "user_id = ?" does for a user's own todos.
+
+VIEW, EDIT, OWNER = 1, 2, 3  # Each permission includes the ones below it
+PERMISSIONS = {'view': VIEW, 'edit': EDIT, 'owner': OWNER}
+PERMISSION_NAMES = {permission: name for name, permission in PERMISSIONS.items()}
+
+
+class TodoList(db.Model):
+    __tablename__ = 'todo_lists'
+    __table_args__ = (
+        db.Index('ix_todo_lists_owner_id', 'owner_id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    owner_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class ListMember(db.Model):
+    __tablename__ = 'list_members'
+    __table_args__ = (
+        # "Lists visible to user X" - covering: never reads the table itself
+        db.Index('ix_list_members_user_id', 'user_id', 'list_id', 'permission'),
+        {'sqlite_with_rowid': False},
+    )
+
+    list_id = db.Column(db.Integer, db.ForeignKey('todo_lists.id'), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    permission = db.Column(db.SmallInteger, nullable=False)
+
+
+class TokenRevocation(db.Model):
+    """Revoked access tokens.
+
+    With jti set: just that one token (logout).
+    Without jti:  every token of user_id issued before revoked_at.
+
+    Only needed while such tokens could still be unexpired, so auth.py only
+    loads the last ACCESS_TOKEN_EXPIRATION_MINUTES worth of rows. No foreign
+    key: the row must outlive a deleted user.
+    """
+    __tablename__ = 'token_revocations'
+    __table_args__ = (
+        db.Index('ix_token_revocations_revoked_at', 'revoked_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    revoked_at = db.Column(db.Float, nullable=False)  # Unix time, same unit as token 'iat'
+    jti = db.Column(db.String(32))
+
+
+class RefreshToken(db.Model):
+    """Long-lived token used only at /api/token/refresh to get a new access token.
+
+    We store a SHA-256 hash, never the token itself, so a leaked database
+    can't be used to log in.
+    """
+    __tablename__ = 'refresh_tokens'
+    __table_args__ = (
+        db.Index('ix_refresh_tokens_token_hash', 'token_hash', unique=True),
+        db.Index('ix_refresh_tokens_user_id', 'user_id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    token_hash = db.Column(db.String(64), nullable=False)
+    user_id = db.Column(db.Integer, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    revoked_at = db.Column(db.DateTime)  # Set when used (rotated) or on logout
+
+
+# =============================================================================
+# LIGHTWEIGHT ROWS FOR LIST ENDPOINTS
+# =============================================================================
+# Todo.query.all() builds a full ORM object per row: identity map entry,
+# attribute instrumentation, change tracking. List endpoints only READ a few
+# columns, so they select just those columns and wrap each row in a plain
+# __slots__ object instead. Nothing is added to the session.
+
+class TodoRow:
+    """Read-only todo with the same to_dict() as Todo (or an archived one)."""
+
+    __slots__ = ('id', 'task_content', 'is_completed', 'created_at', 'user_id', 'version',
+                 'due_at', 'parent_id', 'list_id', 'deleted_at', 'tag_names', 'archived_at')
+
+    def __init__(self, id, task_content, is_completed, created_at, user_id, version, due_at,
+                 parent_id, list_id, deleted_at, tag_names, archived_at=None):
+        self.id = id
+        self.task_content = task_content
+        self.is_completed = is_completed
+        self.created_at = created_at
+        self.user_id = user_id
+        self.version = version
+        self.due_at = due_at
+        self.parent_id = parent_id
+        self.list_id = list_id
+        self.deleted_at = deleted_at
+        self.tag_names = sorted(tag_names.split(',')) if tag_names else []
+        self.archived_at = archived_at
+
+    to_dict = Todo.to_dict
+
+
+# The todo's tags as 'urgent,work' (one ix_todo_tags_todo_id lookup per row).
+# Columns written as SQL text: inside RETURNING, SQLAlchemy drops the
+# "todos." and "tags." prefixes, which makes a built subquery's column names
+# ambiguous. The tables are real Table objects, so they are on the same shard
+# as the todos ("shard2.todo_tags").
+_tag_names = (
+    select(literal_column("group_concat(tags.name, ',')"))
+    .select_from(todo_tags.join(Tag, literal_column('tags.id = todo_tags.tag_id')))
+    .where(literal_column('todo_tags.todo_id = todos.id'))
+    .scalar_subquery()
+)
+
+TODO_ROW_COLUMNS = (Todo.id, Todo.task_content, Todo.is_completed,
+                    Todo.created_at, Todo.user_id, Todo.version, Todo.due_at, Todo.parent_id,
+                    Todo.list_id, Todo.deleted_at, _tag_names)
+
+# The same for todos_archive (never in the trash), plus archived_at
+ARCHIVED_ROW_COLUMNS = (ArchivedTodo.id, ArchivedTodo.task_content, ArchivedTodo.is_completed,
+                        ArchivedTodo.created_at, ArchivedTodo.user_id, ArchivedTodo.version,
+                        ArchivedTodo.due_at, ArchivedTodo.parent_id, ArchivedTodo.list_id,
+                        null().label('deleted_at'), ArchivedTodo.tags, ArchivedTodo.archived_at)
+
+
+# =============================================================================
+# ADMIN QUERIES: EVERY SHARD AT ONCE
+# =============================================================================
+# The admin pages read ALL todos, which live on every shard. Each function
+# runs one query per shard, all at the same time (shards.fan_out), and
+# merges the results. Not sharded: one query, as before.
+
+def all_todo_rows_with_owner():
+    """Every todo as (TodoRow, username) - one query per shard, no per-todo user lookup.
+
+    In id order (ids are per shard: two users on different shards can each
+    have a todo 7).
+    """
+    query = (
+        select(*TODO_ROW_COLUMNS, User.username)
+        .join(User, User.id == Todo.user_id)
+        .where(Todo.deleted_at.is_(None))
+        .order_by(Todo.id)
+    )
+    per_shard = shards.fan_out(lambda conn: conn.execute(query).all())
+    return [(TodoRow(*row[:-1]), row[-1])
+            for row in heapq.merge(*per_shard, key=lambda row: row[0])]
+
+
+def todo_stats():
+    """{'total', 'completed', 'trashed', 'archived'} counts over all shards."""
+    live = select(func.count()).select_from(Todo).where(Todo.deleted_at.is_(None))
+    queries = {
+        'total': live,
+        'completed': live.where(Todo.is_completed == True),  # noqa: E712
+        'trashed': select(func.count()).select_from(Todo).where(Todo.deleted_at.is_not(None)),
+        'archived': select(func.count()).select_from(ArchivedTodo),
+    }
+    per_shard = shards.fan_out(
+        lambda conn: {name: conn.execute(query).scalar() for name, query in queries.items()})
+    return {name: sum(counts[name] for counts in per_shard) for name in queries}
+
+
+def todo_counts_by_user():
+    """{user_id: (live todos, completed)} over all shards (for User.to_dict_with_stats)."""
+    query = (
+        select(Todo.user_id, func.count(), func.count().filter(Todo.is_completed == True))  # noqa: E712
+        .where(Todo.deleted_at.is_(None))
+        .group_by(Todo.user_id)
+    )
+    counts = {}
+    for rows in shards.fan_out(lambda conn: conn.execute(query).all()):
+        for user_id, total, completed in rows:  # Todos in others' shared lists: 2+ shards
+            previous_total, previous_completed = counts.get(user_id, (0, 0))
+            counts[user_id] = (previous_total + total, previous_completed + completed)
+    return counts
+
+
+# =============================================================================
+# TODO REPOSITORY: EVERY QUERY SCOPED TO ONE USER
+# =============================================================================
+# The old routes did Todo.query.get_or_404(todo_id) and then compared
+# todo.user_id in Python. Anyone could probe any id: each probe loaded a full
+# row and the 403-vs-404 answer told them whether the id existed.
+#
+# TodoRepository(user_id) puts the owner INTO every statement:
+#
+#   SELECT ... WHERE user_id = ? ORDER BY id                  (list, export)
+#   UPDATE ... WHERE id = ? AND user_id = ? RETURNING ...     (update, toggle)
+#   DELETE ... WHERE id = ? AND user_id = ?                   (delete)
+#   ... AND id IN (<todos with tag a> INTERSECT <with tag b>)  (?tag=a&tag=b)
+#   WITH RECURSIVE subtree AS (...) SELECT ...                 (subtasks)
+#
+# Someone else's todo looks exactly like a missing one (None -> 404), and
+# each route sends at most its TODO_STATEMENT_BUDGET (check_query_plans.py)
+# of statements to the todos tables - on the user's shard (or the shared
+# list's), see shards.py. That is ONE for most routes; two where completing a
+# todo also completes its open subtasks, or where todos_archive is read or
+# deleted from as well. A todo in the trash counts as missing too, except to
+# trash() and restore(). So is an archived todo (todos_archive), except to
+# list(include_archived=True). The (user_id, id) index (migrations/0007)
+# serves the per-user lists in id order without a sort.
+#
+# UPDATEs bump version by hand because the ORM (version_id_col) isn't involved.
+# (Moves don't: position is not part of a todo's JSON, only of the list order.)
+#
+# Position keys are computed INSIDE the statement by SQLite functions that
+# call positions.py (registered on every new connection below). The key is
+# then based on the rows as they are at that moment - two requests can't
+# both read the same "last position" and give their todos the same key.
+
+@event.listens_for(Engine, 'connect')
+def _register_position_functions(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        dbapi_connection.create_function('todo_position_between', 2, key_between,
+                                         deterministic=True)
+        dbapi_connection.create_function('todo_rank_key', 1, rank_key, deterministic=True)
+
+
+class TodoRepository:
+    """The todos of one user. Write methods add to the session; caller commits.
+
+    list_id: work on that shared list instead of the user's own todos. Every
+    statement then also checks the user's permission (list_members) itself.
+    """
+
+    def __init__(self, user_id, list_id=None):
+        self.user_id = user_id
+        self.list_id = list_id
+        self.shard = shards.for_user(user_id) if list_id is None else shards.for_list(list_id)
+
+    def _execute(self, query, params=None):
+        return db.session.execute(query, params, execution_options=shards.options(self.shard))
+
+    def _in_list(self, todo=Todo, trashed=False):
+        """SQL: todo is in this list (the user's own todos, or the shared list).
+
+        Only live todos - or with trashed=True, only those in the trash.
+        """
+        deleted = todo.deleted_at.is_not(None) if trashed else todo.deleted_at.is_(None)
+        if self.list_id is None:
+            return and_(todo.user_id == self.user_id, todo.list_id.is_(None), deleted)
+        return and_(todo.list_id == self.list_id, deleted)
+
+    def _allowed(self, permission):
+        """SQL: the user has permission on this list (always true for their own todos)."""
+        if self.list_id is None:
+            return true()
+        return exists().where(ListMember.list_id == self.list_id,
+                              ListMember.user_id == self.user_id,
+                              ListMember.permission >= permission)
+
+    def _scope(self, permission=EDIT, trashed=False):
+        return and_(self._in_list(trashed=trashed), self._allowed(permission))
+
+    def _select(self, tags=None, match_all=True):
+        query = (select(*TODO_ROW_COLUMNS).where(self._scope(VIEW))
+                 .order_by(Todo.position, Todo.id))
+        if tags:
+            query = query.where(Todo.id.in_(self._tagged(tags, match_all)))
+        return query
+
+    def _tagged(self, tags, match_all):
+        """SQL for the ids of the user's todos with ALL (or ANY) of these tags.
+
+        Each tag name is one lookup in ix_tags_user_id_name, then a range of
+        the todo_tags primary key. ALL intersects those ranges in SQLite.
+        """
+        def with_tags(*names):
+            return (select(todo_tags.c.todo_id)
+                    .join(Tag, Tag.id == todo_tags.c.tag_id)
+                    .where(Tag.user_id == self.user_id, Tag.name.in_(names)))
+
+        if match_all and len(tags) > 1:
+            return intersect(*(with_tags(name) for name in tags))
+        return with_tags(*tags)
+
+    def _next_position(self):
+        """SQL for a key after the list's last todo (one index lookup)."""
+        last = select(func.max(Todo.position)).where(self._in_list())
+        return func.todo_position_between(last.scalar_subquery(), null())
+
+    def list(self, tags=None, match_all=True, include_archived=False):
+        """The user's todos as TodoRow objects, in list order.
+
+        tags: only todos with all of these tags (match_all=False: any of them).
+        include_archived: then also the archived todos, after the others.
+        """
+        rows = [TodoRow(*row) for row in self._execute(self._select(tags, match_all))]
+        if include_archived:
+            rows += self.archived()
+        return rows
+
+    def archived(self):
+        """The todos archive.py moved to todos_archive, as TodoRows in list order."""
+        if self.list_id is None:
+            scope = and_(ArchivedTodo.user_id == self.user_id, ArchivedTodo.list_id.is_(None))
+        else:
+            scope = and_(ArchivedTodo.list_id == self.list_id, self._allowed(VIEW))
+        query = (
+            select(*ARCHIVED_ROW_COLUMNS)
+            .where(scope)
+            .order_by(ArchivedTodo.position, ArchivedTodo.id)
+        )
+        return [TodoRow(*row) for row in self._execute(query)]
+
+    def iter(self, batch_size=1000):
+        """Like list(), but yields rows while reading them.
+
+        yield_per streams from the database cursor batch_size rows at a time,
+        so memory stays the same for 100 todos or 1 million. For exports.
+        """
+        query = self._select().execution_options(yield_per=batch_size)
+        for row in self._execute(query):
+            yield TodoRow(*row)
+
+    def create(self, task_content, due_at=None, parent_id=None):
+        """Inserts one todo at the end of the list and returns it as a TodoRow.
+
+        With parent_id the todo is a subtask. Returns None if the parent isn't
+        in this list or is already MAX_TODO_DEPTH levels deep, or if the user
+        may not edit the shared list - checked inside the INSERT, so the
+        parent can't be deleted (or access removed) in between.
+        """
+        values = {'task_content': task_content, 'is_completed': False,
+                  'created_at': datetime.utcnow(), 'user_id': self.user_id, 'version': 1,
+                  'position': self._next_position(), 'due_at': due_at, 'parent_id': parent_id,
+                  'list_id': self.list_id}
+        conditions = []
+        if parent_id is not None:
+            conditions.append(self._levels(parent_id).between(1, MAX_TODO_DEPTH))
+        if self.list_id is not None:
+            conditions.append(self._allowed(EDIT))
+        if not conditions:
+            query = insert(Todo).values(**values)
+        else:
+            # INSERT INTO todos (...) SELECT ... WHERE <parent and permission are ok>
+            columns = Todo.__table__.c
+            row = select(*(
+                value if isinstance(value, ColumnElement) else literal(value, columns[name].type)
+                for name, value in values.items()
+            )).where(*conditions)
+            query = insert(Todo).from_select(list(values), row)
+        row = self._execute(query.returning(*TODO_ROW_COLUMNS)).first()
+        return TodoRow(*row) if row else None
+
+    def insert_many(self, rows):
+        """One executemany for many todos (dicts with task_content, is_completed[, due_at]).
+
+        Each row is its own INSERT, so each gets the key after the one before.
+        """
+        now = datetime.utcnow()
+        self._execute(insert(Todo).values(position=self._next_position()), [
+            {'task_content': row['task_content'], 'is_completed': row['is_completed'],
+             'due_at': row.get('due_at'), 'created_at': now, 'user_id': self.user_id,
+             'list_id': self.list_id, 'version': 1}
+            for row in rows
+        ])
+
+    def update(self, todo_id, values):
+        """Applies values in one statement. Returns the TodoRow, or None (not yours)."""
+        if 'due_at' in values:
+            values = dict(values, reminded_at=None)  # New deadline, new reminder
+        query = (
+            update(Todo)
+            .where(Todo.id == todo_id, self._scope(EDIT))
+            .values(**values, version=Todo.version + 1)
+            .returning(*TODO_ROW_COLUMNS)
+            .execution_options(synchronize_session=False)
+        )
+        row = self._execute(query).first()
+        return TodoRow(*row) if row else None
+
+    def set_tags(self, todo_id, names):
+        """Replaces the todo's tags with names (from parse_tags). Creates new tags.
+
+        Only call after update()/create() found the todo - the statements
+        below trust todo_id. The triggers keep tags.todo_count right.
+        """
+        if names:
+            self._execute(
+                sqlite_insert(Tag).on_conflict_do_nothing(index_elements=['user_id', 'name']),
+                [{'user_id': self.user_id, 'name': name, 'todo_count': 0} for name in names])
+        wanted = select(Tag.id).where(Tag.user_id == self.user_id, Tag.name.in_(names))
+        self._execute(
+            delete(todo_tags)
+            .where(todo_tags.c.todo_id == todo_id, todo_tags.c.tag_id.not_in(wanted)))
+        if names:
+            self._execute(
+                insert(todo_tags).prefix_with('OR IGNORE')
+                .from_select(['tag_id', 'todo_id'], wanted.add_columns(literal(todo_id))))
+
+    def tag_counts(self):
+        """[(name, number of todos)] for the user's tags in use, by name."""
+        return self._execute(
+            select(Tag.name, Tag.todo_count)
+            .where(Tag.user_id == self.user_id, Tag.todo_count > 0)
+            .order_by(Tag.name)
+        ).all()
+
+    def toggle(self, todo_id):
+        """Flips is_completed in one statement. Same return value as update()."""
+        return self.update(todo_id, {'is_completed': not_(Todo.is_completed)})
+
+    def delete(self, todo_id):
+        """Moves the todo and all its subtasks to the trash (one statement).
+
+        They all get the same deleted_at, which is how restore() knows
+        what was deleted together. Returns their ids - empty if the user
+        has no such todo. trash.py deletes them for real later.
+        """
+        tree = self._subtree(todo_id, permission=EDIT)
+        query = (
+            update(Todo)
+            .where(Todo.id.in_(select(tree.c.id)), self._in_list())
+            .values(deleted_at=datetime.utcnow(), version=Todo.version + 1)
+            .returning(Todo.id)
+            .execution_options(synchronize_session=False)
+        )
+        return self._execute(query).scalars().all()
+
+    def trash(self):
+        """The todos in the trash as TodoRows, most recently deleted first."""
+        query = (
+            select(*TODO_ROW_COLUMNS)
+            .where(self._scope(VIEW, trashed=True))
+            .order_by(Todo.deleted_at.desc(), Todo.id)
+        )
+        return [TodoRow(*row) for row in self._execute(query)]
+
+    def restore(self, todo_id):
+        """Takes the todo out of the trash, with the subtasks deleted along with it.
+
+        One statement. Returns the restored TodoRows, the todo first - empty
+        if it isn't in the trash, or its parent still is (restore that one).
+        """
+        parent = aliased(Todo)
+        parent_is_live = or_(Todo.parent_id.is_(None), exists().where(
+            parent.id == Todo.parent_id, parent.deleted_at.is_(None)))
+        tree = (
+            select(Todo.id, Todo.deleted_at)
+            .where(Todo.id == todo_id, self._scope(EDIT, trashed=True), parent_is_live)
+            .cte('restored', recursive=True)
+        )
+        child = aliased(Todo)
+        tree = tree.union_all(
+            select(child.id, child.deleted_at)
+            .where(child.parent_id == tree.c.id, child.deleted_at == tree.c.deleted_at)
+        )
+        query = (
+            update(Todo)
+            .where(Todo.id.in_(select(tree.c.id)))
+            .values(deleted_at=None, version=Todo.version + 1)
+            .returning(*TODO_ROW_COLUMNS)
+            .execution_options(synchronize_session=False)
+        )
+        rows = [TodoRow(*row) for row in self._execute(query)]
+        return sorted(rows, key=lambda todo: todo.id != todo_id)
+
+    # -------------------------------------------------------------------------
+    # Subtasks
+    # -------------------------------------------------------------------------
+    # A subtree is loaded with ONE recursive CTE instead of one query per
+    # level: SQLite starts from the todo, then keeps joining the rows it just
+    # found to their children (ix_todos_parent_id) until there are none.
+
+    def _subtree(self, todo_id, max_depth=MAX_TODO_DEPTH, permission=VIEW):
+        """CTE (id, depth) of todo_id and its subtasks down to max_depth."""
+        tree = (
+            select(Todo.id, literal(0).label('depth'))
+            .where(Todo.id == todo_id, self._scope(permission))
+            .cte('subtree', recursive=True)
+        )
+        child = aliased(Todo)
+        return tree.union_all(
+            select(child.id, tree.c.depth + 1)
+            .where(child.parent_id == tree.c.id, self._in_list(child),
+                   tree.c.depth < max_depth)
+        )
+
+    def _levels(self, todo_id):
+        """SQL: 1 for a top-level todo, 2 for its subtask, ... 0 if not in this list."""
+        chain = (
+            select(Todo.parent_id, literal(1).label('level'))
+            .where(Todo.id == todo_id, self._in_list())
+            .cte('ancestors', recursive=True)
+        )
+        parent = aliased(Todo)
+        chain = chain.union_all(
+            select(parent.parent_id, chain.c.level + 1)
+            .where(parent.id == chain.c.parent_id, chain.c.level <= MAX_TODO_DEPTH)
+        )
+        return select(func.coalesce(func.max(chain.c.level), 0)).scalar_subquery()
+
+    def subtree(self, todo_id, max_depth=MAX_TODO_DEPTH):
+        """[(TodoRow, depth)] for todo_id and its subtasks, parents before children.
+
+        depth 0 is todo_id itself. Empty if the user has no such todo.
+        """
+        tree = self._subtree(todo_id, max_depth)
+        query = (
+            select(*TODO_ROW_COLUMNS, tree.c.depth)
+            .join(tree, tree.c.id == Todo.id)
+            .order_by(tree.c.depth, Todo.position, Todo.id)
+        )
+        return [(TodoRow(*row[:-1]), row[-1]) for row in self._execute(query)]
+
+    def complete_subtasks(self, todo_id):
+        """Marks every open subtask of todo_id (all levels) done. Returns how many."""
+        tree = self._subtree(todo_id, permission=EDIT)
+        query = (
+            update(Todo)
+            .where(Todo.id.in_(select(tree.c.id).where(tree.c.depth > 0)),
+                   Todo.is_completed == False)  # noqa: E712
+            .values(is_completed=True, version=Todo.version + 1)
+            .returning(Todo.id)  # rowcount is -1 for statements starting with WITH
+            .execution_options(synchronize_session=False)
+        )
+        return len(self._execute(query).all())
+
+    def move(self, todo_id, after_id=None):
+        """Moves the todo just after after_id (None: to the top). ONE row is written.
+
+        Returns (TodoRow, new position key), or None if either todo isn't in
+        this list. A long key means it's time to rebalance_positions().
+        """
+        others = (self._in_list(), Todo.id != todo_id)
+        if after_id is None:
+            above = null()
+            below = select(func.min(Todo.position)).where(*others)
+            found = True
+        else:
+            above = select(Todo.position) \
+                .where(Todo.id == after_id, self._in_list()).scalar_subquery()
+            below = select(func.min(Todo.position)).where(*others, Todo.position > above)
+            found = above.is_not(None)
+
+        query = (
+            update(Todo)
+            .where(Todo.id == todo_id, self._scope(EDIT), found)
+            .values(position=func.todo_position_between(above, below.scalar_subquery()))
+            .returning(*TODO_ROW_COLUMNS, Todo.position)
+            .execution_options(synchronize_session=False)
+        )
+        row = self._execute(query).first()
+        return (TodoRow(*row[:-1]), row[-1]) if row else None
+
+    def rebalance_positions(self):
+        """Rewrites the list's keys as short, evenly spaced ones. Same order.
+
+        One UPDATE ... FROM, so a move can't slip in halfway. Commits
+        itself: it runs on the background thread in positions.py.
+        """
+        ranked = (
+            select(Todo.id, func.row_number().over(order_by=(Todo.position, Todo.id)).label('rank'))
+            .where(self._in_list())
+            .subquery()
+        )
+        query = (
+            update(Todo)
+            .where(Todo.id == ranked.c.id)
+            .values(position=func.todo_rank_key(ranked.c.rank - 1))
+            .execution_options(synchronize_session=False)
+        )
+        count = self._execute(query).rowcount
+        db.session.commit()
+        return count
+
+
+# =============================================================================
+# LIST REPOSITORY: THE SHARED LISTS ONE USER CAN SEE
+# =============================================================================
+# Like TodoRepository, permission checks are part of each statement, so a
+# member removed a moment ago can't slip a change in.
+
+class ListRepository:
+    """Shared lists from one user's point of view. Write methods add to the session."""
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+
+    def _is_owner(self, list_id):
+        return exists().where(ListMember.list_id == list_id,
+                              ListMember.user_id == self.user_id,
+                              ListMember.permission == OWNER)
+
+    def create(self, name):
+        """Creates a list owned by the user. Returns its id."""
+        list_id = db.session.execute(
+            insert(TodoList)
+            .values(name=name, owner_id=self.user_id, created_at=datetime.utcnow())
+            .returning(TodoList.id)
+        ).scalar_one()
+        db.session.execute(insert(ListMember).values(list_id=list_id, user_id=self.user_id,
+                                                     permission=OWNER))
+        return list_id
+
+    def visible(self):
+        """[(list_id, name, owner_id, permission)] for every list the user can see."""
+        return db.session.execute(
+            select(TodoList.id, TodoList.name, TodoList.owner_id, ListMember.permission)
+            .join(TodoList, TodoList.id == ListMember.list_id)
+            .where(ListMember.user_id == self.user_id)
+            .order_by(TodoList.name, TodoList.id)
+        ).all()
+
+    def todos(self, list_ids=None):
+        """The todos of ALL lists the user can see, as TodoRows ordered by list.
+
+        ONE query however many lists there are (the ACL is a subquery) - per
+        shard holding one of list_ids (the lists from visible(); None: every
+        shard).
+        """
+        shared = select(ListMember.list_id).where(ListMember.user_id == self.user_id)
+        query = (
+            select(*TODO_ROW_COLUMNS)
+            .where(Todo.list_id.in_(shared), Todo.deleted_at.is_(None))
+            .order_by(Todo.list_id, Todo.position, Todo.id)
+        )
+        on = shards.names if list_ids is None else {shards.for_list(i) for i in list_ids}
+        rows = [TodoRow(*row) for shard in sorted(on, key=shards.names.index)
+                for row in db.session.execute(query, execution_options=shards.options(shard))]
+        return sorted(rows, key=lambda todo: todo.list_id)  # Stable: keeps each list's order
+
+    def share(self, list_id, member_id, permission):
+        """Gives member_id VIEW or EDIT permission. Owner only: returns False otherwise.
+
+        INSERT ... SELECT ... WHERE <user owns the list>, updating the
+        permission if member_id is already a member (never the owner's).
+        """
+        row = select(literal(list_id), literal(member_id), literal(permission)) \
+            .where(self._is_owner(list_id))
+        query = (
+            sqlite_insert(ListMember)
+            .from_select(['list_id', 'user_id', 'permission'], row)
+            .on_conflict_do_update(
+                index_elements=['list_id', 'user_id'],
+                set_={'permission': permission},
+                where=ListMember.permission < OWNER,
+            )
+            .returning(ListMember.list_id)
+        )
+        return db.session.execute(query).first() is not None
+
+    def unshare(self, list_id, member_id):
+        """Removes member_id from the list: by the owner, or members leaving. Not the owner."""
+        query = (
+            delete(ListMember)
+            .where(ListMember.list_id == list_id, ListMember.user_id == member_id,
+                   ListMember.permission < OWNER,
+                   or_(ListMember.user_id == self.user_id, self._is_owner(list_id)))
+        )
+        return db.session.execute(query).rowcount > 0
+
+    def delete(self, list_id):
+        """Deletes the list, its todos and members. Owner only.
+
+        Returns the deleted todo ids (trash and archive included), or None if
+        the user doesn't own the list.
+        """
+        deleted = db.session.execute(
+            delete(TodoList)
+            .where(TodoList.id == list_id, self._is_owner(list_id))
+            .returning(TodoList.id)
+        ).first()
+        if deleted is None:
+            return None
+        options = shards.options(shards.for_list(list_id))
+        todo_ids = db.session.execute(
+            delete(Todo).where(Todo.list_id == list_id).returning(Todo.id),
+            execution_options=options,
+        ).scalars().all()
+        todo_ids += db.session.execute(
+            delete(ArchivedTodo).where(ArchivedTodo.list_id == list_id).returning(ArchivedTodo.id),
+            execution_options=options,
+        ).scalars().all()
+        db.session.execute(delete(ListMember).where(ListMember.list_id == list_id))
+        return todo_ids
@@ -0,0 +1,231 @@
+# =============================================================================
+# Part 7: Manual Ordering with Fractional Position Keys
+# =============================================================================
+# Users drag todos into their own order. With integer positions (1, 2, 3...)
+# moving a todo to the top means renumbering every todo below it: O(n) row
+# writes per drag.
+#
+# Instead each todo has a position KEY - a string that sorts in list order:
+#
+#   'a0'  'a1'  'a2'            (three todos)
+#   'a0'  'a0V' 'a1'  'a2'      (a todo moved between the first two)
+#
+# There is always room for another key between two keys, so a move writes
+# ONE row: the moved todo gets key_between(key of the todo above, key of the
+# todo below). Keys use the digits 0-9A-Za-z, which sort the same way as
+# strings in Python and in SQLite (binary collation).
+#
+# A key is an "integer part" plus an optional fraction:
+#   - The first character says how many integer digits follow
+#     ('a' = 1, 'b' = 2, ... and 'Z', 'Y', ... for the keys before 'a0').
+#     Adding at the end/start just counts up/down: 'a0', 'a1', ... 'az', 'b00'
+#     - so appending a million todos still gives keys of 4-5 characters.
+#   - Moving between two neighbours adds fraction digits. Repeatedly moving
+#     into the SAME gap makes keys longer (about one character every few
+#     moves). When a key passes MAX_KEY_LENGTH, PositionRebalancer rewrites
+#     that user's keys as rank_key(0), rank_key(1), ... in the background.
+#
+# (This is the "fractional indexing" scheme used by Figma and others.)
+# =============================================================================
+
+import queue
+import threading
+
+DIGITS = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+ZERO = DIGITS[0]
+SMALLEST_INTEGER = 'A' + ZERO * 26
+
+MAX_KEY_LENGTH = 32  # Longer keys trigger a rebalance
+
+
+# =============================================================================
+# KEY ARITHMETIC
+# =============================================================================
+
+def _midpoint(a, b):
+    """A fraction string strictly between fractions a and b (b=None: 1)."""
+    if b is not None:
+        # Keep the common prefix, find the midpoint of what follows
+        n = 0
+        while (a[n] if n < len(a) else ZERO) == b[n]:
+            n += 1
+        if n > 0:
+            return b[:n] + _midpoint(a[n:], b[n:])
+
+    digit_a = DIGITS.index(a[0]) if a else 0
+    digit_b = DIGITS.index(b[0]) if b is not None else len(DIGITS)
+    if digit_b - digit_a > 1:
+        return DIGITS[(digit_a + digit_b + 1) // 2]
+    # Neighbouring digits: go one digit deeper
+    if b is not None and len(b) > 1:
+        return b[:1]
+    return DIGITS[digit_a] + _midpoint(a[1:], None)
+
+
+def _integer_length(head):
+    if 'a' <= head <= 'z':
+        return ord(head) - ord('a') + 2
+    if 'A' <= head <= 'Z':
+        return ord('Z') - ord(head) + 2
+    raise ValueError(f'Invalid position key head: {head!r}')
+
+
+def _split(key):
+    """'b12V' -> ('b12', 'V')"""
+    integer = key[:_integer_length(key[0])]
+    fraction = key[len(integer):]
+    if len(integer) != _integer_length(key[0]) or fraction.endswith(ZERO):
+        raise ValueError(f'Invalid position key: {key!r}')
+    return integer, fraction
+
+
+def _increment_integer(integer):
+    head, digits = integer[0], list(integer[1:])
+    for i in reversed(range(len(digits))):
+        d = DIGITS.index(digits[i]) + 1
+        if d < len(DIGITS):
+            digits[i] = DIGITS[d]
+            return head + ''.join(digits)
+        digits[i] = ZERO
+    # Every digit carried over: one more digit
+    if head == 'Z':
+        return 'a' + ZERO
+    if head == 'z':
+        return None
+    head = chr(ord(head) + 1)
+    if head > 'a':
+        digits.append(ZERO)
+    else:
+        digits.pop()
+    return head + ''.join(digits)
+
+
+def _decrement_integer(integer):
+    head, digits = integer[0], list(integer[1:])
+    for i in reversed(range(len(digits))):
+        d = DIGITS.index(digits[i]) - 1
+        if d >= 0:
+            digits[i] = DIGITS[d]
+            return head + ''.join(digits)
+        digits[i] = DIGITS[-1]
+    # Every digit borrowed: one more digit (towards 'Z', 'Y', ...)
+    if head == 'a':
+        return 'Z' + DIGITS[-1]
+    if head == 'A':
+        return None
+    head = chr(ord(head) - 1)
+    if head < 'Z':
+        digits.append(DIGITS[-1])
+    else:
+        digits.pop()
+    return head + ''.join(digits)
+
+
+def key_between(a, b):
+    """Returns a key that sorts after a and before b.
+
+    a=None means "at the start", b=None means "at the end". key_between(None,
+    None) is the key of the first todo in an empty list.
+    """
+    if a is not None and b is not None and a >= b:
+        raise ValueError(f'Position keys out of order: {a!r} >= {b!r}')
+
+    if a is None:
+        if b is None:
+            return 'a' + ZERO
+        integer_b, fraction_b = _split(b)
+        if integer_b == SMALLEST_INTEGER:
+            return integer_b + _midpoint('', fraction_b)
+        if integer_b < b:
+            return integer_b
+        smaller = _decrement_integer(integer_b)
+        if smaller is None:
+            raise ValueError('Cannot create a key before the smallest key')
+        return smaller
+
+    integer_a, fraction_a = _split(a)
+    if b is None:
+        larger = _increment_integer(integer_a)
+        return larger if larger is not None else integer_a + _midpoint(fraction_a, None)
+
+    integer_b, fraction_b = _split(b)
+    if integer_a == integer_b:
+        return integer_a + _midpoint(fraction_a, fraction_b)
+    larger = _increment_integer(integer_a)
+    if larger is not None and larger < b:
+        return larger
+    return integer_a + _midpoint(fraction_a, None)
+
+
+def rank_key(rank):
+    """The key of the rank-th todo (0-based) in an evenly spaced list.
+
+    Same keys as appending one todo after another: 'a0' ... 'az', 'b00' ...
+    so n todos get keys of about log62(n) characters. Used by rebalance.
+    """
+    length = 1
+    while rank >= len(DIGITS) ** length:
+        rank -= len(DIGITS) ** length
+        length += 1
+    digits = []
+    for _ in range(length):
+        rank, digit = divmod(rank, len(DIGITS))
+        digits.append(DIGITS[digit])
+    return chr(ord('a') + length - 1) + ''.join(reversed(digits))
+
+
+# =============================================================================
+# BACKGROUND REBALANCE
+# =============================================================================
+# Rebalancing rewrites every key of one list (O(n)), so it must not happen
+# inside the request that noticed a long key. The request only queues the
+# (user id, list id) pair; a background thread does the work, one at a time.
+
+class PositionRebalancer:
+    def __init__(self):
+        self.app = None
+        self.rebalanced = 0
+        self._queue = queue.SimpleQueue()
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def init_app(self, app):
+        self.app = app
+
+    def request(self, user_id, list_id=None):
+        """Queues a rebalance of user_id's todos, or of a shared list (once,
+        however often it is asked)."""
+        key = (user_id, list_id)
+        with self._lock:
+            if key in self._pending:
+                return
+            self._pending.add(key)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='position-rebalancer',
+                                                daemon=True)
+                self._thread.start()
+        self._queue.put(key)
+
+    def _run(self):
+        from models import TodoRepository
+        from logs import get_logger
+
+        logger = get_logger(__name__)
+        while True:
+            key = user_id, list_id = self._queue.get()
+            with self._lock:
+                self._pending.discard(key)
+            with self.app.app_context():
+                try:
+                    count = TodoRepository(user_id, list_id).rebalance_positions()
+                    self.rebalanced += 1
+                    logger.info('Rebalanced positions', extra={'user_id': user_id,
+                                                               'list_id': list_id,
+                                                               'todos': count})
+                except Exception:
+                    logger.exception('Position rebalance failed', extra={'user_id': user_id,
+                                                                          'list_id': list_id})
+
+
+rebalancer = PositionRebalancer()
@@ -0,0 +1,206 @@
+# =============================================================================
+# Part 7: Due-Date Reminders
+# =============================================================================
+# A todo can have a due_at. When it is reached (and the todo isn't done), the
+# owner gets ONE reminder. Checking every todo every few seconds would read
+# the whole table over and over. Instead:
+#
+#   1. Every REFRESH_SECONDS, load only the todos due in the next
+#      HORIZON_SECONDS: a range scan on the partial index
+#      ix_todos_due_at_pending (open todos still waiting for a reminder).
+#   2. Keep them in a heap ordered by due_at, in memory.
+#   3. Sleep until the earliest one is due (or the next refresh), pop
+#      everything that is due, and send the reminders.
+#
+# Firing is ONE statement per batch that both checks and claims the todos:
+#
+#   UPDATE todos SET reminded_at = now
+#   WHERE id IN (...) AND reminded_at IS NULL AND is_completed = 0
+#     AND deleted_at IS NULL AND due_at <= now
+#   RETURNING ...
+#
+# A todo completed, deleted (moved to the trash) or rescheduled since it was
+# loaded simply isn't returned. Two scheduler processes can't both send the
+# same reminder.
+#
+# Where reminders go (REMINDER_WEBHOOK_URL in config.py):
+#   unset - LogSink: one log line per reminder
+#   set   - WebhookSink: POST {"todo_id": ..., "user_id": ..., ...} as JSON
+#
+# With shards (shards.py) there is one scheduler per shard file, each in its
+# own thread.
+#
+# Usage:
+#   python reminders.py          # run the scheduler (separate from the app)
+# =============================================================================
+
+import json
+import time
+import heapq
+import urllib.request
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update, tuple_, literal_column
+
+from models import db, Todo
+from shards import shards
+from logs import get_logger
+
+HORIZON_SECONDS = 300   # How far ahead to load
+REFRESH_SECONDS = 30    # How often to look for new/changed due dates
+CATCH_UP_SECONDS = 24 * 3600  # Reminders missed while stopped are still sent if this recent
+LOAD_BATCH = 10_000     # Rows per range-scan query
+CLAIM_BATCH = 500       # Todos claimed per UPDATE
+
+logger = get_logger(__name__)
+
+# "+due_at" stops SQLite from using ix_todos_due_at_pending for the claim
+# UPDATE: it should look up the given ids, not range-scan every overdue todo
+_due_at_no_index = literal_column('+todos.due_at', Todo.due_at.type)
+
+
+# =============================================================================
+# SINKS (where reminders are sent)
+# =============================================================================
+
+class LogSink:
+    def send(self, reminders):
+        for reminder in reminders:
+            logger.info('Reminder', extra=reminder)
+
+
+class WebhookSink:
+    """POSTs each reminder as JSON. Stand-in for email/push notifications."""
+
+    def __init__(self, url, timeout=5):
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, reminders):
+        for reminder in reminders:
+            request = urllib.request.Request(
+                self.url, data=json.dumps(reminder).encode(),
+                headers={'Content-Type': 'application/json'}, method='POST')
+            try:
+                urllib.request.urlopen(request, timeout=self.timeout).close()
+            except OSError:
+                logger.exception('Reminder webhook failed', extra={'todo_id': reminder['todo_id']})
+
+
+# =============================================================================
+# SCHEDULER
+# =============================================================================
+
+class ReminderScheduler:
+    """Timer heap of upcoming due todos. Call inside an app context.
+
+    clock: returns the current time as a naive UTC datetime. Tests and
+    benchmarks pass a fake clock to run a whole day in a moment. shard: the
+    shard file whose todos to watch (None: not sharded).
+    """
+
+    def __init__(self, sink, clock=datetime.utcnow, horizon=HORIZON_SECONDS,
+                 refresh=REFRESH_SECONDS, shard=None):
+        self.sink = sink
+        self.shard = shard
+        self.clock = clock
+        self.horizon = timedelta(seconds=horizon)
+        self.refresh_interval = timedelta(seconds=refresh)
+        self.sent = 0
+        self._heap = []         # (due_at, todo_id)
+        self._scheduled = {}    # todo_id -> due_at currently in the heap
+        self._next_refresh = None
+
+    def __len__(self):
+        return len(self._scheduled)
+
+    def refresh(self):
+        """Loads todos due up to now + horizon into the heap (indexed range scan)."""
+        now = self.clock()
+        until = now + self.horizon
+        after = (now - timedelta(seconds=CATCH_UP_SECONDS), 0)
+        while True:
+            # Keyset pagination on (due_at, id): each batch continues where
+            # the last one stopped, never re-reading earlier rows
+            rows = db.session.execute(
+                select(Todo.due_at, Todo.id)
+                .where(Todo.reminded_at.is_(None), Todo.is_completed == False,  # noqa: E712
+                       Todo.deleted_at.is_(None),
+                       Todo.due_at <= until, tuple_(Todo.due_at, Todo.id) > after)
+                .order_by(Todo.due_at, Todo.id)
+                .limit(LOAD_BATCH),
+                execution_options=shards.options(self.shard),
+            ).all()
+            for due_at, todo_id in rows:
+                if self._scheduled.get(todo_id) != due_at:
+                    self._scheduled[todo_id] = due_at
+                    heapq.heappush(self._heap, (due_at, todo_id))
+            if len(rows) < LOAD_BATCH:
+                break
+            after = tuple(rows[-1])
+        db.session.rollback()  # End the read transaction
+        self._next_refresh = now + self.refresh_interval
+
+    def run_pending(self):
+        """Sends every reminder that is due now. Returns how many were sent."""
+        now = self.clock()
+        if self._next_refresh is None or now >= self._next_refresh:
+            self.refresh()
+
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            due_at, todo_id = heapq.heappop(self._heap)
+            if self._scheduled.get(todo_id) == due_at:  # Skip outdated heap entries
+                del self._scheduled[todo_id]
+                due.append(todo_id)
+
+        sent = 0
+        for start in range(0, len(due), CLAIM_BATCH):
+            sent += self._claim_and_send(due[start:start + CLAIM_BATCH], now)
+        self.sent += sent
+        return sent
+
+    def _claim_and_send(self, todo_ids, now):
+        rows = db.session.execute(
+            update(Todo)
+            .where(Todo.id.in_(todo_ids), Todo.reminded_at.is_(None),
+                   Todo.is_completed == False, Todo.deleted_at.is_(None),  # noqa: E712
+                   _due_at_no_index <= now)
+            .values(reminded_at=now)
+            .returning(Todo.id, Todo.user_id, Todo.task_content, Todo.due_at)
+            .execution_options(synchronize_session=False, **shards.options(self.shard))
+        ).all()
+        db.session.commit()
+        self.sink.send([
+            {'todo_id': todo_id, 'user_id': user_id, 'task_content': task_content,
+             'due_at': due_at.isoformat()}
+            for todo_id, user_id, task_content, due_at in rows
+        ])
+        return len(rows)
+
+    def seconds_until_next(self):
+        """How long run_forever may sleep: until the next due todo or refresh."""
+        now = self.clock()
+        wake = self._next_refresh or now
+        if self._heap:
+            wake = min(wake, self._heap[0][0])
+        return max(0.0, (wake - now).total_seconds())
+
+    def run_forever(self, sleep=time.sleep):
+        while True:
+            self.run_pending()
+            sleep(self.seconds_until_next())
+
+
+def make_sink(app):
+    url = app.config.get('REMINDER_WEBHOOK_URL')
+    return WebhookSink(url) if url else LogSink()
+
+
+if __name__ == '__main__':
+    from app import app
+
+    with app.app_context():
+        schedulers = [ReminderScheduler(make_sink(app), shard=shard) for shard in shards.names]
+        logger.info('Reminder scheduler started', extra={'shards': len(schedulers)})
+        shards.run_each(app, [scheduler.run_forever for scheduler in schedulers])
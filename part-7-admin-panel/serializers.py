@@ -0,0 +1,174 @@
+# =============================================================================
+# Part 7: Cached JSON Serialization for Todos
+# =============================================================================
+# jsonify({'todos': [todo.to_dict() for todo in todos]}) does the same work
+# for every todo on every request: build a dict, call isoformat(), encode.
+# But a todo only changes when it is updated, and Todo.version tells us when.
+#
+# So we encode each todo ONCE and keep the bytes:
+#
+#   (shard, id), version -> b'{"created_at":"...","id":1,...}'
+#
+# A list response is then just the cached pieces glued together:
+#
+#   b'{"todos":[' + b','.join(fragments) + b']}'
+# =============================================================================
+
+import io
+import csv
+import json
+import threading
+from collections import OrderedDict
+
+from shards import shards
+
+# Same output as Flask's jsonify() outside debug mode
+_encoder = json.JSONEncoder(ensure_ascii=True, sort_keys=True, separators=(',', ':'))
+
+
+class FragmentCache:
+    """LRU cache of encoded todos: (shard, id) -> (version, bytes).
+
+    Todo ids are never reused (migrations/0015), but with shards (shards.py)
+    they are only unique per shard file: two todos 7 on different shards
+    would otherwise take turns evicting each other. The owner (user_id,
+    list_id) picks the shard.
+    """
+
+    def __init__(self, max_entries=200_000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(todo):
+        if not shards.enabled:
+            return None, todo.id
+        if todo.list_id is None:
+            return shards.for_user(todo.user_id), todo.id
+        return shards.for_list(todo.list_id), todo.id
+
+    def get(self, todo):
+        entry = self._entries.get(self._key(todo))
+        if entry is not None and entry[0] == todo.version:
+            return entry[1]
+        return None
+
+    def put(self, todo, fragment):
+        key = self._key(todo)
+        with self._lock:
+            self._entries[key] = (todo.version, fragment)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, shard, *todo_ids):
+        """Forgets these todos of one shard (None: not sharded)."""
+        with self._lock:
+            for todo_id in todo_ids:
+                self._entries.pop((shard, todo_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+fragments = FragmentCache()
+
+
+# =============================================================================
+# ENCODING
+# =============================================================================
+
+def encode_todo(todo):
+    """Returns the JSON bytes for one todo (from cache when unchanged)."""
+    fragment = fragments.get(todo)
+    if fragment is None:
+        fragment = _encoder.encode(todo.to_dict()).encode()
+        fragments.put(todo, fragment)
+    return fragment
+
+
+def encode_todo_list(todos):
+    """Returns the body of {'todos': [...]} built from cached fragments."""
+    return b'{"todos":[' + b','.join(encode_todo(todo) for todo in todos) + b']}\n'
+
+
+def encode_todo_list_with_owner(rows):
+    """Like encode_todo_list, but for (todo, username) rows: adds "username".
+
+    Keys are sorted and "username" sorts after "user_id", the last key in
+    a fragment, so it can be added just before the closing brace.
+    """
+    parts = [
+        encode_todo(todo)[:-1] + b',"username":' + _encoder.encode(username).encode() + b'}'
+        for todo, username in rows
+    ]
+    return b'{"todos":[' + b','.join(parts) + b']}\n'
+
+
+def encode_lists(lists, todos):
+    """Body of {'lists': [...]}: each list's fields plus a "todos" array.
+
+    lists: [(list_id, fields dict)] in display order. todos: rows of all the
+    lists, grouped by list_id. "todos" sorts after every field name, so it
+    goes just before each list's closing brace.
+    """
+    by_list = {}
+    for todo in todos:
+        by_list.setdefault(todo.list_id, []).append(encode_todo(todo))
+    parts = [
+        _encoder.encode(dict(fields, id=list_id))[:-1].encode()
+        + b',"todos":[' + b','.join(by_list.get(list_id, ())) + b']}'
+        for list_id, fields in lists
+    ]
+    return b'{"lists":[' + b','.join(parts) + b']}\n'
+
+
+# =============================================================================
+# STREAMING EXPORT (CSV / NDJSON)
+# =============================================================================
+# Exports are written a batch at a time as the rows arrive, so the whole
+# list is never in memory (see models.TodoRepository.iter).
+
+EXPORT_COLUMNS = ['id', 'task_content', 'is_completed', 'created_at', 'due_at', 'tags']
+EXPORT_FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+EXPORT_BATCH = 500  # Rows per chunk sent to the client
+
+
+def _csv_chunks(todos):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for count, todo in enumerate(todos, start=1):
+        writer.writerow([todo.id, todo.task_content, todo.is_completed,
+                         todo.created_at.isoformat(),
+                         todo.due_at.isoformat() if todo.due_at else '',
+                         ','.join(todo.tag_names)])
+        if count % EXPORT_BATCH == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _ndjson_chunks(todos):
+    batch = []
+    for todo in todos:
+        # Reuse a cached fragment if there is one, but don't fill the cache
+        # with a whole export - that would make memory grow with the list
+        fragment = fragments.get(todo)
+        batch.append(fragment or _encoder.encode(todo.to_dict()).encode())
+        if len(batch) == EXPORT_BATCH:
+            yield b'\n'.join(batch) + b'\n'
+            batch = []
+    if batch:
+        yield b'\n'.join(batch) + b'\n'
+
+
+def export_chunks(todos, fmt):
+    """Yields the export file piece by piece. fmt is 'csv' or 'ndjson'."""
+    return _csv_chunks(todos) if fmt == 'csv' else _ndjson_chunks(todos)
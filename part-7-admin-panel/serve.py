@@ -0,0 +1,203 @@
+# =============================================================================
+# Part 7: Production Launcher (pre-fork)
+# =============================================================================
+# `python app.py` runs Flask's debug server: one process, with the reloader
+# and the debugger. Not something to put in front of users. serve.py runs
+# the same app in WORKERS processes with THREADS threads each:
+#
+#   1. The master imports app.py ONCE: migrations, schema checks, the
+#      default admin - everything that touches the database at startup.
+#   2. It opens the listening socket and closes its database connections
+#      (an SQLite connection must never be used by two processes).
+#   3. It forks the workers. Each one opens its own connections on first
+#      use and serves from the shared socket: the kernel hands each new
+#      connection to one worker. Nothing else is shared.
+#   4. The master only watches: a worker that dies is replaced, and
+#      SIGTERM / Ctrl-C stops every worker after its current requests.
+#
+# Per-process state stays per process: the fragment cache (checked against
+# each todo's version), auth revocations (reloaded from the database). The
+# todo list cache is different - a worker would never hear about another
+# worker's invalidations - so with a process-local backend and more than
+# one worker it is switched off (use TODO_CACHE_BACKEND = 'shared' with a
+# real server instead).
+#
+# Usage:
+#   python serve.py                              # SERVE_* from config.py
+#   python serve.py --workers 4 --threads 8 --bind 0.0.0.0:8000
+# =============================================================================
+
+import os
+import sys
+import time
+import signal
+import socket
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+from logs import get_logger
+
+BACKLOG = 1024              # Connections the kernel queues before accept()
+POLL_SECONDS = 0.5          # How often an idle worker checks for shutdown
+STOP_TIMEOUT_SECONDS = 30   # Then SIGKILL the workers still running
+
+logger = get_logger(__name__)
+
+
+class RequestHandler(WSGIRequestHandler):
+    # One request per connection: an idle keep-alive client would otherwise
+    # hold one of the worker's few threads
+    protocol_version = 'HTTP/1.0'
+
+    def log_request(self, code='-', size='-'):
+        pass  # app.py logs requests already (logs.py), as JSON and sampled
+
+
+class WorkerServer(BaseWSGIServer):
+    """WSGI server on an inherited listening socket, THREADS requests at a time."""
+
+    multiprocess = True  # For environ['wsgi.multiprocess']
+
+    def __init__(self, app, listener, threads):
+        self.multithread = threads > 1
+        super().__init__(*listener.getsockname()[:2], app, handler=RequestHandler,
+                         fd=listener.fileno())
+        # Every worker polls the same socket; whoever loses the race for a
+        # connection gets BlockingIOError from accept() and polls again
+        self.socket.setblocking(False)
+        self.timeout = POLL_SECONDS
+        self.stopping = False
+        self._pool = ThreadPoolExecutor(threads, thread_name_prefix='request') \
+            if threads > 1 else None
+
+    def process_request(self, request, client_address):
+        if self._pool is None:
+            return super().process_request(request, client_address)
+        self._pool.submit(self._process_in_thread, request, client_address)
+
+    def _process_in_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def serve_until_stopped(self):
+        while not self.stopping:
+            self.handle_request()  # Returns after POLL_SECONDS without a connection
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)  # Finish the requests already accepted
+
+
+# =============================================================================
+# WORKER
+# =============================================================================
+
+def run_worker(app, listener, threads):
+    """Serves until SIGTERM. Runs in the forked child; never returns."""
+    from models import db
+    from logs import stop_logging
+
+    # Ctrl-C reaches the whole process group: the master decides
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)  # Not the master's handler
+    status = 0
+    try:
+        # Forget the master's pooled connections without closing them (the
+        # master closed its own before forking; this is belt and braces)
+        with app.app_context():
+            db.engine.dispose(close=False)
+        server = WorkerServer(app, listener, threads)
+        signal.signal(signal.SIGTERM, lambda signum, frame: setattr(server, 'stopping', True))
+        server.serve_until_stopped()
+    except BaseException:
+        status = 1
+        logger.exception('Worker failed', extra={'pid': os.getpid()})
+    finally:
+        stop_logging()
+        os._exit(status)  # Not sys.exit(): the master's stack must not run here
+
+
+# =============================================================================
+# MASTER
+# =============================================================================
+
+def parse_bind(bind):
+    host, _, port = bind.rpartition(':')
+    return host or '127.0.0.1', int(port)
+
+
+def serve(bind, workers, threads):
+    # Step 1: Startup work, once (app.py migrates and checks the schema)
+    from app import app
+    from models import db
+    from cache import todo_cache
+
+    if workers > 1 and todo_cache.process_local:
+        todo_cache.disable()
+        logger.warning('Todo list cache off: each worker would keep its own copy and miss '
+                       "the other workers' invalidations. Use TODO_CACHE_BACKEND = 'shared'")
+
+    # Step 2: The shared socket; no database connection may cross fork()
+    listener = socket.create_server(parse_bind(bind), backlog=BACKLOG)
+    with app.app_context():
+        db.engine.dispose()
+
+    # Step 3: Fork the workers
+    children = {}
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            run_worker(app, listener, threads)
+        children[pid] = time.monotonic()
+
+    for _ in range(workers):
+        spawn()
+    logger.info('Serving', extra={'bind': bind, 'workers': workers, 'threads': threads,
+                                  'pid': os.getpid()})
+
+    # Step 4: Watch the workers until told to stop
+    stopping = []
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda signum, frame: stopping.append(signum))
+    while not stopping:
+        pid, status = os.waitpid(-1, os.WNOHANG)
+        if pid == 0:
+            time.sleep(POLL_SECONDS)
+            continue
+        children.pop(pid, None)
+        logger.warning('Worker died, starting another',
+                       extra={'pid': pid, 'status': os.waitstatus_to_exitcode(status)})
+        spawn()
+
+    for pid in children:
+        os.kill(pid, signal.SIGTERM)
+    deadline = time.monotonic() + STOP_TIMEOUT_SECONDS
+    while children and time.monotonic() < deadline:
+        pid, _ = os.waitpid(-1, os.WNOHANG)
+        if pid:
+            children.pop(pid, None)
+        else:
+            time.sleep(0.05)
+    for pid in children:
+        os.kill(pid, signal.SIGKILL)
+    listener.close()
+    logger.info('Stopped', extra={'killed': len(children)})
+
+
+if __name__ == '__main__':
+    import config
+
+    parser = argparse.ArgumentParser(description='Run the app with pre-forked workers.')
+    parser.add_argument('--bind', default=config.SERVE_BIND, help='host:port')
+    parser.add_argument('--workers', type=int, default=config.SERVE_WORKERS)
+    parser.add_argument('--threads', type=int, default=config.SERVE_THREADS,
+                        help='requests each worker serves at a time')
+    args = parser.parse_args()
+    if args.workers < 1 or args.threads < 1:
+        sys.exit('--workers and --threads must be at least 1')
+    serve(args.bind, args.workers, args.threads)
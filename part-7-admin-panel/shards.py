@@ -0,0 +1,218 @@
+# =============================================================================
+# Part 7: Shards
+# =============================================================================
+# SQLite lets ONE writer at a time into a database file. With every user's
+# todos in one file, two users saving a todo at the same moment wait for
+# each other. Sharding spreads the todos over TODO_SHARDS files (config.py):
+#
+#   main file     users, tokens, shared lists and their members (the directory)
+#   shard files   todos, tags, todo_tags, todos_archive - each user's in ONE file
+#
+# Writers on different shards no longer wait for each other.
+#
+# Every connection ATTACHes the shard files (as shard0, shard1, ...), and the
+# sharded tables in models.py live in the placeholder schema "todo_shard".
+# Each statement says which shard that means:
+#
+#   db.session.execute(query, execution_options=shards.options('shard2'))
+#
+# and SQLAlchemy writes "shard2.todos" into the SQL (schema_translate_map).
+# Everything else stays in the main file, so a statement on a shard can still
+# check list_members (the shared-list ACL) itself, and a request is still ONE
+# connection and one transaction - atomic per file (SQLite can't commit
+# several WAL files atomically together).
+#
+# Which shard? Consistent hashing: every shard owns VIRTUAL_NODES points on a
+# ring, and a user (or a shared list) goes to the first point after its own
+# hash. Adding a shard only moves the users whose hash lands on its points,
+# about 1 in N - but moving their rows is not automated, so the app refuses
+# to start if the shard files don't match TODO_SHARDS (ShardLayoutError).
+#
+#   shards.for_user(user_id)   - the user's own todos and tags
+#   shards.for_list(list_id)   - a shared list's todos (placed by the list)
+#   shards.fan_out(run)        - run(connection) on every shard at once, on a
+#                                thread pool; admin queries merge the results
+#
+# TODO_SHARDS = 0 (the default): no shard files, "todo_shard" means the main
+# file, and everything works exactly as before.
+# =============================================================================
+
+import os
+import bisect
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import make_url
+
+SHARD_SCHEMA = 'todo_shard'  # Placeholder schema of the sharded tables (models.py)
+VIRTUAL_NODES = 64           # Points per shard on the hash ring
+MAX_SHARDS = 10              # SQLite attaches at most 10 databases per connection
+
+
+class ShardLayoutError(RuntimeError):
+    """Raised at startup when the shard files don't match TODO_SHARDS."""
+
+
+def shard_files(database_uri, count):
+    """[(name, path)] of the shard files next to the main database file.
+
+    instance/todo_part7.db -> instance/todo_part7.shard0.db, ...
+    """
+    if not count:
+        return []
+    path = make_url(database_uri).database
+    if not path or path == ':memory:':
+        raise ShardLayoutError('Shards need a database file, not an in-memory database')
+    base, extension = os.path.splitext(path)
+    return [(f'shard{n}', f'{base}.shard{n}{extension or ".db"}') for n in range(count)]
+
+
+def _hash(key):
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'big')
+
+
+class ShardRouter:
+    def __init__(self):
+        self.files = []          # [(name, path)]; empty = not sharded
+        self.names = [None]      # None: the main file
+        self._ring = []          # Sorted hash points
+        self._owners = []        # Shard name of each point
+        self._options = {None: {'schema_translate_map': {SHARD_SCHEMA: None}}}
+        self._engine = None
+        self._database_uri = None
+        self._pool = None
+
+    def init_app(self, app, db):
+        app.config.setdefault('TODO_SHARDS', 0)
+        count = app.config['TODO_SHARDS']
+        if count > MAX_SHARDS:
+            raise ShardLayoutError(f'TODO_SHARDS can be at most {MAX_SHARDS}')
+        self._database_uri = app.config['SQLALCHEMY_DATABASE_URI']
+        self.files = shard_files(self._database_uri, count)
+
+        with app.app_context():
+            self._engine = db.engine
+        if not self.files:
+            # "todo_shard.todos" -> "todos" in the main file
+            self._engine.update_execution_options(**self._options[None])
+            return
+
+        # No default: a statement that doesn't pick a shard fails ("unknown
+        # database todo_shard") instead of quietly reading the main file
+        self.names = [name for name, _ in self.files]
+        self._options = {name: {'schema_translate_map': {SHARD_SCHEMA: name}}
+                         for name in self.names}
+        points = sorted((_hash(f'{name}#{n}'), name)
+                        for name in self.names for n in range(VIRTUAL_NODES))
+        self._ring = [point for point, _ in points]
+        self._owners = [name for _, name in points]
+        self._pool = self._new_pool()
+        os.register_at_fork(after_in_child=self._after_fork)
+
+        files = self.files
+
+        @event.listens_for(self._engine, 'connect')
+        def _attach_shards(dbapi_connection, connection_record):
+            for name, path in files:
+                dbapi_connection.execute(f"ATTACH DATABASE '{path}' AS {name}")
+
+    def _new_pool(self):
+        return ThreadPoolExecutor(max_workers=len(self.names), thread_name_prefix='shard-fan-out')
+
+    def _after_fork(self):
+        # The pool's threads stay behind in the parent (serve.py workers)
+        if self._pool is not None:
+            self._pool = self._new_pool()
+
+    @property
+    def enabled(self):
+        return bool(self.files)
+
+    def _on_ring(self, key):
+        if not self._ring:
+            return None
+        index = bisect.bisect(self._ring, _hash(key)) % len(self._ring)
+        return self._owners[index]
+
+    def for_user(self, user_id):
+        """Shard of the user's own todos, tags and archive."""
+        return self._on_ring(f'user:{user_id}')
+
+    def for_list(self, list_id):
+        """Shard of a shared list's todos (whoever created them)."""
+        return self._on_ring(f'list:{list_id}')
+
+    def options(self, shard):
+        """execution_options that send a statement to this shard."""
+        return self._options[shard]
+
+    def schema(self, shard):
+        """The shard's schema name in raw SQL (PRAGMA shard0.page_count)."""
+        return shard or 'main'
+
+    def fan_out(self, run):
+        """[run(connection) for every shard], the shards queried in parallel.
+
+        Each call gets its own connection, already pointed at its shard.
+        Read-only: nothing is committed.
+        """
+        def on_shard(shard):
+            with self._engine.connect() as conn:
+                return run(conn.execution_options(**self.options(shard)))
+
+        if self._pool is None:
+            return [on_shard(shard) for shard in self.names]
+        return list(self._pool.map(on_shard, self.names))
+
+    def run_each(self, app, jobs):
+        """Runs every job() in its own thread with its own app context, until all return.
+
+        For the background jobs (trash.py, ...): one loop per shard, so a
+        slow shard doesn't hold up the others.
+        """
+        def run(job):
+            with app.app_context():
+                job()
+
+        if len(jobs) == 1:
+            return run(jobs[0])
+        threads = [threading.Thread(target=run, args=(job,), daemon=True) for job in jobs]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def file_engines(self, **options):
+        """[(name, engine)] for every database file on its own, main file first.
+
+        For migrations: the app's connections ATTACH the shard files, and
+        unqualified DDL there ("DROP INDEX ix_todos_is_completed") can reach
+        into a shard file.
+        """
+        if not self.files:
+            return [(None, self._engine)]  # Nothing attached (and may be :memory:)
+        main = create_engine(self._database_uri, **options)
+        return [(None, main)] + [(name, create_engine(f'sqlite:///{path}', **options))
+                                 for name, path in self.files]
+
+    def check_layout(self):
+        """Raises ShardLayoutError if todos live somewhere TODO_SHARDS doesn't look."""
+        if make_url(self._database_uri).database in (None, '', ':memory:'):
+            return
+        configured = {path for _, path in self.files}
+        for _, path in shard_files(self._database_uri, MAX_SHARDS):
+            if path not in configured and os.path.exists(path):
+                raise ShardLayoutError(
+                    f'{path} exists but TODO_SHARDS = {len(self.files)}: its users would '
+                    f'lose their todos. Moving users between shards is not supported.')
+        if self.files:
+            with self._engine.connect() as conn:
+                if conn.execute(text('SELECT 1 FROM main.todos LIMIT 1')).first():
+                    raise ShardLayoutError(
+                        'The main database file has todos, but TODO_SHARDS is set: they '
+                        'would not be found. Moving users between shards is not supported.')
+
+
+shards = ShardRouter()
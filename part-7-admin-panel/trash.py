@@ -0,0 +1,179 @@
+# =============================================================================
+# Part 7: Trash Purger
+# =============================================================================
+# DELETE /api/todos/<id> only sets deleted_at: the todo moves to the trash
+# (GET /api/todos/trash), where POST /api/todos/<id>/restore can bring it
+# back. Todos in the trash for longer than TRASH_RETENTION_DAYS (config.py)
+# are deleted for real here, outside the request path:
+#
+#   1. Delete at most PURGE_BATCH of the oldest expired todos per
+#      transaction (a range read of ix_todos_deleted_at), pausing between
+#      batches. The write lock is only ever held for one small batch, so
+#      API requests get their writes in between.
+#   2. After each batch, PRAGMA incremental_vacuum gives the pages the batch
+#      freed back to the operating system. A plain DELETE leaves them in the
+#      file's free list; a full VACUUM would rewrite - and lock - the whole
+#      file.
+#
+# Incremental vacuum needs auto_vacuum = INCREMENTAL, which can only be set
+# on an empty database (migrate.bootstrap does) or by rewriting the file
+# once: python trash.py --enable-vacuum
+#
+# With shards (shards.py) there is one purger per shard file, each in its
+# own thread: the batches and the vacuum are per file.
+#
+# Usage:
+#   python trash.py              # purge every PURGE_INTERVAL_SECONDS (separate from the app)
+#   python trash.py --once       # one pass, then print the report
+# =============================================================================
+
+import sys
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, delete, text
+
+from models import db, Todo
+from shards import shards
+from logs import get_logger
+
+PURGE_BATCH = 500               # Todos deleted per transaction
+PAUSE_SECONDS = 0.05            # Between batches, so other writers get the lock
+VACUUM_PAGES = 1000             # At most this many pages returned per batch
+PURGE_INTERVAL_SECONDS = 3600   # run_forever: how often to look for expired todos
+
+logger = get_logger(__name__)
+
+
+def _pragma(name, shard=None):
+    return db.session.execute(text(f'PRAGMA {shards.schema(shard)}.{name}')).scalar()
+
+
+def incremental_vacuum_enabled(shard=None):
+    return _pragma('auto_vacuum', shard) == 2  # 0 NONE, 1 FULL, 2 INCREMENTAL
+
+
+class TrashPurger:
+    """Hard-deletes expired trash in small batches. Call inside an app context.
+
+    clock: returns the current time as a naive UTC datetime (like
+    ReminderScheduler). sleep: called between batches. shard: the shard
+    file to purge (None: not sharded).
+    """
+
+    def __init__(self, retention_days, batch_size=PURGE_BATCH, pause=PAUSE_SECONDS,
+                 clock=datetime.utcnow, sleep=time.sleep, shard=None):
+        self.shard = shard
+        self.retention = timedelta(days=retention_days)
+        self.batch_size = batch_size
+        self.pause = pause
+        self.clock = clock
+        self.sleep = sleep
+
+    def purge_batch(self, cutoff):
+        """Deletes up to batch_size todos that went to the trash before cutoff.
+
+        One transaction. Returns the deleted ids (fewer than batch_size: done).
+        """
+        expired = (
+            select(Todo.id)
+            .where(Todo.deleted_at < cutoff)
+            .order_by(Todo.deleted_at)
+            .limit(self.batch_size)
+        )
+        ids = db.session.execute(
+            delete(Todo)
+            .where(Todo.id.in_(expired))
+            .returning(Todo.id)
+            .execution_options(synchronize_session=False, **shards.options(self.shard))
+        ).scalars().all()
+        db.session.commit()
+        return ids
+
+    def vacuum(self, pages=VACUUM_PAGES):
+        """Returns up to `pages` free pages to the OS. Returns how many it did."""
+        before = _pragma('page_count', self.shard)
+        # executescript() runs the pragma to the end: a plain execute() in
+        # Python's sqlite3 stops after the first step, i.e. after ONE page
+        with db.engine.connect() as conn:
+            conn.connection.driver_connection.executescript(
+                f'PRAGMA {shards.schema(self.shard)}.incremental_vacuum({int(pages)})')
+        return before - _pragma('page_count', self.shard)
+
+    def run_once(self):
+        """Purges everything that has expired now. Returns a report dict."""
+        started = time.perf_counter()
+        cutoff = self.clock() - self.retention
+        vacuum = incremental_vacuum_enabled(self.shard)
+        pages_before = _pragma('page_count', self.shard)
+        purged = batches = pages_reclaimed = 0
+        longest = 0.0
+
+        while True:
+            batch_started = time.perf_counter()
+            ids = self.purge_batch(cutoff)
+            if vacuum:
+                pages_reclaimed += self.vacuum()
+            longest = max(longest, time.perf_counter() - batch_started)
+            purged += len(ids)
+            batches += 1
+            if len(ids) < self.batch_size:
+                break
+            self.sleep(self.pause)
+
+        page_size = _pragma('page_size', self.shard)
+        report = {
+            'shard': self.shard,
+            'purged': purged,
+            'batches': batches,
+            'longest_batch_ms': round(longest * 1000, 1),
+            'pages_reclaimed': pages_reclaimed,
+            'bytes_reclaimed': pages_reclaimed * page_size,
+            'pages_before': pages_before,
+            'free_pages': _pragma('freelist_count', self.shard),  # Still in the file, reusable
+            'incremental_vacuum': vacuum,
+            'seconds': round(time.perf_counter() - started, 2),
+        }
+        if purged:
+            logger.info('Purged trash', extra=report)
+        return report
+
+    def run_forever(self, interval=PURGE_INTERVAL_SECONDS):
+        if not incremental_vacuum_enabled(self.shard):
+            logger.warning('auto_vacuum is not INCREMENTAL: purged pages stay in the file '
+                           '(run python trash.py --enable-vacuum once)',
+                           extra={'shard': self.shard})
+        while True:
+            self.run_once()
+            self.sleep(interval)
+
+
+def enable_incremental_vacuum(shard=None):
+    """Switches an existing database (or shard file) to auto_vacuum = INCREMENTAL.
+
+    Takes effect only through a full VACUUM, which rewrites the whole file
+    and holds the write lock meanwhile - run it once, at a quiet time.
+    """
+    schema = shards.schema(shard)
+    with db.engine.connect() as conn:
+        conn.exec_driver_sql(f'PRAGMA {schema}.auto_vacuum = INCREMENTAL')
+        conn.exec_driver_sql(f'VACUUM {schema}')
+
+
+if __name__ == '__main__':
+    from app import app
+
+    with app.app_context():
+        if '--enable-vacuum' in sys.argv:
+            for shard in shards.names:
+                enable_incremental_vacuum(shard)
+            print('auto_vacuum is now INCREMENTAL')
+            sys.exit(0)
+        purgers = [TrashPurger(app.config['TRASH_RETENTION_DAYS'], shard=shard)
+                   for shard in shards.names]
+        if '--once' in sys.argv:
+            for purger in purgers:
+                print(purger.run_once())
+        else:
+            logger.info('Trash purger started', extra={'shards': len(purgers)})
+            shards.run_each(app, [purger.run_forever for purger in purgers])
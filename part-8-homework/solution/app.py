@@ -1,7 +1,7 @@
 # SOLUTION - app.py (completed)
 
 from flask import Flask, request, jsonify, render_template
-from models import db, User, Todo
+from models import db, User, Todo, PRIORITY_RANKS
 from auth import hash_password, verify_password, create_token, token_required
 
 app = Flask(__name__)
@@ -90,7 +90,24 @@ def login():
 @app.route('/api/todos', methods=['GET'])
 @token_required
 def get_todos(current_user):
-    todos = Todo.query.filter_by(user_id=current_user.id).all()
+    # ?sort=priority  -> pending first, then high -> low, then oldest first
+    # ?sort=created   -> oldest first (default)
+    # ?limit=N        -> only the first N (e.g. "top 5" on the dashboard)
+    sort = request.args.get('sort', 'created')
+    limit = request.args.get('limit', type=int)
+
+    query = Todo.query.filter_by(user_id=current_user.id)
+    if sort == 'priority':
+        # Same order as the ix_todos_user_priority index, so no sorting needed
+        query = query.order_by(Todo.is_completed, Todo.priority_rank, Todo.created_at)
+    elif sort == 'created':
+        query = query.order_by(Todo.created_at)
+    else:
+        return jsonify({'error': 'sort must be priority or created'}), 400
+    if limit:
+        query = query.limit(limit)
+
+    todos = query.all()
     return jsonify({'todos': [todo.to_dict() for todo in todos]})
 
 
@@ -98,6 +115,8 @@ def get_todos(current_user):
 @token_required
 def create_todo(current_user):
     data = request.get_json()
+    if data.get('priority', 'medium') not in PRIORITY_RANKS:
+        return jsonify({'error': 'priority must be low, medium or high'}), 400
 
     todo = Todo(
         task_content=data['task_content'],
@@ -125,6 +144,10 @@ def update_todo(current_user, todo_id):
         todo.task_content = data['task_content']
     if 'is_completed' in data:
         todo.is_completed = data['is_completed']
+    if 'priority' in data:
+        if data['priority'] not in PRIORITY_RANKS:
+            return jsonify({'error': 'priority must be low, medium or high'}), 400
+        todo.priority = data['priority']
 
     db.session.commit()
     return jsonify(todo.to_dict())
@@ -25,17 +25,43 @@ class User(db.Model):
         }
 
 
+# Priority is stored as a small number so the DATABASE can sort by it.
+# As text, 'high' < 'low' < 'medium' (alphabetical) - useless for sorting.
+# The API still sends and receives the words.
+PRIORITY_RANKS = {'high': 1, 'medium': 2, 'low': 3}
+PRIORITY_NAMES = {rank: name for name, rank in PRIORITY_RANKS.items()}
+
+
 class Todo(db.Model):
     __tablename__ = 'todos'
 
+    # Matches ORDER BY is_completed, priority_rank, created_at in get_todos:
+    # SQLite reads the user's todos already sorted, and with ?limit=N it
+    # stops after N rows instead of sorting the whole list.
+    __table_args__ = (
+        db.Index('ix_todos_user_priority', 'user_id', 'is_completed',
+                 'priority_rank', 'created_at'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     task_content = db.Column(db.String(200), nullable=False)
     is_completed = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
 
-    # STEP 1: Added priority column
-    priority = db.Column(db.String(10), default='medium')
+    # STEP 1: Added priority column (as a rank: 1 = high ... 3 = low)
+    priority_rank = db.Column(db.SmallInteger, nullable=False,
+                              default=PRIORITY_RANKS['medium'])
+
+    @property
+    def priority(self):
+        return PRIORITY_NAMES[self.priority_rank or PRIORITY_RANKS['medium']]
+
+    @priority.setter
+    def priority(self, name):
+        if name not in PRIORITY_RANKS:
+            raise ValueError('priority must be low, medium or high')
+        self.priority_rank = PRIORITY_RANKS[name]
 
     def to_dict(self):
         return {